@@ -1,9 +1,10 @@
 import re
 import requests
-import time
 import os
 from collections import deque
 
+from mal_client import mal_client
+
 # Official MyAnimeList API base URL
 MAL_API_BASE = "https://api.myanimelist.net/v2"
 
@@ -52,13 +53,7 @@ def get_anime_details(mal_id):
         headers = get_mal_headers()
         
         print(f"Fetching anime {mal_id} from MAL API...")
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        
-        # Handle rate limiting (MAL API uses different status codes)
-        if response.status_code == 429:
-            print(f"Rate limited while fetching {mal_id}, waiting 1 second...")
-            time.sleep(1)
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = mal_client.get(url, params=params, headers=headers, timeout=10)
         
         # Handle not found
         if response.status_code == 404:
@@ -154,12 +149,7 @@ def search_anime(query, limit=10):
         }
         headers = get_mal_headers()
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        
-        if response.status_code == 429:
-            print(f"Rate limited while searching '{query}', waiting 1 second...")
-            time.sleep(1)
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = mal_client.get(url, params=params, headers=headers, timeout=10)
         
         response.raise_for_status()
         data = response.json()
@@ -200,12 +190,7 @@ def get_seasonal_anime(year, season, limit=20):
         }
         headers = get_mal_headers()
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        
-        if response.status_code == 429:
-            print(f"Rate limited while fetching {year} {season} anime, waiting 1 second...")
-            time.sleep(1)
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = mal_client.get(url, params=params, headers=headers, timeout=10)
         
         response.raise_for_status()
         data = response.json()
@@ -249,12 +234,7 @@ def get_top_anime(ranking_type='all', limit=20, offset=0):
         }
         headers = get_mal_headers()
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        
-        if response.status_code == 429:
-            print(f"Rate limited while fetching top {ranking_type} anime, waiting 1 second...")
-            time.sleep(1)
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = mal_client.get(url, params=params, headers=headers, timeout=10)
         
         response.raise_for_status()
         data = response.json()
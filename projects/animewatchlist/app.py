@@ -2,7 +2,7 @@
 AnimeWatchList — Flask app (Jinja2 templates, MAL API, MAL OAuth)
 Drop this into projects/animewatchlist/ and register with wsgi.py.
 """
-import os, secrets, hashlib, base64, datetime, requests
+import os, secrets, hashlib, base64, datetime
 from urllib.parse import quote
 from flask import (Flask, render_template, redirect, request,
                    session, flash, url_for, Blueprint, jsonify)
@@ -11,6 +11,8 @@ from flask_login import (LoginManager, UserMixin, login_user,
                          logout_user, login_required, current_user)
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
+from mal_client import mal_client
+import cold_start_recommender as taste
 
 load_dotenv(override=False)   # don't overwrite values already set by wsgi.py
 
@@ -127,6 +129,27 @@ class UserAnimeList(db.Model):
         return d
 
 
+class CatalogCheckpoint(db.Model):
+    """Resume point for catalog_mirror.py, one row per MAL ranking type."""
+    __tablename__ = "aw_catalog_checkpoint"
+    id            = db.Column(db.Integer, primary_key=True)
+    ranking_type  = db.Column(db.String(32), unique=True, nullable=False)
+    next_offset   = db.Column(db.Integer, default=0, nullable=False)
+    finished      = db.Column(db.Boolean, default=False, nullable=False)
+    rows_seen     = db.Column(db.Integer, default=0, nullable=False)
+    rows_written  = db.Column(db.Integer, default=0, nullable=False)
+    updated_at    = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
+class UserTasteProfile(db.Model):
+    """Per-user genre/studio weights + rating aggregates, delta-maintained on list changes."""
+    __tablename__ = "aw_user_taste"
+    id         = db.Column(db.Integer, primary_key=True)
+    user_id    = db.Column(db.Integer, db.ForeignKey("aw_user.id"), unique=True, nullable=False)
+    profile    = db.Column(db.Text, nullable=False)   # cold_start_recommender.dump_profile JSON
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
 # ── Helpers ────────────────────────────────────────────────────────────────
 def _mal_pub():
     return {"X-MAL-CLIENT-ID": MAL_CLIENT_ID}
@@ -139,7 +162,7 @@ def _mal_user(user):
 
 
 def _refresh(user):
-    r = requests.post(f"{MAL_AUTH_BASE}/token", data={
+    r = mal_client.post(f"{MAL_AUTH_BASE}/token", data={
         "grant_type": "refresh_token", "refresh_token": user.mal_refresh_token,
         "client_id": MAL_CLIENT_ID, "client_secret": MAL_CLIENT_SECRET,
     })
@@ -157,6 +180,13 @@ def _upsert(data):
     if not anime:
         anime = Anime(mal_id=mid)
         db.session.add(anime)
+    _fill_anime(anime, data)
+    db.session.commit()
+    return anime
+
+
+def _fill_anime(anime, data):
+    """Copy a MAL anime node onto an Anime row (no commit)."""
     alts = data.get("alternative_titles", {})
     anime.title      = data.get("title", "Unknown")
     anime.title_en   = alts.get("en") if isinstance(alts, dict) else None
@@ -172,7 +202,6 @@ def _upsert(data):
     anime.genres  = ",".join(g["name"] for g in data.get("genres",  []) if isinstance(g, dict))
     anime.studios = ",".join(s["name"] for s in data.get("studios", []) if isinstance(s, dict))
     anime.updated_at = datetime.datetime.utcnow()
-    db.session.commit()
     return anime
 
 
@@ -205,6 +234,55 @@ LIST_TABS = [
 ]
 
 
+def _entry_state(entry, anime=None):
+    """Snapshot of the fields that feed the taste profile (None for no entry)."""
+    if entry is None:
+        return None
+    anime = anime or entry.anime
+    return {"mal_id": anime.mal_id, "title": anime.title,
+            "rating": entry.user_rating, "status": entry.watch_status,
+            "genres": anime.genres, "studios": anime.studios}
+
+
+def _rebuild_taste_profile(user_id):
+    entries = UserAnimeList.query.filter_by(user_id=user_id).all()
+    profile = taste.empty_profile()
+    for e in entries:
+        taste.apply_entry(profile, _entry_state(e))
+    return profile
+
+
+def _save_taste_profile(user_id, profile, row=None):
+    row = row or UserTasteProfile.query.filter_by(user_id=user_id).first()
+    if row is None:
+        row = UserTasteProfile(user_id=user_id)
+        db.session.add(row)
+    row.profile    = taste.dump_profile(profile)
+    row.updated_at = datetime.datetime.utcnow()
+
+
+def _get_taste_profile(user_id):
+    """Persisted taste profile; built once from the local list the first time."""
+    row = UserTasteProfile.query.filter_by(user_id=user_id).first()
+    if row:
+        return taste.load_profile(row.profile)
+    profile = _rebuild_taste_profile(user_id)
+    _save_taste_profile(user_id, profile)
+    db.session.commit()
+    return profile
+
+
+def _record_taste_change(user_id, before, after):
+    """Apply one entry's before/after delta. Call before the surrounding commit."""
+    row = UserTasteProfile.query.filter_by(user_id=user_id).first()
+    if row is None:
+        # First write for this user — the autoflushed list already holds `after`.
+        profile = _rebuild_taste_profile(user_id)
+    else:
+        profile = taste.apply_entry_change(taste.load_profile(row.profile), before, after)
+    _save_taste_profile(user_id, profile, row)
+
+
 def _push_to_mal(mal_id, watch_status="completed", score=None, episodes=None):
     """Push a list update to MAL. Fails silently if user isn't MAL-linked."""
     if not current_user.is_authenticated or not current_user.mal_linked:
@@ -221,7 +299,7 @@ def _push_to_mal(mal_id, watch_status="completed", score=None, episodes=None):
     if episodes is not None and int(episodes) > 0:
         body["num_watched_episodes"] = int(episodes)
     try:
-        requests.put(f"{MAL_API_BASE}/anime/{mal_id}/my_list_status",
+        mal_client.put(f"{MAL_API_BASE}/anime/{mal_id}/my_list_status",
                      headers=_mal_user(current_user), data=body, timeout=10)
     except Exception as e:
         print(f"[MAL Push] Failed to update {mal_id}: {e}")
@@ -232,7 +310,7 @@ def _remove_from_mal(mal_id):
     if not current_user.is_authenticated or not current_user.mal_linked:
         return
     try:
-        requests.delete(f"{MAL_API_BASE}/anime/{mal_id}/my_list_status",
+        mal_client.delete(f"{MAL_API_BASE}/anime/{mal_id}/my_list_status",
                         headers=_mal_user(current_user), timeout=10)
     except Exception as e:
         print(f"[MAL Push] Failed to remove {mal_id}: {e}")
@@ -271,7 +349,7 @@ def _upsert_from_mal_id(mal_id):
     if anime:
         return anime
     try:
-        resp = requests.get(
+        resp = mal_client.get(
             f"{MAL_API_BASE}/anime/{mal_id}",
             headers=_mal_pub(),
             params={"fields": ANIME_FIELDS},
@@ -289,6 +367,7 @@ def _add_or_update_user_list_item(mal_id, watch_status="completed", user_rating=
     if not anime:
         return None
     entry = UserAnimeList.query.filter_by(user_id=current_user.id, anime_id=anime.id).first()
+    before = _entry_state(entry, anime)
     if not entry:
         entry = UserAnimeList(user_id=current_user.id, anime_id=anime.id)
         db.session.add(entry)
@@ -299,6 +378,7 @@ def _add_or_update_user_list_item(mal_id, watch_status="completed", user_rating=
         entry.user_rating = None
     entry.episodes_watched = int(episodes_watched or 0)
     entry.updated_at = datetime.datetime.utcnow()
+    _record_taste_change(current_user.id, before, _entry_state(entry, anime))
     db.session.commit()
     _push_to_mal(anime.mal_id, entry.watch_status, entry.user_rating, entry.episodes_watched)
     return anime
@@ -328,7 +408,7 @@ def _fetch_discover_batch(ranking, offset, seen_ids, count=20):
     # May need multiple pages if many are filtered out
     for _ in range(3):
         try:
-            resp = requests.get(f"{MAL_API_BASE}/anime/ranking", headers=_mal_pub(),
+            resp = mal_client.get(f"{MAL_API_BASE}/anime/ranking", headers=_mal_pub(),
                                 params={"ranking_type": ranking, "limit": 500,
                                         "offset": api_offset, "fields": ANIME_FIELDS},
                                 timeout=15)
@@ -403,6 +483,20 @@ def api_skip():
     return jsonify({"ok": True})
 
 
+@bp.route("/api/mal/metrics")
+def api_mal_metrics():
+    """Connection pool / keep-alive reuse counters for the shared MAL client."""
+    return jsonify(mal_client.stats())
+
+
+def _search_local(q, limit=40):
+    pattern = f"%{q}%"
+    return (Anime.query
+            .filter(db.or_(Anime.title.ilike(pattern), Anime.title_en.ilike(pattern)))
+            .order_by(Anime.score.desc().nullslast())
+            .limit(limit).all())
+
+
 @bp.route("/search", methods=["GET", "POST"])
 def search():
     q = (
@@ -411,22 +505,26 @@ def search():
     )
     results = []
     if q:
+        models = None
         try:
-            resp = requests.get(f"{MAL_API_BASE}/anime", headers=_mal_pub(),
+            resp = mal_client.get(f"{MAL_API_BASE}/anime", headers=_mal_pub(),
                                 params={"q": q, "limit": 40, "fields": ANIME_FIELDS}, timeout=10)
             if resp.ok:
                 models = [_upsert(i["node"]) for i in resp.json().get("data", [])]
-                user_entries = {}
-                if current_user.is_authenticated:
-                    mal_ids = [m.mal_id for m in models]
-                    links = (UserAnimeList.query
-                             .join(Anime, Anime.id == UserAnimeList.anime_id)
-                             .filter(UserAnimeList.user_id == current_user.id, Anime.mal_id.in_(mal_ids))
-                             .all())
-                    user_entries = {e.anime.mal_id: e for e in links}
-                results = [_to_template_anime(m, user_entries.get(m.mal_id)) for m in models]
         except Exception:
             pass
+        if models is None:
+            # MAL unreachable — fall back to the locally mirrored catalogue
+            models = _search_local(q)
+        user_entries = {}
+        if current_user.is_authenticated and models:
+            mal_ids = [m.mal_id for m in models]
+            links = (UserAnimeList.query
+                     .join(Anime, Anime.id == UserAnimeList.anime_id)
+                     .filter(UserAnimeList.user_id == current_user.id, Anime.mal_id.in_(mal_ids))
+                     .all())
+            user_entries = {e.anime.mal_id: e for e in links}
+        results = [_to_template_anime(m, user_entries.get(m.mal_id)) for m in models]
     return render_template("search.html", results=results, query=q,
                            has_rating_feature=True,
                            active="search", get_url_for=_get_url_for)
@@ -478,7 +576,7 @@ def add_to_list():
     anime = Anime.query.filter_by(mal_id=int(mal_id)).first()
     if not anime:
         try:
-            resp = requests.get(f"{MAL_API_BASE}/anime/{mal_id}",
+            resp = mal_client.get(f"{MAL_API_BASE}/anime/{mal_id}",
                                 headers=_mal_pub(), params={"fields": ANIME_FIELDS}, timeout=10)
             anime = _upsert(resp.json()) if resp.ok else None
         except Exception:
@@ -488,6 +586,7 @@ def add_to_list():
         return redirect(request.referrer or _get_url_for("index"))
 
     entry = UserAnimeList.query.filter_by(user_id=current_user.id, anime_id=anime.id).first()
+    before = _entry_state(entry, anime)
     if not entry:
         entry = UserAnimeList(user_id=current_user.id, anime_id=anime.id)
         db.session.add(entry)
@@ -495,6 +594,7 @@ def add_to_list():
     entry.user_rating      = int(rating) if rating else None
     entry.episodes_watched = eps
     entry.updated_at       = datetime.datetime.utcnow()
+    _record_taste_change(current_user.id, before, _entry_state(entry, anime))
     db.session.commit()
     _push_to_mal(anime.mal_id, status, entry.user_rating, eps)
     flash(f"Added \"{anime.title_en or anime.title}\" to your list", "success")
@@ -535,7 +635,9 @@ def remove_anime(anime_id):
     if anime:
         entry = UserAnimeList.query.filter_by(user_id=current_user.id, anime_id=anime.id).first()
         if entry:
+            before = _entry_state(entry, anime)
             db.session.delete(entry)
+            _record_taste_change(current_user.id, before, None)
             db.session.commit()
             _remove_from_mal(anime_id)
             flash("Removed", "success")
@@ -565,10 +667,12 @@ def update_entry(mal_id):
     if not entry:
         flash("Not in your list", "error")
         return redirect(_get_url_for("watchlist"))
+    before = _entry_state(entry, anime)
     entry.watch_status = request.form.get("watch_status", entry.watch_status)
     r = request.form.get("user_rating")
     entry.user_rating  = int(r) if r else None
     entry.updated_at   = datetime.datetime.utcnow()
+    _record_taste_change(current_user.id, before, _entry_state(entry, anime))
     db.session.commit()
     _push_to_mal(anime.mal_id, entry.watch_status, entry.user_rating, entry.episodes_watched)
     flash("Updated", "success")
@@ -582,7 +686,9 @@ def remove_entry(mal_id):
     if anime:
         entry = UserAnimeList.query.filter_by(user_id=current_user.id, anime_id=anime.id).first()
         if entry:
+            before = _entry_state(entry, anime)
             db.session.delete(entry)
+            _record_taste_change(current_user.id, before, None)
             db.session.commit()
             _remove_from_mal(mal_id)
             flash("Removed", "success")
@@ -644,7 +750,7 @@ def recommendations():
     recs = {}
     for entry in completed[:5]:
         try:
-            r = requests.get(f"{MAL_API_BASE}/anime/{entry.anime.mal_id}",
+            r = mal_client.get(f"{MAL_API_BASE}/anime/{entry.anime.mal_id}",
                              headers=_mal_pub(), params={"fields": "recommendations"}, timeout=8)
             if r.ok:
                 for rec in r.json().get("recommendations", [])[:5]:
@@ -658,7 +764,7 @@ def recommendations():
     results = []
     for mid in list(recs.keys())[:20]:
         try:
-            full = requests.get(f"{MAL_API_BASE}/anime/{mid}",
+            full = mal_client.get(f"{MAL_API_BASE}/anime/{mid}",
                                 headers=_mal_pub(), params={"fields": ANIME_FIELDS}, timeout=8)
             if full.ok:
                 results.append(_upsert(full.json()).to_dict())
@@ -668,15 +774,22 @@ def recommendations():
     if not results:
         # Fallback: top ranked
         try:
-            r = requests.get(f"{MAL_API_BASE}/anime/ranking", headers=_mal_pub(),
+            r = mal_client.get(f"{MAL_API_BASE}/anime/ranking", headers=_mal_pub(),
                              params={"ranking_type": "all", "limit": 20, "fields": ANIME_FIELDS}, timeout=10)
             if r.ok:
                 results = [_upsert(i["node"]).to_dict() for i in r.json().get("data", [])]
         except Exception:
             pass
 
-    recommendations_data = []
+    profile = _get_taste_profile(current_user.id)
+    scored = []
     for item in results:
+        score, explanation = taste.score_anime(item, profile)
+        scored.append((item, score, explanation))
+    scored.sort(key=lambda x: x[1], reverse=True)
+
+    recommendations_data = []
+    for item, score, explanation in scored:
         if isinstance(item, dict):
             image_url = item.get("image_url") or ""
             anime_payload = {
@@ -691,8 +804,8 @@ def recommendations():
 
         recommendations_data.append({
             "anime": anime_payload,
-            "score": 0.85,
-            "explanation": "Recommended from your completed and highly rated titles.",
+            "score": round(score, 2),
+            "explanation": explanation,
             "series_info": None,
         })
 
@@ -803,7 +916,7 @@ def mal_callback():
         return redirect(_get_url_for("login"))
 
     verifier = session.pop("mal_verifier", "")
-    resp = requests.post(f"{MAL_AUTH_BASE}/token", data={
+    resp = mal_client.post(f"{MAL_AUTH_BASE}/token", data={
         "client_id": MAL_CLIENT_ID, "client_secret": MAL_CLIENT_SECRET,
         "code": code, "code_verifier": verifier,
         "grant_type": "authorization_code", "redirect_uri": MAL_REDIRECT_URI,
@@ -819,7 +932,7 @@ def mal_callback():
     expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=tokens["expires_in"])
 
     try:
-        mal_info = requests.get(f"{MAL_API_BASE}/users/@me",
+        mal_info = mal_client.get(f"{MAL_API_BASE}/users/@me",
                                 headers={"Authorization": f"Bearer {access}"},
                                 timeout=10).json()
     except Exception as e:
@@ -880,7 +993,7 @@ def _sync_mal_list(user):
                   "plan_to_watch": "plan_to_watch"}
     while True:
         try:
-            r = requests.get(f"{MAL_API_BASE}/users/@me/animelist",
+            r = mal_client.get(f"{MAL_API_BASE}/users/@me/animelist",
                              headers=_mal_user(user),
                              params={"fields": fields, "limit": 100,
                                      "offset": offset, "nsfw": True},
@@ -909,6 +1022,8 @@ def _sync_mal_list(user):
         if not data.get("paging", {}).get("next"):
             break
         offset += 100
+    # A sync can touch the whole list, so rebuild once rather than per-entry deltas
+    _save_taste_profile(user.id, _rebuild_taste_profile(user.id))
     db.session.commit()
     print(f"[MAL Sync] Synced {synced} titles for user {user.username}")
     return synced
@@ -967,6 +1082,10 @@ def create_app(app):
             print(f"[AnimeWatchList] Using PostgreSQL: {db_uri[:60]}...")
         db.create_all()
 
+    if os.environ.get("AW_CATALOG_MIRROR", "").lower() in ("1", "true", "yes"):
+        from catalog_mirror import start_background_mirror
+        start_background_mirror(app)
+
     return app
 
 
@@ -0,0 +1,246 @@
+"""
+MAL catalogue mirror for AnimeWatchList
+
+Crawls the MAL ranking lists (all, airing, tv, movie, bypopularity) into
+aw_anime so discover/search/stats/recommendations can read the local table
+first. Progress is checkpointed per ranking type in aw_catalog_checkpoint,
+so an interrupted run resumes from the last committed page; a finished
+ranking starts over on the next run and only rewrites rows whose
+updated_at is older than --stale-hours.
+
+Usage:
+    python catalog_mirror.py                      # resume / refresh all rankings
+    python catalog_mirror.py --ranking airing     # one ranking only
+    python catalog_mirror.py --restart --max-pages 4
+
+Set AW_CATALOG_MIRROR=1 to run it as a background thread inside the app.
+Only one process per host mirrors at a time: the run holds an exclusive lock
+on data/catalog_mirror.lock, so with several gunicorn workers one of them
+crawls and the others take over if it exits. Ranking pages bypass the MAL
+response cache so the crawl doesn't evict entries users asked for.
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import threading
+
+try:
+    import fcntl
+except ImportError:      # Windows dev boxes: single process, no lock needed
+    fcntl = None
+
+from dotenv import load_dotenv
+
+from mal_client import mal_client
+
+load_dotenv(override=False)
+
+RANKING_TYPES = ["all", "airing", "tv", "movie", "bypopularity"]
+PAGE_SIZE     = 500          # MAL's maximum for /anime/ranking
+REQUEST_DELAY = 1.0          # seconds between ranking page requests
+STALE_HOURS   = 24
+LOCK_RETRY    = 300          # seconds between takeover attempts by idle workers
+LOCK_PATH     = os.environ.get("AW_CATALOG_MIRROR_LOCK",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            "data", "catalog_mirror.lock"))
+
+
+def _aw():
+    """The loaded AnimeWatchList app module, however it was imported."""
+    for name in ("animewatchlist.app", "app"):
+        mod = sys.modules.get(name)
+        if mod is not None and hasattr(mod, "CatalogCheckpoint"):
+            return mod
+    import app as mod
+    return mod
+
+
+class _Throughput:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.pages = self.seen = self.written = self.skipped = 0
+
+    def rate(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return self.seen / elapsed, self.written / elapsed
+
+    def summary(self):
+        seen_rate, write_rate = self.rate()
+        return (f"{self.pages} pages, {self.seen} rows seen ({seen_rate:.1f}/s), "
+                f"{self.written} written ({write_rate:.1f}/s), {self.skipped} fresh/skipped "
+                f"in {time.monotonic() - self.started:.1f}s")
+
+
+def acquire_mirror_lock(path=LOCK_PATH):
+    """Open file holding the exclusive mirror lock, or None if another process has it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handle = open(path, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def _checkpoint(aw, ranking_type, restart=False):
+    cp = aw.CatalogCheckpoint.query.filter_by(ranking_type=ranking_type).first()
+    if cp is None:
+        cp = aw.CatalogCheckpoint(ranking_type=ranking_type, next_offset=0,
+                                  finished=False, rows_seen=0, rows_written=0)
+        aw.db.session.add(cp)
+    elif restart or cp.finished:
+        cp.next_offset, cp.finished = 0, False
+        cp.rows_seen = cp.rows_written = 0
+    aw.db.session.commit()
+    return cp
+
+
+def mirror_ranking(ranking_type, stale_hours=STALE_HOURS, delay=REQUEST_DELAY,
+                   max_pages=None, restart=False, stats=None, stop_event=None):
+    """Mirror one ranking list, committing rows + checkpoint together per page."""
+    aw = _aw()
+    stats = stats or _Throughput()
+    cp = _checkpoint(aw, ranking_type, restart)
+    stale_before = datetime.datetime.utcnow() - datetime.timedelta(hours=stale_hours)
+    print(f"[Catalog] {ranking_type}: starting at offset {cp.next_offset}")
+
+    pages, last_request = 0, 0.0
+    while not cp.finished and (max_pages is None or pages < max_pages):
+        if stop_event is not None and stop_event.is_set():
+            break
+        wait = delay - (time.monotonic() - last_request)
+        if wait > 0:
+            time.sleep(wait)
+        last_request = time.monotonic()
+        try:
+            resp = mal_client.get(f"{aw.MAL_API_BASE}/anime/ranking", headers=aw._mal_pub(),
+                                  params={"ranking_type": ranking_type, "limit": PAGE_SIZE,
+                                          "offset": cp.next_offset, "fields": aw.ANIME_FIELDS},
+                                  timeout=30, use_cache=False)
+        except Exception as e:
+            print(f"[Catalog] {ranking_type}: request failed at offset {cp.next_offset}: {e}")
+            break
+        if not resp.ok:
+            print(f"[Catalog] {ranking_type}: API error {resp.status_code} at offset {cp.next_offset}")
+            break
+
+        payload = resp.json()
+        nodes = [item["node"] for item in payload.get("data", []) if item.get("node")]
+        existing = {a.mal_id: a for a in
+                    aw.Anime.query.filter(aw.Anime.mal_id.in_([n.get("id") for n in nodes])).all()}
+        written = 0
+        for node in nodes:
+            anime = existing.get(node.get("id"))
+            if anime is not None and anime.updated_at and anime.updated_at >= stale_before:
+                stats.skipped += 1
+                continue
+            if anime is None:
+                anime = aw.Anime(mal_id=node["id"])
+                aw.db.session.add(anime)
+                existing[anime.mal_id] = anime
+            aw._fill_anime(anime, node)
+            written += 1
+
+        cp.next_offset  += len(nodes)
+        cp.rows_seen    += len(nodes)
+        cp.rows_written += written
+        cp.finished      = not nodes or not payload.get("paging", {}).get("next")
+        cp.updated_at    = datetime.datetime.utcnow()
+        aw.db.session.commit()
+
+        pages += 1
+        stats.pages   += 1
+        stats.seen    += len(nodes)
+        stats.written += written
+        seen_rate, _ = stats.rate()
+        print(f"[Catalog] {ranking_type}: offset {cp.next_offset}, "
+              f"+{written}/{len(nodes)} written, {seen_rate:.1f} rows/s")
+
+    state = "done" if cp.finished else f"paused at offset {cp.next_offset}"
+    print(f"[Catalog] {ranking_type}: {state}")
+    return stats
+
+
+def mirror_catalog(ranking_types=None, **kwargs):
+    """Mirror every ranking type in turn; returns the combined throughput stats."""
+    stats = _Throughput()
+    for ranking_type in ranking_types or RANKING_TYPES:
+        mirror_ranking(ranking_type, stats=stats, **kwargs)
+        if kwargs.get("stop_event") is not None and kwargs["stop_event"].is_set():
+            break
+    print(f"[Catalog] Finished: {stats.summary()}")
+    return stats
+
+
+def start_background_mirror(flask_app, interval_hours=STALE_HOURS, **kwargs):
+    """
+    Run mirror_catalog() on a daemon thread every `interval_hours` — in the
+    one process that holds the mirror lock. The others keep retrying the lock
+    so a replacement picks up if that worker exits.
+    """
+    stop_event = threading.Event()
+
+    def _loop():
+        lock = None
+        while not stop_event.is_set():
+            if lock is None:
+                lock = acquire_mirror_lock()
+                if lock is None:
+                    stop_event.wait(LOCK_RETRY)
+                    continue
+                print(f"[Catalog] Background mirror running in pid {os.getpid()}")
+            try:
+                with flask_app.app_context():
+                    mirror_catalog(stop_event=stop_event, **kwargs)
+            except Exception as e:
+                print(f"[Catalog] Background mirror failed: {e}")
+            stop_event.wait(interval_hours * 3600)
+        if lock is not None:
+            lock.close()
+
+    thread = threading.Thread(target=_loop, name="aw-catalog-mirror", daemon=True)
+    thread.start()
+    return stop_event
+
+
+def _build_app():
+    from flask import Flask
+    from app import create_app
+    return create_app(Flask("animewatchlist_catalog_mirror"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror the MAL ranking catalogue into aw_anime")
+    parser.add_argument("--ranking", action="append", choices=RANKING_TYPES,
+                        help="ranking type to mirror (repeatable, default: all five)")
+    parser.add_argument("--stale-hours", type=float, default=STALE_HOURS,
+                        help="only rewrite rows older than this")
+    parser.add_argument("--delay", type=float, default=REQUEST_DELAY,
+                        help="minimum seconds between MAL requests")
+    parser.add_argument("--max-pages", type=int, default=None,
+                        help="stop each ranking after this many pages (resumable)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore saved checkpoints and start from offset 0")
+    args = parser.parse_args(argv)
+
+    lock = acquire_mirror_lock()
+    if lock is None:
+        print(f"[Catalog] Another process is already mirroring ({LOCK_PATH}); exiting")
+        return 1
+    try:
+        flask_app = _build_app()
+        with flask_app.app_context():
+            mirror_catalog(args.ranking, stale_hours=args.stale_hours, delay=args.delay,
+                           max_pages=args.max_pages, restart=args.restart)
+    finally:
+        lock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
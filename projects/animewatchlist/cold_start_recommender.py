@@ -1,107 +1,128 @@
 import re
+import json
 from collections import defaultdict
 from anime_series_grouper import get_anime_details, normalize_title
 
-def create_user_profile(user_watched_list):
-    """
-    Creates a user preference profile from their watched list.
-    user_watched_list is a list of anime dicts from the db, including 'user_rating'
-    and full anime details fetched from the API.
-    """
-    profile = {
+def _names(value):
+    """Genre/studio names from either the stored CSV string or MAL's [{'name': ...}] list."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    names = []
+    for item in value:
+        name = item.get('name', '') if isinstance(item, dict) else str(item)
+        if name:
+            names.append(name)
+    return names
+
+def empty_profile():
+    return {
         "loved_genres": defaultdict(int),
         "liked_genres": defaultdict(int),
         "disliked_genres": defaultdict(int),
         "favorite_studios": defaultdict(int),
         "loved_anime_titles": {}, # mal_id -> title
-        "user_ratings": {} # mal_id -> rating
+        "user_ratings": {}, # mal_id -> rating
+        "rating_sum": 0,
+        "status_counts": defaultdict(int),
     }
 
-    if not user_watched_list:
-        print("create_user_profile: No watched list provided")
+def _bump(counter, key, amount):
+    counter[key] += amount
+    if counter[key] <= 0:
+        # Keep zero-weight keys out so score_anime's set intersections stay exact
+        del counter[key]
+
+def apply_entry(profile, entry, sign=1):
+    """
+    Add (sign=1) or retract (sign=-1) one list entry's contribution.
+    entry: {'mal_id', 'title', 'rating', 'status', 'genres', 'studios'}
+    """
+    if not entry or not entry.get('mal_id'):
         return profile
+    mal_id = entry['mal_id']
+    if entry.get('status'):
+        _bump(profile['status_counts'], entry['status'], sign)
 
-    print(f"create_user_profile: Processing {len(user_watched_list)} anime")
-    
-    for anime in user_watched_list:
-        if not anime:
-            continue
-            
-        # Handle both 'id' and 'mal_id' keys
-        mal_id = anime.get('mal_id') or anime.get('id')
-        if not mal_id:
-            print(f"Skipping anime with no mal_id: {anime.get('title', 'Unknown')}")
-            continue
+    rating = entry.get('rating')
+    if rating is None:
+        return profile
 
-        rating = anime.get('user_rating')
-        if rating is None:
-            print(f"Skipping anime with no rating: {anime.get('title', 'Unknown')}")
-            continue
-            
+    if sign > 0:
         profile['user_ratings'][mal_id] = rating
-        print(f"Processing {anime.get('title', 'Unknown')} (ID: {mal_id}, Rating: {rating})")
-
-        # Handle genres - MAL API format vs stored format
-        genres = []
-        if anime.get('genres'):
-            if isinstance(anime['genres'], str):
-                # Stored format: "Action,Drama,Fantasy"
-                genres = [g.strip() for g in anime['genres'].split(',') if g.strip()]
-            elif isinstance(anime['genres'], list):
-                # MAL API format: [{'name': 'Action'}, ...]
-                genres = []
-                for genre in anime['genres']:
-                    if isinstance(genre, dict):
-                        genres.append(genre.get('name', ''))
-                    else:
-                        genres.append(str(genre))
-
-        # Handle studios
-        studios = []
-        if anime.get('studios'):
-            if isinstance(anime['studios'], str):
-                # Stored format: "Studio Name"
-                studios = [anime['studios']] if anime['studios'] else []
-            elif isinstance(anime['studios'], list):
-                # MAL API format: [{'name': 'Studio Name'}, ...]
-                for studio in anime['studios']:
-                    if isinstance(studio, dict):
-                        studios.append(studio.get('name', ''))
-                    else:
-                        studios.append(str(studio))
-        elif anime.get('studio'):
-            # Single studio stored format
-            studios = [anime['studio']] if anime['studio'] else []
-
-        print(f"  Genres: {genres}")
-        print(f"  Studios: {studios}")
-
-        if rating == 5:
-            profile['loved_anime_titles'][mal_id] = anime.get('title', 'Unknown')
-            for genre in genres:
-                if genre:
-                    profile['loved_genres'][genre] += 1
-            for studio in studios:
-                if studio:
-                    profile['favorite_studios'][studio] += 2 # Higher weight for loved anime studios
-        elif rating == 4:
-            for genre in genres:
-                if genre:
-                    profile['liked_genres'][genre] += 1
-            for studio in studios:
-                if studio:
-                    profile['favorite_studios'][studio] += 1
-        elif rating is not None and rating <= 2:
-            for genre in genres:
-                if genre:
-                    profile['disliked_genres'][genre] += 1
-
-    print(f"Profile created:")
-    print(f"  Loved genres: {dict(profile['loved_genres'])}")
-    print(f"  Liked genres: {dict(profile['liked_genres'])}")
-    print(f"  Favorite studios: {dict(profile['favorite_studios'])}")
-    print(f"  Total ratings: {len(profile['user_ratings'])}")
-    
+    else:
+        profile['user_ratings'].pop(mal_id, None)
+    profile['rating_sum'] += sign * rating
+
+    genres = _names(entry.get('genres'))
+    studios = _names(entry.get('studios'))
+    if rating == 5:
+        if sign > 0:
+            profile['loved_anime_titles'][mal_id] = entry.get('title', 'Unknown')
+        else:
+            profile['loved_anime_titles'].pop(mal_id, None)
+        for genre in genres:
+            _bump(profile['loved_genres'], genre, sign)
+        for studio in studios:
+            _bump(profile['favorite_studios'], studio, 2 * sign) # Higher weight for loved anime studios
+    elif rating == 4:
+        for genre in genres:
+            _bump(profile['liked_genres'], genre, sign)
+        for studio in studios:
+            _bump(profile['favorite_studios'], studio, sign)
+    elif rating <= 2:
+        for genre in genres:
+            _bump(profile['disliked_genres'], genre, sign)
+    return profile
+
+def apply_entry_change(profile, before, after):
+    """Delta-update a profile when a list entry is added, re-rated, re-statused or removed."""
+    apply_entry(profile, before, -1)
+    apply_entry(profile, after, 1)
+    return profile
+
+def dump_profile(profile):
+    """JSON for persistence (mal_id keys become strings)."""
+    return json.dumps({k: dict(v) if isinstance(v, dict) else v for k, v in profile.items()})
+
+def load_profile(raw):
+    profile = empty_profile()
+    if not raw:
+        return profile
+    data = json.loads(raw)
+    for key in ("loved_genres", "liked_genres", "disliked_genres", "favorite_studios", "status_counts"):
+        profile[key].update(data.get(key, {}))
+    profile['loved_anime_titles'] = {int(k): v for k, v in data.get('loved_anime_titles', {}).items()}
+    profile['user_ratings'] = {int(k): v for k, v in data.get('user_ratings', {}).items()}
+    profile['rating_sum'] = data.get('rating_sum', 0)
+    return profile
+
+def average_rating(profile):
+    rated = len(profile['user_ratings'])
+    return round(profile['rating_sum'] / rated, 2) if rated else 0
+
+def create_user_profile(user_watched_list):
+    """
+    Creates a user preference profile from their watched list.
+    user_watched_list is a list of anime dicts from the db, including 'user_rating'
+    and either MAL-style or stored genre/studio fields.
+
+    This is the from-scratch build; callers that persist the profile should keep
+    it current with apply_entry_change() instead of rebuilding.
+    """
+    profile = empty_profile()
+    for anime in user_watched_list or []:
+        if not anime:
+            continue
+        apply_entry(profile, {
+            'mal_id': anime.get('mal_id') or anime.get('id'),
+            'title': anime.get('title', 'Unknown'),
+            'rating': anime.get('user_rating'),
+            'status': anime.get('watch_status'),
+            'genres': anime.get('genres'),
+            'studios': anime.get('studios') or anime.get('studio'),
+        })
     return profile
 
 def score_anime(anime_details, profile):
@@ -196,15 +217,16 @@ def score_anime(anime_details, profile):
 
     return max(0, min(1, score)), final_explanation # Clamp score between 0 and 1
 
-def generate_recommendations(user_watched_list, candidates):
+def generate_recommendations(user_watched_list, candidates, profile=None):
     """
     Generates a scored and sorted list of recommendations.
     - user_watched_list: List of detailed anime dicts the user has watched and rated.
     - candidates: List of anime dicts to be considered for recommendation.
+    - profile: Optional persisted taste profile; skips rebuilding from the watched list.
     """
-    print(f"generate_recommendations called with {len(user_watched_list)} watched, {len(candidates)} candidates")
+    print(f"generate_recommendations called with {len(user_watched_list or [])} watched, {len(candidates)} candidates")
     
-    if not user_watched_list:
+    if not user_watched_list and profile is None:
         print("No user watched list provided")
         return []
     
@@ -212,8 +234,9 @@ def generate_recommendations(user_watched_list, candidates):
         print("No candidates provided")
         return []
     
-    print("Creating user profile...")
-    profile = create_user_profile(user_watched_list)
+    if profile is None:
+        print("Creating user profile...")
+        profile = create_user_profile(user_watched_list)
     
     # Check if profile has meaningful data
     total_profile_data = (len(profile['loved_genres']) + len(profile['liked_genres']) + 
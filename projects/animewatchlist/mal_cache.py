@@ -0,0 +1,283 @@
+"""
+SQLite-backed response cache for public MAL GET endpoints.
+
+Sits underneath mal_client.MALClient: ranking, search, seasonal and detail
+lookups are served from disk while fresh, concurrent identical requests are
+coalesced onto a single upstream fetch, and the store is LRU-evicted once it
+grows past a byte budget. The stored byte total is kept in a meta row by
+triggers, so every process sharing the file sees it without a SUM scan.
+Per-user endpoints (anything sent with an Authorization header, or under
+/users/) are never cached.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "data", "mal_cache.sqlite3")
+
+# Seconds each endpoint family stays fresh. Override with e.g.
+# MAL_CACHE_TTLS="ranking=900,search=120".
+DEFAULT_TTLS = {
+    "ranking":  600,
+    "seasonal": 1800,
+    "search":   300,
+    "detail":   3600,
+}
+
+# (family, path regex) — first match wins
+ENDPOINT_PATTERNS = [
+    ("ranking",  re.compile(r"/v2/anime/ranking/?$")),
+    ("seasonal", re.compile(r"/v2/anime/season/\d+/\w+/?$")),
+    ("detail",   re.compile(r"/v2/anime/\d+/?$")),
+    ("search",   re.compile(r"/v2/anime/?$")),
+]
+
+
+def _parse_ttls(raw):
+    ttls = dict(DEFAULT_TTLS)
+    for part in (raw or "").split(","):
+        name, _, secs = part.partition("=")
+        if name.strip() and secs.strip().isdigit():
+            ttls[name.strip()] = int(secs)
+    return ttls
+
+
+def endpoint_family(url):
+    path = urlsplit(url).path
+    for family, pattern in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return family
+    return None
+
+
+def normalize_params(params):
+    """Order-independent query string; `fields` lists are sorted too."""
+    items = []
+    for k, v in sorted((params or {}).items()):
+        if v is None:
+            continue
+        v = str(v).strip()
+        if k == "fields":
+            v = ",".join(sorted(f.strip() for f in v.split(",") if f.strip()))
+        elif k == "q":
+            v = " ".join(v.lower().split())
+        items.append((k, v))
+    return urlencode(items)
+
+
+def cache_key(method, url, params=None):
+    raw = f"{method.upper()} {url.rstrip('/')}?{normalize_params(params)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class MALResponseCache:
+    """Disk cache with per-endpoint TTLs, request coalescing and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None, max_bytes=64 * 1024 * 1024):
+        self.path      = path
+        self.ttls      = dict(ttls or DEFAULT_TTLS)
+        self.max_bytes = max_bytes
+
+        self._lock     = threading.Lock()
+        self._inflight = {}   # key -> threading.Event
+        self._hits = self._misses = self._coalesced = self._evictions = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key         TEXT PRIMARY KEY,
+                family      TEXT NOT NULL,
+                url         TEXT NOT NULL,
+                status      INTEGER NOT NULL,
+                headers     TEXT NOT NULL,
+                body        BLOB NOT NULL,
+                size        INTEGER NOT NULL,
+                expires_at  REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+        self._init_total()
+
+    def _init_total(self):
+        """Meta row holding SUM(size), seeded once and then kept by triggers."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (name, value) "
+                "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM responses")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tr_responses_insert AFTER INSERT ON responses BEGIN
+                    UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_bytes';
+                END""")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tr_responses_delete AFTER DELETE ON responses BEGIN
+                    UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_bytes';
+                END""")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS tr_responses_update AFTER UPDATE OF size ON responses BEGIN
+                    UPDATE cache_meta SET value = value - OLD.size + NEW.size WHERE name = 'total_bytes';
+                END""")
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _total_bytes(self):
+        return self._conn.execute(
+            "SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    # ── lookup / store ────────────────────────────────────────────────────
+    def _load(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, expires_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            if row[4] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return self._to_response(*row[:4])
+
+    def _store(self, key, family, resp):
+        body = resp.content
+        headers = json.dumps({k: v for k, v in resp.headers.items()
+                              if k.lower() in ("content-type", "etag", "last-modified")})
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete
+            # doesn't fire the delete trigger, which would leave the total too high
+            self._conn.execute(
+                "INSERT INTO responses "
+                "(key, family, url, status, headers, body, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET family = excluded.family, url = excluded.url, "
+                "status = excluded.status, headers = excluded.headers, body = excluded.body, "
+                "size = excluded.size, expires_at = excluded.expires_at, last_access = excluded.last_access",
+                (key, family, resp.url, resp.status_code, headers, body, len(body),
+                 now + self.ttls[family], now))
+            self._evict_locked()
+
+    def _evict_locked(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        total = self._total_bytes()
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self._evictions += 1
+
+    @staticmethod
+    def _to_response(url, status, headers, body):
+        resp = requests.Response()
+        resp.url         = url
+        resp.status_code = status
+        resp.reason      = "OK"
+        resp.headers     = CaseInsensitiveDict(json.loads(headers))
+        resp.headers["X-Cache"] = "HIT"
+        resp._content    = body
+        resp.encoding    = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+        return resp
+
+    # ── public API ────────────────────────────────────────────────────────
+    def cacheable_family(self, method, url, headers=None):
+        """Endpoint family for a cacheable request, else None."""
+        if method.upper() != "GET":
+            return None
+        if headers and any(h.lower() == "authorization" for h in headers):
+            return None
+        family = endpoint_family(url)
+        return family if family and self.ttls.get(family, 0) > 0 else None
+
+    def fetch(self, family, url, params, do_request):
+        """Return a cached response, or call `do_request()` once for all waiters."""
+        key = cache_key("GET", url, params)
+        cached = self._load(key)
+        if cached is not None:
+            with self._lock:
+                self._hits += 1
+            return cached
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            event.wait(timeout=30)
+            cached = self._load(key)
+            if cached is not None:
+                return cached
+            # Leader failed or got a non-200 — fetch for ourselves.
+            return do_request()
+
+        try:
+            resp = do_request()
+            if resp.status_code == 200:
+                self._store(key, family, resp)
+            return resp
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self._total_bytes()
+            return {
+                "entries":   entries,
+                "bytes":     size,
+                "max_bytes": self.max_bytes,
+                "hits":      self._hits,
+                "misses":    self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "ttls":      dict(self.ttls),
+            }
+
+
+def cache_from_env():
+    """Build the cache from MAL_CACHE_* env vars; None when disabled."""
+    if os.environ.get("MAL_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    try:
+        return MALResponseCache(
+            path=os.environ.get("MAL_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttls=_parse_ttls(os.environ.get("MAL_CACHE_TTLS")),
+            max_bytes=int(os.environ.get("MAL_CACHE_MAX_MB", 64)) * 1024 * 1024,
+        )
+    except (sqlite3.Error, OSError) as e:
+        print(f"[MAL Cache] Disabled — could not open cache: {e}")
+        return None
@@ -0,0 +1,116 @@
+"""
+Shared MyAnimeList HTTP client.
+
+Every MAL call (API + OAuth token endpoint) goes through one pooled
+requests.Session so connections to api.myanimelist.net are kept alive and
+reused instead of paying a fresh TCP+TLS handshake per request. Public GET
+endpoints are additionally served from mal_cache.MALResponseCache.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from mal_cache import cache_from_env
+
+# Pool sizing — one pool per host, sized for gunicorn threads + the
+# recommendation engine's worker pool.
+POOL_CONNECTIONS = int(os.environ.get("MAL_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE     = int(os.environ.get("MAL_POOL_MAXSIZE", 16))
+MAX_RETRIES      = int(os.environ.get("MAL_MAX_RETRIES", 2))
+DEFAULT_TIMEOUT  = 10
+
+
+class MALClient:
+    """Thin wrapper around a keep-alive requests.Session for MAL traffic."""
+
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 max_retries=MAX_RETRIES, cache=None):
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # Token exchanges (POST) are not idempotent — never replay them.
+            allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,   # hand the last response back so callers can check .ok
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self.cache = cache
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors   = 0
+
+    def request(self, method, url, timeout=DEFAULT_TIMEOUT, use_cache=True, **kwargs):
+        """use_cache=False always goes upstream and leaves the response cache untouched."""
+        family = (self.cache.cacheable_family(method, url, kwargs.get("headers"))
+                  if self.cache and use_cache else None)
+        if family:
+            return self.cache.fetch(family, url, kwargs.get("params"),
+                                    lambda: self._send(method, url, timeout, **kwargs))
+        return self._send(method, url, timeout, **kwargs)
+
+    def _send(self, method, url, timeout, **kwargs):
+        with self._lock:
+            self._requests += 1
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def stats(self):
+        """Connection reuse metrics aggregated over every host pool."""
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{key.key_scheme}://{key.key_host}"] = {
+                "connections_opened": pool.num_connections,
+                "requests":           pool.num_requests,
+            }
+        opened = sum(p["connections_opened"] for p in pools.values())
+        sent   = sum(p["requests"] for p in pools.values())
+        with self._lock:
+            calls, errors = self._requests, self._errors
+        return {
+            "calls":              calls,
+            "errors":             errors,
+            "requests_sent":      sent,   # includes urllib3 retries
+            "connections_opened": opened,
+            "connections_reused": max(sent - opened, 0),
+            "reuse_ratio":        round((sent - opened) / sent, 3) if sent else 0.0,
+            "pools":              pools,
+            "cache":              self.cache.stats() if self.cache else None,
+        }
+
+
+# Module-level singleton shared by app.py and the legacy helper modules.
+mal_client = MALClient(cache=cache_from_env())
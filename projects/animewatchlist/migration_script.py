@@ -60,7 +60,10 @@ def add_rating_column():
                 db.session.commit()
             except:
                 pass  # In case there's no active session
-            
+
+            # Serving processes pick the new column up on their next schema
+            # recheck (user_data.SCHEMA_RECHECK_SECONDS)
+
             print("\n🎉 Rating system migration completed successfully!")
             
             # Show final table structure
@@ -1,5 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask import current_app
+import os
+import time
 import datetime
+import threading
+from dataclasses import dataclass
 from sqlalchemy import inspect
 from recommendation_engine import fetch_anime_details_batch
 
@@ -34,14 +39,127 @@ class UserAnimeList(object):
     user_rating = None  # NEW: 0-5 star rating, NULL means not rated
     created_at = None
 
-def check_column_exists(table_name, column_name):
-    """Check if a column exists in the database table."""
+@dataclass(frozen=True)
+class SchemaCapabilities:
+    """Immutable snapshot of which optional columns the live schema has."""
+    anime_columns: frozenset = frozenset()
+    user_anime_list_columns: frozenset = frozenset()
+
+    def has(self, table_name, column_name):
+        if table_name == 'anime':
+            return column_name in self.anime_columns
+        if table_name == 'user_anime_list':
+            return column_name in self.user_anime_list_columns
+        return False
+
+    @property
+    def has_episodes_int(self):
+        return 'episodes_int' in self.anime_columns
+
+    @property
+    def has_score_float(self):
+        return 'score_float' in self.anime_columns
+
+    @property
+    def has_aired_from(self):
+        return 'aired_from' in self.anime_columns
+
+    @property
+    def has_genres(self):
+        return 'genres' in self.anime_columns
+
+    @property
+    def has_studio(self):
+        return 'studio' in self.anime_columns
+
+    @property
+    def has_type(self):
+        return 'type' in self.anime_columns
+
+    @property
+    def has_status(self):
+        return 'status' in self.anime_columns
+
+    @property
+    def has_user_rating(self):
+        return 'user_rating' in self.user_anime_list_columns
+
+    @property
+    def has_enhanced_columns(self):
+        return self.has_episodes_int and self.has_score_float
+
+
+# Detected in init_user_data() and re-detected every SCHEMA_RECHECK_SECONDS by
+# a background thread, so a migration run from another process
+# (migration_script.py) reaches the serving workers without a restart. The hot
+# paths below only read this snapshot and never reflect the schema themselves.
+SCHEMA_RECHECK_SECONDS = int(os.environ.get("AW_SCHEMA_RECHECK_SECONDS", 300))
+schema_capabilities = None
+# anime columns the Anime model chosen in init_user_data maps; a recheck never
+# reports columns the model can't take as kwargs (None until init_user_data)
+_mapped_anime_columns = None
+_refresh_thread = None
+_refresh_pid = None
+_refresh_app = None
+_refresh_lock = threading.Lock()
+
+def _reflect_columns(inspector, table_name):
+    try:
+        return frozenset(col['name'] for col in inspector.get_columns(table_name))
+    except Exception:
+        return frozenset()
+
+def refresh_schema_capabilities():
+    """Reflect the optional columns once and publish a new snapshot."""
+    global schema_capabilities
     try:
         inspector = inspect(db.engine)
-        columns = [col['name'] for col in inspector.get_columns(table_name)]
-        return column_name in columns
-    except:
-        return False
+        anime_columns = _reflect_columns(inspector, 'anime')
+        if _mapped_anime_columns is not None:
+            anime_columns &= _mapped_anime_columns
+        schema_capabilities = SchemaCapabilities(
+            anime_columns=anime_columns,
+            user_anime_list_columns=_reflect_columns(inspector, 'user_anime_list'),
+        )
+    except Exception:
+        schema_capabilities = SchemaCapabilities()
+    return schema_capabilities
+
+def _refresh_loop(app):
+    while True:
+        time.sleep(SCHEMA_RECHECK_SECONDS)
+        try:
+            if app is not None:
+                with app.app_context():
+                    refresh_schema_capabilities()
+            else:
+                refresh_schema_capabilities()
+        except Exception as e:
+            print(f"[user_data] Schema recheck failed: {e}")
+
+def _ensure_refresh_thread():
+    """Start this process's recheck thread (a forked worker inherits the snapshot but not the thread)."""
+    global _refresh_thread, _refresh_pid
+    if _refresh_thread is not None and _refresh_pid == os.getpid() and _refresh_thread.is_alive():
+        return
+    with _refresh_lock:
+        if _refresh_thread is None or _refresh_pid != os.getpid() or not _refresh_thread.is_alive():
+            _refresh_pid = os.getpid()
+            _refresh_thread = threading.Thread(target=_refresh_loop, args=(_refresh_app,),
+                                               name="schema-recheck", daemon=True)
+            _refresh_thread.start()
+
+def get_schema_capabilities():
+    """Return the cached snapshot, detecting it only on first use."""
+    if schema_capabilities is None:
+        return refresh_schema_capabilities()
+    if _mapped_anime_columns is not None:
+        _ensure_refresh_thread()
+    return schema_capabilities
+
+def check_column_exists(table_name, column_name):
+    """Check if a column exists in the database table (from the schema snapshot)."""
+    return get_schema_capabilities().has(table_name, column_name)
 
 # Functions for user-specific anime data management
 def get_anime_by_mal_id(mal_id):
@@ -54,6 +172,7 @@ def add_anime_to_db(anime_data):
     anime = get_anime_by_mal_id(mal_id)
     
     if not anime:
+        caps = get_schema_capabilities()
         # Basic anime data (always supported)
         anime_kwargs = {
             'mal_id': mal_id,
@@ -64,7 +183,7 @@ def add_anime_to_db(anime_data):
         }
         
         # Enhanced data (only if columns exist)
-        if check_column_exists('anime', 'episodes_int'):
+        if caps.has_episodes_int:
             episodes = anime_data.get("episodes")
             if episodes is None or episodes == "N/A":
                 episodes_int = 0
@@ -75,7 +194,7 @@ def add_anime_to_db(anime_data):
                     episodes_int = 0
             anime_kwargs['episodes_int'] = episodes_int
         
-        if check_column_exists('anime', 'score_float'):
+        if caps.has_score_float:
             score = anime_data.get("score")
             if score is None or score == "N/A":
                 score_float = 0.0
@@ -86,7 +205,7 @@ def add_anime_to_db(anime_data):
                     score_float = 0.0
             anime_kwargs['score_float'] = score_float
         
-        if check_column_exists('anime', 'aired_from'):
+        if caps.has_aired_from:
             aired_from = None
             if anime_data.get("aired", {}).get("from"):
                 try:
@@ -97,7 +216,7 @@ def add_anime_to_db(anime_data):
                     aired_from = None
             anime_kwargs['aired_from'] = aired_from
         
-        if check_column_exists('anime', 'genres'):
+        if caps.has_genres:
             genres = []
             if anime_data.get("genres"):
                 genres = [genre["name"] for genre in anime_data["genres"]]
@@ -105,16 +224,16 @@ def add_anime_to_db(anime_data):
                 genres = anime_data["genre"]
             anime_kwargs['genres'] = ",".join(genres) if genres else ""
         
-        if check_column_exists('anime', 'studio'):
+        if caps.has_studio:
             studio = ""
             if anime_data.get("studios") and len(anime_data["studios"]) > 0:
                 studio = anime_data["studios"][0]["name"]
             anime_kwargs['studio'] = studio
         
-        if check_column_exists('anime', 'type'):
+        if caps.has_type:
             anime_kwargs['type'] = anime_data.get("type", "")
         
-        if check_column_exists('anime', 'status'):
+        if caps.has_status:
             anime_kwargs['status'] = anime_data.get("status", "")
         
         anime = db.Anime(**anime_kwargs)
@@ -131,10 +250,11 @@ def get_user_anime_list(user_id, sort_by="date_added", sort_order="desc", fetch_
     query = query.join(db.Anime)
     
     # Check which columns exist for sorting
-    has_episodes_int = check_column_exists('anime', 'episodes_int')
-    has_score_float = check_column_exists('anime', 'score_float')
-    has_aired_from = check_column_exists('anime', 'aired_from')
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    caps = get_schema_capabilities()
+    has_episodes_int = caps.has_episodes_int
+    has_score_float = caps.has_score_float
+    has_aired_from = caps.has_aired_from
+    has_user_rating = caps.has_user_rating
     
     # Apply sorting based on available columns
     if sort_by == "title":
@@ -232,10 +352,11 @@ def get_user_stats(user_id):
     total_anime = len(user_animes)
     
     # Check which columns exist for stats calculation
-    has_episodes_int = check_column_exists('anime', 'episodes_int')
-    has_score_float = check_column_exists('anime', 'score_float')
-    has_genres = check_column_exists('anime', 'genres')
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    caps = get_schema_capabilities()
+    has_episodes_int = caps.has_episodes_int
+    has_score_float = caps.has_score_float
+    has_genres = caps.has_genres
+    has_user_rating = caps.has_user_rating
     
     # Calculate total episodes
     if has_episodes_int:
@@ -384,7 +505,7 @@ def mark_anime_for_user(user_id, anime_data, status, user_rating=None):
         anime_id=anime.id
     ).first()
     
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    has_user_rating = get_schema_capabilities().has_user_rating
     
     if user_anime:
         # Update existing status
@@ -427,6 +548,7 @@ def add_anime_to_db(anime_data):
     
     if not anime:
         print(f"Adding new anime to database: {anime_data.get('title', 'Unknown')} (ID: {mal_id})")
+        caps = get_schema_capabilities()
         
         # Basic anime data (always supported)
         anime_kwargs = {
@@ -438,7 +560,7 @@ def add_anime_to_db(anime_data):
         }
         
         # Enhanced data (only if columns exist)
-        if check_column_exists('anime', 'episodes_int'):
+        if caps.has_episodes_int:
             episodes = anime_data.get("episodes") or anime_data.get("num_episodes")
             if episodes is None or episodes == "N/A":
                 episodes_int = 0
@@ -449,7 +571,7 @@ def add_anime_to_db(anime_data):
                     episodes_int = 0
             anime_kwargs['episodes_int'] = episodes_int
         
-        if check_column_exists('anime', 'score_float'):
+        if caps.has_score_float:
             score = anime_data.get("score") or anime_data.get("mean")
             if score is None or score == "N/A":
                 score_float = 0.0
@@ -460,7 +582,7 @@ def add_anime_to_db(anime_data):
                     score_float = 0.0
             anime_kwargs['score_float'] = score_float
         
-        if check_column_exists('anime', 'aired_from'):
+        if caps.has_aired_from:
             aired_from = None
             if anime_data.get("aired", {}).get("from"):
                 try:
@@ -476,7 +598,7 @@ def add_anime_to_db(anime_data):
                     aired_from = None
             anime_kwargs['aired_from'] = aired_from
         
-        if check_column_exists('anime', 'genres'):
+        if caps.has_genres:
             genres = []
             if anime_data.get("genres"):
                 # Handle MAL API format
@@ -488,7 +610,7 @@ def add_anime_to_db(anime_data):
                             genres.append(str(genre))
             anime_kwargs['genres'] = ",".join(filter(None, genres))
         
-        if check_column_exists('anime', 'studio'):
+        if caps.has_studio:
             studio = ""
             if anime_data.get("studios") and len(anime_data["studios"]) > 0:
                 studio_data = anime_data["studios"][0]
@@ -498,10 +620,10 @@ def add_anime_to_db(anime_data):
                     studio = str(studio_data)
             anime_kwargs['studio'] = studio
         
-        if check_column_exists('anime', 'type'):
+        if caps.has_type:
             anime_kwargs['type'] = anime_data.get("type") or anime_data.get("media_type", "")
         
-        if check_column_exists('anime', 'status'):
+        if caps.has_status:
             anime_kwargs['status'] = anime_data.get("status", "")
         
         # Final validation before creating
@@ -526,7 +648,7 @@ def add_anime_to_db(anime_data):
 
 def update_anime_rating_for_user(user_id, mal_id, user_rating):
     """Update the user's rating for a specific anime."""
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    has_user_rating = get_schema_capabilities().has_user_rating
     if not has_user_rating:
         return False
     
@@ -597,7 +719,7 @@ def get_anime_status_for_user(user_id, mal_id):
 
 def get_anime_rating_for_user(user_id, mal_id):
     """Get the user's rating for a specific anime."""
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    has_user_rating = get_schema_capabilities().has_user_rating
     if not has_user_rating:
         return None
         
@@ -618,12 +740,8 @@ def init_user_data(database):
     db = database
     
     # Check which columns exist in the current database
-    has_enhanced_columns = (
-        check_column_exists('anime', 'episodes_int') and
-        check_column_exists('anime', 'score_float')
-    )
-    
-    has_user_rating = check_column_exists('user_anime_list', 'user_rating')
+    caps = refresh_schema_capabilities()
+    has_enhanced_columns = caps.has_enhanced_columns
     
     # Define Anime model based on available columns
     if has_enhanced_columns:
@@ -706,4 +824,14 @@ def init_user_data(database):
     db.Anime = Anime
     db.UserAnimeList = UserAnimeList
     
+    # Later rechecks only report columns this Anime model maps, and run in the background
+    global _mapped_anime_columns, _refresh_app
+    _mapped_anime_columns = frozenset(column.name for column in Anime.__table__.columns)
+    try:
+        _refresh_app = current_app._get_current_object()
+    except RuntimeError:
+        _refresh_app = None  # No app context: the engine is used directly
+    refresh_schema_capabilities()
+    _ensure_refresh_thread()
+    
     return Anime, UserAnimeList
\ No newline at end of file
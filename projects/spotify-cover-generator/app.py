@@ -12,14 +12,16 @@ from pathlib import Path
 from urllib.parse import urlparse
 from functools import wraps
 import hashlib # Added import
+import importlib.util
+import threading
+import atexit
 
-import requests
 import base64
 import secrets
 from collections import Counter
 
 from flask import (Flask, request, render_template, send_from_directory, jsonify,
-                   session, redirect, url_for, flash, make_response)
+                   session, redirect, url_for, flash, make_response, g)
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from flask_sqlalchemy import SQLAlchemy
@@ -27,9 +29,13 @@ from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-from sqlalchemy import text, func # Added func
+from sqlalchemy import text, func, event # Added func
 
-import spotify_client # Added import
+from lazy_imports import lazy_module
+from fault_handling import http_client  # Pooled client for Spotify accounts/API calls
+from job_queue import generation_queue
+from guest_limiter import GuestQuotaLimiter
+from ttl_cache import TTLCache, MISSING
 
 # Monitoring and fault handling imports
 try:
@@ -39,7 +45,7 @@ try:
     )
     from fault_handling import (
         fault_tolerant_api_call, GracefulDegradation, db_failover,
-        create_user_friendly_error_messages, FaultContext, http_client
+        create_user_friendly_error_messages, FaultContext
     )
     print("✅ Monitoring system imported successfully")
 except ImportError as e:
@@ -74,20 +80,9 @@ except ImportError as e:
     SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET')
     SPOTIFY_REDIRECT_URI = os.environ.get('SPOTIFY_REDIRECT_URI', 'http://localhost:5000/spotify-callback')
 
-if os.getenv('RENDER'):
-    print("🔧 Render environment detected - running auto-migration...")
-    try:
-        # Import and run migration
-        import subprocess
-        result = subprocess.run([sys.executable, 'render_db_fix.py'], 
-                              capture_output=True, text=True, timeout=60)
-        if result.returncode == 0:
-            print("✅ Auto-migration completed successfully")
-        else:
-            print(f"⚠️ Auto-migration warnings: {result.stderr}")
-    except Exception as e:
-        print(f"⚠️ Auto-migration failed: {e}")
-        
+# spotipy (and the redis client it imports) is only loaded by the first route that talks to Spotify
+spotify_client = lazy_module("spotify_client")
+
 # Flask app initialization
 app = Flask(__name__,
             template_folder=str(BASE_DIR / "templates"),
@@ -107,6 +102,7 @@ app.config['SQLALCHEMY_DATABASE_URI'] = SPOTIFY_DB_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
+
 migrate = Migrate(app, db)
 
 # Rate limiter
@@ -157,19 +153,31 @@ class User(db.Model):
         return 999 if self.is_premium_user() else 2
 
     def can_generate_today(self):
-        today = datetime.datetime.now(timezone.utc).date()
-        count = GenerationResultDB.query.filter(
-            GenerationResultDB.user_id == self.id,
-            db.func.date(GenerationResultDB.timestamp) == today
-        ).count()
-        return count < self.get_daily_generation_limit()
+        return self.get_generations_today() < self.get_daily_generation_limit()
 
     def get_generations_today(self):
+        """Today's (UTC) generations: one primary-key read of the daily usage counter"""
         today = datetime.datetime.now(timezone.utc).date()
-        return GenerationResultDB.query.filter(
+        usage = db.session.get(DailyGenerationUsage, (self.id, today))
+        if usage is not None:
+            return usage.generations
+        
+        # No counter yet: count today's rows on the (user_id, timestamp) index instead of
+        # DATE(timestamp), and seed the counter if rows predate it
+        day_start = datetime.datetime.combine(today, datetime.time.min)
+        count = GenerationResultDB.query.filter(
             GenerationResultDB.user_id == self.id,
-            db.func.date(GenerationResultDB.timestamp) == today
+            GenerationResultDB.timestamp >= day_start,
+            GenerationResultDB.timestamp < day_start + timedelta(days=1)
         ).count()
+        if count:
+            # Inside the caller's transaction, no commit/rollback of the request session;
+            # if another request seeded the counter first, theirs stands
+            db.session.execute(text(
+                "INSERT INTO spotify_daily_usage (user_id, day, generations) VALUES (:user_id, :day, :count) "
+                "ON CONFLICT (user_id, day) DO NOTHING"
+            ), {"user_id": self.id, "day": today, "count": count})
+        return count
 
     def refresh_spotify_token_if_needed(self):
         if not self.spotify_refresh_token:
@@ -189,7 +197,8 @@ class User(db.Model):
         headers = {'Authorization': f'Basic {auth_header}', 'Content-Type': 'application/x-www-form-urlencoded'}
         data = {'grant_type': 'refresh_token', 'refresh_token': self.spotify_refresh_token}
         try:
-            response = requests.post('https://accounts.spotify.com/api/token', headers=headers, data=data)
+            response = http_client.post('https://accounts.spotify.com/api/token', service_name="spotify_accounts",
+                                        headers=headers, data=data)
             if response.status_code == 200:
                 token_data = response.json()
                 self.spotify_access_token = token_data['access_token']
@@ -328,6 +337,68 @@ class GenerationResultDB(db.Model):
     lora_url = db.Column(db.String(1000))
     user_id = db.Column(db.Integer, db.ForeignKey('spotify_users.id'), nullable=True)
 
+    __table_args__ = (
+        db.Index('idx_generation_results_user_timestamp', 'user_id', 'timestamp'),
+    )
+
+class DailyGenerationUsage(db.Model):
+    """Generations per user per UTC day, kept in step with GenerationResultDB inserts and deletes"""
+    __tablename__ = 'spotify_daily_usage'
+    user_id = db.Column(db.Integer, db.ForeignKey('spotify_users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    generations = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyGenerationUsage {self.user_id} {self.day}: {self.generations}>'
+
+@event.listens_for(GenerationResultDB, 'after_insert')
+def _count_daily_generation(mapper, connection, target):
+    """
+    Increment the user's daily counter in the same transaction as the generation
+    row. A missing counter is seeded from the day's rows (on the user/timestamp
+    index), so generations saved before the counter existed still count.
+    """
+    if not target.user_id:
+        return
+    today = datetime.datetime.now(timezone.utc).date()
+    day_start = datetime.datetime.combine(today, datetime.time.min)
+    connection.execute(text(
+        "INSERT INTO spotify_daily_usage (user_id, day, generations) "
+        "SELECT :user_id, :day, COUNT(*) FROM spotify_generation_results "
+        "WHERE user_id = :user_id AND timestamp >= :day_start AND timestamp < :day_end "
+        "ON CONFLICT (user_id, day) DO UPDATE SET generations = spotify_daily_usage.generations + 1"
+    ), {"user_id": target.user_id, "day": today,
+        "day_start": day_start, "day_end": day_start + timedelta(days=1)})
+
+@event.listens_for(GenerationResultDB, 'after_delete')
+def _uncount_daily_generation(mapper, connection, target):
+    """Deleting a generation gives its day's usage back (ORM deletes; bulk query deletes bypass this)"""
+    if not target.user_id or not target.timestamp:
+        return
+    connection.execute(text(
+        "UPDATE spotify_daily_usage SET generations = generations - 1 "
+        "WHERE user_id = :user_id AND day = :day AND generations > 0"
+    ), {"user_id": target.user_id, "day": target.timestamp.date()})
+
+class ArtistGenreCache(db.Model):
+    __tablename__ = 'spotify_artist_genres'
+    artist_id = db.Column(db.String(64), primary_key=True)  # Spotify artist ID
+    name = db.Column(db.String(500))
+    genres = db.Column(db.JSON)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<ArtistGenreCache {self.artist_id}>'
+
+class GenerationReuse(db.Model):
+    __tablename__ = 'spotify_generation_reuse'
+    key = db.Column(db.String(64), primary_key=True)  # generator.generation_key(...)
+    generation_id = db.Column(db.Integer, db.ForeignKey('spotify_generation_results.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<GenerationReuse {self.key[:12]} -> {self.generation_id}>'
+
 class GuestIPGenerationLog(db.Model):
     __tablename__ = 'spotify_guest_ip_generation_log'
     ip_address_hash = db.Column(db.String(64), primary_key=True) # SHA256 hash
@@ -342,43 +413,54 @@ def _hash_ip(ip_address):
         return None
     return hashlib.sha256(ip_address.encode('utf-8')).hexdigest()
 
-def can_guest_generate_by_ip(ip_address):
-    hashed_ip = _hash_ip(ip_address)
-    if not hashed_ip:
-        return False # Or handle error appropriately
-
+def _load_guest_generations(hashed_ip):
+    """Seed a guest's quota window from the database (once per IP per process)"""
     log_entry = GuestIPGenerationLog.query.get(hashed_ip)
     if not log_entry:
-        return True # Never generated before from this IP
+        return []
+    last_generated_at = log_entry.last_generated_at
+    if last_generated_at.tzinfo is None:
+        last_generated_at = last_generated_at.replace(tzinfo=timezone.utc)
+    return [last_generated_at.timestamp()]
+
+def _persist_guest_generations(batch):
+    """Write recorded guest generations back to GuestIPGenerationLog (runs on the limiter's sync thread)"""
+    latest = {}
+    for hashed_ip, timestamp in batch:
+        latest[hashed_ip] = max(timestamp, latest.get(hashed_ip, 0))
+    with app.app_context():
+        for hashed_ip, timestamp in latest.items():
+            db.session.merge(GuestIPGenerationLog(
+                ip_address_hash=hashed_ip,
+                last_generated_at=datetime.datetime.fromtimestamp(timestamp, timezone.utc)
+            ))
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recording guest IP generation: {e}")
 
-    # Check if last_generated_at is from today
-    # Make last_generated_at aware if it's naive
-    last_gen_at_aware = log_entry.last_generated_at
-    if last_gen_at_aware.tzinfo is None:
-        last_gen_at_aware = last_gen_at_aware.replace(tzinfo=timezone.utc)
+# Guest quotas live in a file shared by all workers; the database is only read to seed an IP and written asynchronously
+guest_limiter = GuestQuotaLimiter(loader=_load_guest_generations, persist=_persist_guest_generations)
+atexit.register(guest_limiter.flush)
 
-    if last_gen_at_aware.date() < datetime.datetime.now(timezone.utc).date():
-        return True # Last generation was before today
-    return False # Already generated today
+def can_guest_generate_by_ip(ip_address):
+    return guest_limiter.allowed(_hash_ip(ip_address))
 
 def record_guest_generation_by_ip(ip_address):
-    hashed_ip = _hash_ip(ip_address)
-    if not hashed_ip:
-        return # Or handle error
+    record_guest_generation_by_hash(_hash_ip(ip_address))
 
-    log_entry = GuestIPGenerationLog.query.get(hashed_ip)
-    now_utc = datetime.datetime.now(timezone.utc)
-    if log_entry:
-        log_entry.last_generated_at = now_utc
+def record_guest_generation_by_hash(hashed_ip):
+    guest_limiter.record(hashed_ip)
+
+def settle_guest_slot(hashed_ip, slot, result):
+    """Keep a reserved guest slot for a new cover; give it back on errors and reused covers"""
+    if not slot:
+        return
+    if result is not None and "error" not in result and not result.get("reused"):
+        guest_limiter.confirm(hashed_ip, slot)
     else:
-        log_entry = GuestIPGenerationLog(ip_address_hash=hashed_ip, last_generated_at=now_utc)
-        db.session.add(log_entry)
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error recording guest IP generation: {e}")
-        # Potentially re-raise or handle more gracefully
+        guest_limiter.release(hashed_ip, slot)
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -399,8 +481,19 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Session token -> (user_id, expires_at timestamp), so requests that only carry a token
+# skip the LoginSession lookup. Dropped on logout; the short TTL bounds how long a
+# session revoked by another worker keeps working here.
+SESSION_USER_CACHE = TTLCache("session_users", max_entries=10000,
+                              ttl=int(os.environ.get('SESSION_USER_CACHE_SECONDS', '60')))
+
 def get_current_user():
-    """Fixed get current logged in user function"""
+    """Current logged in user (or None), resolved once per request and kept on flask.g"""
+    if 'current_user' not in g:
+        g.current_user = _resolve_current_user()
+    return g.current_user
+
+def _resolve_current_user():
     if 'user_id' in session:
         try:
             user = User.query.get(session['user_id'])
@@ -409,69 +502,47 @@ def get_current_user():
         except Exception as e:
             print(f"Error fetching user by ID from session: {e}")
             session.pop('user_id', None)
-    if 'user_session' in session:
-        try:
-            session_token = session['user_session']
-            login_session = LoginSession.query.filter_by(
-                session_token=session_token, 
-                is_active=True
-            ).first()
-            if login_session:
-                expires_at_ts = login_session.expires_at
-                if expires_at_ts.tzinfo is None:
-                    expires_at_ts = expires_at_ts.replace(tzinfo=timezone.utc)
-                if expires_at_ts > datetime.datetime.now(timezone.utc):
-                    user = login_session.user
-                    if user and user.is_active:
-                        session['user_id'] = user.id
-                        return user
-                else:
-                    session.pop('user_session', None)
-        except Exception as e:
-            print(f"Error fetching user by session token: {e}")
-            session.pop('user_session', None)
-    session_token = request.cookies.get('session_token')
-    if session_token:
+    
+    # Fall back to the login session token, from the Flask session or the long-lived cookie
+    for session_token, from_cookie in ((session.get('user_session'), False), (request.cookies.get('session_token'), True)):
+        if not session_token:
+            continue
         try:
-            login_session = LoginSession.query.filter_by(
-                session_token=session_token, 
-                is_active=True
-            ).first()
-            if login_session:
-                expires_at_ts = login_session.expires_at
-                if expires_at_ts.tzinfo is None:
-                    expires_at_ts = expires_at_ts.replace(tzinfo=timezone.utc)
-                if expires_at_ts > datetime.datetime.now(timezone.utc):
-                    user = login_session.user
-                    if user and user.is_active:
-                        session['user_id'] = user.id
-                    return user
-            else:
+            user_id = _user_id_for_session_token(session_token)
+            user = User.query.get(user_id) if user_id else None
+            if user and user.is_active:
+                session['user_id'] = user.id
+                session['user_session'] = session_token
+                return user
+            if not from_cookie:
                 session.pop('user_session', None)
         except Exception as e:
-            print(f"Error fetching user by session token: {e}")
+            print(f"Error fetching user by {'cookie' if from_cookie else 'session token'}: {e}")
             session.pop('user_session', None)
-    session_token = request.cookies.get('session_token')
-    if session_token:
-        try:
-            login_session = LoginSession.query.filter_by(
-                session_token=session_token, 
-                is_active=True
-            ).first()
-            if login_session: # Check if login_session exists before accessing attributes
-                expires_at_ts = login_session.expires_at
-                if expires_at_ts.tzinfo is None:
-                    expires_at_ts = expires_at_ts.replace(tzinfo=timezone.utc)
-                if expires_at_ts > datetime.datetime.now(timezone.utc):
-                    user = login_session.user
-                    if user and user.is_active: # Check if user exists and is active
-                        session['user_id'] = user.id
-                    session['user_session'] = session_token
-                    return user
-        except Exception as e:
-            print(f"Error fetching user by cookie: {e}")
     return None
 
+def _user_id_for_session_token(session_token):
+    """User id for an active, unexpired login session token (cached), or None"""
+    now = time.time()
+    cached = SESSION_USER_CACHE.get(session_token)
+    if cached is not MISSING:
+        user_id, expires_at = cached
+        if expires_at > now:
+            return user_id
+        SESSION_USER_CACHE.pop(session_token)
+        return None
+    
+    login_session = LoginSession.query.filter_by(session_token=session_token, is_active=True).first()
+    if not login_session:
+        return None
+    expires_at_ts = login_session.expires_at
+    if expires_at_ts.tzinfo is None:
+        expires_at_ts = expires_at_ts.replace(tzinfo=timezone.utc)
+    if expires_at_ts.timestamp() <= now:
+        return None
+    SESSION_USER_CACHE.set(session_token, (login_session.user_id, expires_at_ts.timestamp()))
+    return login_session.user_id
+
 def calculate_genre_percentages(genres_list):
     """Calculate percentage distribution of genres"""
     if not genres_list:
@@ -532,6 +603,89 @@ def ensure_tables_exist():
         except Exception as e_create:
             print(f"❌ On-demand table creation failed: {e_create}")
 
+# Set once the background schema check has finished (successfully or not)
+schema_checked = threading.Event()
+
+def create_missing_tables():
+    """
+    Create every model table the database doesn't have yet. One table-name
+    query when the schema is complete, so it runs before the first request.
+    """
+    try:
+        with app.app_context():
+            existing_tables = db.inspect(db.engine).get_table_names()
+            # Every model's table, so newly added ones (caches, reuse index) get created too
+            missing_tables = sorted(set(db.metadata.tables) - set(existing_tables))
+            if missing_tables:
+                print(f"⚠️ Missing tables: {', '.join(missing_tables)} - creating...")
+                db.create_all()
+                print("✓ Table creation completed")
+            else:
+                print("✓ All required tables present")
+        return True
+    except Exception as e:
+        print(f"⚠️ Table creation warning: {e}")
+        return False
+
+def check_schema():
+    """
+    The slow part of the schema check: render_db_fix.py on Render (column
+    migrations), then any indexes added to existing tables. Runs once per
+    process in a background thread (see start_schema_check), never inside a
+    request.
+    """
+    started = time.time()
+    try:
+        if os.getenv('RENDER'):
+            print("🔧 Render environment detected - running auto-migration...")
+            try:
+                import subprocess
+                result = subprocess.run([sys.executable, str(BASE_DIR / 'render_db_fix.py')],
+                                        capture_output=True, text=True, timeout=60, cwd=str(BASE_DIR))
+                if result.returncode == 0:
+                    print("✅ Auto-migration completed successfully")
+                else:
+                    print(f"⚠️ Auto-migration warnings: {result.stderr}")
+            except Exception as e:
+                print(f"⚠️ Auto-migration failed: {e}")
+
+        with app.app_context():
+            try:
+                with db.engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                print("✓ Database connection successful")
+            except Exception as e:
+                print(f"❌ Database connection failed: {e}")
+                return False
+
+            # Indexes added to existing tables (create_all only covers new tables)
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    try:
+                        index.create(db.engine, checkfirst=True)
+                    except Exception as e:
+                        print(f"⚠️ Could not create index {index.name}: {e}")
+        return True
+    except Exception as e:
+        print(f"⚠️ Schema check warning: {e}")
+        return False
+    finally:
+        schema_checked.set()
+        print(f"📊 Schema check finished in {time.time() - started:.2f}s")
+
+def start_schema_check():
+    """
+    Create missing tables before serving (a fresh database must not see
+    requests first), then run the rest of check_schema in the background
+    """
+    if os.getenv('SCHEMA_CHECK_ON_START', '1') != '1':
+        schema_checked.set()
+        return None
+    create_missing_tables()
+    thread = threading.Thread(target=check_schema, name="schema-check", daemon=True)
+    thread.start()
+    return thread
+
 # Global initialization flag
 initialized = False
 
@@ -626,56 +780,6 @@ def initialize_app():
     except Exception as e:
         print(f"⚠️ Directory creation warning: {e}")
 
-    # Database setup
-    try:
-        with app.app_context():
-            print("📊 Testing database connection...")
-            
-            # Test database connection
-            try:
-                with db.engine.connect() as connection:
-                    connection.execute(text('SELECT 1'))
-                print("✓ Database connection successful")
-            except Exception as e:
-                print(f"❌ Database connection failed: {e}")
-                # On Render, try to continue anyway
-                if os.getenv('RENDER'):
-                    print("⚠️ Continuing on Render despite database warning...")
-                else:
-                    return False
-
-            # Quick table check
-            try:
-                inspector = db.inspect(db.engine)
-                existing_tables = inspector.get_table_names()
-                required_tables = [
-                    'spotify_users', 'spotify_login_sessions', 'spotify_oauth_states',
-                    'spotify_generation_results', 'spotify_lora_models'
-                ]
-                missing_tables = [t for t in required_tables if t not in existing_tables]
-                
-                if missing_tables:
-                    print(f"⚠️ Missing tables: {', '.join(missing_tables)}")
-                    if os.getenv('RENDER'):
-                        print("🔧 Running emergency table creation...")
-                        # Try to create tables inline
-                        try:
-                            db.create_all()
-                            print("✓ Emergency table creation completed")
-                        except Exception as e:
-                            print(f"⚠️ Emergency table creation failed: {e}")
-                else:
-                    print("✓ All required tables present")
-
-            except Exception as e:
-                print(f"⚠️ Table check warning: {e}")
-
-    except Exception as e:
-        print(f"⚠️ Database setup warning: {e}")
-        # On Render, continue anyway
-        if not os.getenv('RENDER'):
-            return False
-
     # Continue with module imports...
     print("📦 Importing modules...")
     
@@ -716,20 +820,9 @@ def initialize_app():
         except ImportError as e:
             print(f"⚠️ utils import failed: {e}")
         
-        try:
-            import generator
-            print("✓ generator imported")
-            generator_available = True
-        except ImportError as e:
-            print(f"⚠️ generator import failed: {e}")
-        
-        try:
-            import title_generator
-            import image_generator
-            import chart_generator
-            print("✓ Additional generation modules imported")
-        except ImportError as e:
-            print(f"⚠️ Some generation modules unavailable: {e}")
+        # generator and the image/title/chart modules are imported by the
+        # routes that use them, so the first page render doesn't wait on PIL
+        generator_available = importlib.util.find_spec("generator") is not None
             
     finally:
         os.chdir(original_cwd)
@@ -868,6 +961,33 @@ def create_tables_manually():
             lora_url VARCHAR(1000),
             user_id INTEGER
         );
+        """,
+
+        # Artist genre cache table
+        """
+        CREATE TABLE IF NOT EXISTS spotify_artist_genres (
+            artist_id VARCHAR(64) PRIMARY KEY,
+            name VARCHAR(500),
+            genres JSON,
+            fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # Generation reuse (dedup) table
+        """
+        CREATE TABLE IF NOT EXISTS spotify_generation_reuse (
+            key VARCHAR(64) PRIMARY KEY,
+            generation_id INTEGER NOT NULL REFERENCES spotify_generation_results(id) ON DELETE CASCADE,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # Daily generation counters (quota checks)
+        """
+        CREATE TABLE IF NOT EXISTS spotify_daily_usage (
+            user_id INTEGER NOT NULL REFERENCES spotify_users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            generations INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        );
         """,
           # Add foreign keys (simplified for better PostgreSQL compatibility)
         """
@@ -894,6 +1014,7 @@ def create_tables_manually():
         CREATE INDEX IF NOT EXISTS idx_sessions_token ON spotify_login_sessions(session_token);
         CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON spotify_login_sessions(user_id);
         CREATE INDEX IF NOT EXISTS idx_oauth_state ON spotify_oauth_states(state);
+        CREATE INDEX IF NOT EXISTS idx_generation_results_user_timestamp ON spotify_generation_results(user_id, timestamp);
         """
     ]
     
@@ -926,16 +1047,16 @@ def get_current_user_or_guest():
     else:
         # Guest logic using IP address
         # request.remote_addr should provide the IP
-        ip_address = request.remote_addr 
-        can_generate_today = can_guest_generate_by_ip(ip_address)
+        # Answered from the in-memory quota window, so page views don't hit the database
+        generations_today = guest_limiter.used(_hash_ip(request.remote_addr))
         return {
             'type': 'guest',
             'user': None,
             'display_name': 'Guest',
             'is_premium': False,
-            'daily_limit': 1, # Guest daily limit is 1
-            'generations_today': 0 if can_generate_today else 1, # Simplified: 0 if can still gen, 1 if already gen'd
-            'can_generate': can_generate_today,
+            'daily_limit': guest_limiter.limit,
+            'generations_today': generations_today, # Within the sliding quota window
+            'can_generate': bool(request.remote_addr) and generations_today < guest_limiter.limit,
             'can_use_loras': False,
             'can_edit_playlists': False,
             'show_upload': False
@@ -950,6 +1071,110 @@ def inject_template_vars():
         'user_info': get_current_user_or_guest()
     }
 
+def _result_display_data(result, playlist_url, user_mood, negative_prompt, user_info):
+    """Template variables for result.html from a generate_cover result"""
+    img_filename = os.path.basename(result["output_path"])
+    
+    # Charts are computed by generate_cover alongside the image; fall back if missing
+    genres_chart_data = result.get("genres_chart")
+    genre_percentages_data = result.get("genre_percentages") or []
+
+    if genres_chart_data is None:
+        try:
+            import chart_generator
+            genres_chart_data = chart_generator.generate_genre_chart(result.get("all_genres", []))
+        except ImportError:
+            print("⚠️ chart_generator not available, skipping genre chart.")
+        except Exception as e:
+            print(f"⚠️ Error generating genre chart: {e}")
+
+    if not genre_percentages_data:
+        try:
+            if 'utils_available' in globals() and utils_available:
+                import utils
+                genre_percentages_data = utils.calculate_genre_percentages(result.get("all_genres", []))
+            else:
+                genre_percentages_data = calculate_genre_percentages(result.get("all_genres", []))
+        except Exception as e:
+            print(f"⚠️ Error calculating genre percentages: {e}")
+
+    # Extract playlist ID with fallback
+    playlist_id = None
+    try:
+        if 'utils_available' in globals() and utils_available:
+            import utils
+            playlist_id = utils.extract_playlist_id(playlist_url) if playlist_url and "playlist/" in playlist_url else None
+        else:
+            playlist_id = extract_playlist_id(playlist_url) if playlist_url and "playlist/" in playlist_url else None
+    except Exception as e:
+        print(f"⚠️ Error extracting playlist ID: {e}")
+
+    display_data = {
+        "title": result["title"],
+        "image_file": img_filename,
+        "genres": ", ".join(result.get("genres", [])),
+        "mood": result.get("mood", ""),
+        "playlist_name": result.get("item_name", "Your Music"),
+        "found_genres": bool(result.get("genres", [])),
+        "genres_chart": genres_chart_data,
+        "genre_percentages": genre_percentages_data,
+        "playlist_url": playlist_url,
+        "user_mood": user_mood,
+        "negative_prompt": negative_prompt,
+        "lora_name": result.get("lora_name", ""),
+        "lora_type": result.get("lora_type", ""),
+        "lora_url": result.get("lora_url", ""),
+        "user_info": user_info,
+        "user": user_info.get('user'),
+        "can_edit_playlist": user_info['can_edit_playlists'],
+        "playlist_id": playlist_id
+    }
+    
+    return display_data
+
+# ASYNC GENERATION JOBS
+GENERATION_ASYNC = os.environ.get('GENERATION_ASYNC', '1') == '1'
+
+def run_generation_job(payload):
+    """Job handler: run generate_cover on a queue worker and settle the guest's reserved slot"""
+    import generator
+    result = None
+    try:
+        with app.app_context():
+            result = generator.generate_cover(
+                payload['playlist_url'], payload.get('user_mood'), payload.get('lora_name') or None,
+                negative_prompt=payload.get('negative_prompt'), user_id=payload.get('user_id'),
+                reuse=payload.get('reuse', False)
+            )
+        return result
+    finally:
+        # Reused covers cost nothing, so they don't count against the guest's daily limit
+        settle_guest_slot(payload.get('guest_ip_hash'), payload.get('guest_slot'), result)
+
+generation_queue.register('cover', run_generation_job)
+if GENERATION_ASYNC:
+    # Pick up jobs left queued (or with an expired lease) by a restart without waiting for a new enqueue
+    generation_queue.start_workers()
+
+def _generation_owner(user_info):
+    if user_info['type'] == 'user':
+        return f"user:{user_info['user'].id}"
+    return f"guest:{_hash_ip(request.remote_addr)}"
+
+def _wants_json():
+    return (request.accept_mimetypes.best == 'application/json' or
+            request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+
+def _job_status_payload(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "position": job.get("position"),
+        "error": job.get("error"),
+        "status_url": url_for('generation_job_status', job_id=job["id"]),
+        "result_url": url_for('generation_job', job_id=job["id"])
+    }
+
 # ROUTES
 @app.route("/")
 def root():
@@ -1019,6 +1244,7 @@ def generate():
             playlist_url = request.form.get("playlist_url")
             user_mood = request.form.get("mood", "").strip()
             negative_prompt = request.form.get("negative_prompt", "").strip()
+            reuse = request.form.get("reuse") == "1"  # Return an identical earlier cover if one exists
             lora_name = request.form.get("lora_name", "").strip()
             
             # Restrict LoRA usage for guests
@@ -1043,11 +1269,81 @@ def generate():
                     loras=loras
                 )
             
+            user_id = user_info['user'].id if user_info['type'] == 'user' else None
+            
+            # Hand the pipeline to the generation workers so this web worker stays free
+            if GENERATION_ASYNC:
+                if "playlist/" not in playlist_url and "album/" not in playlist_url:
+                    return render_template(
+                        "index.html",
+                        error="Invalid Spotify URL format. Please provide a valid Spotify playlist or album URL.",
+                        loras=loras
+                    )
+
+                owner = _generation_owner(user_info)
+                job_request = {
+                    "playlist_url": playlist_url,
+                    "user_mood": user_mood,
+                    "negative_prompt": negative_prompt,
+                    "lora_name": lora_input.name if lora_input is not None else None,
+                    "reuse": reuse
+                }
+                generation_queue.start_workers()  # Revive workers lost to a restart or fork
+                job_id = generation_queue.active_for(owner)  # One pending generation per user/guest
+                if job_id:
+                    active_payload = generation_queue.get(job_id)["payload"]
+                    if any(active_payload.get(name) != value for name, value in job_request.items()):
+                        # A different request: say so instead of showing the other job's progress
+                        message = "A generation is already running. Please wait for it to finish before starting another."
+                        if _wants_json():
+                            return jsonify(dict(_job_status_payload(generation_queue.get(job_id)), error=message)), 409
+                        return render_template("index.html", error=message, loras=loras), 409
+                else:
+                    guest_ip_hash = guest_slot = None
+                    if user_info['type'] == 'guest':
+                        # Take the quota slot now, so a guest can't queue more jobs than the limit
+                        guest_ip_hash = _hash_ip(request.remote_addr)
+                        guest_slot = guest_limiter.reserve(guest_ip_hash)
+                        if guest_slot is None:
+                            return render_template(
+                                "index.html",
+                                error=f"Daily generation limit reached ({guest_limiter.limit} per day). Try again tomorrow!",
+                                loras=[]
+                            )
+                    try:
+                        job_id = generation_queue.enqueue('cover', dict(
+                            job_request,
+                            user_id=user_id,
+                            guest_ip_hash=guest_ip_hash,
+                            guest_slot=guest_slot
+                        ), owner=owner)
+                    except Exception:
+                        settle_guest_slot(guest_ip_hash, guest_slot, None)
+                        raise
+                if _wants_json():
+                    return jsonify(_job_status_payload(generation_queue.get(job_id))), 202
+                return redirect(url_for('generation_job', job_id=job_id))
+            
+            guest_ip_hash = guest_slot = None
+            if user_info['type'] == 'guest':
+                guest_ip_hash = _hash_ip(request.remote_addr)
+                guest_slot = guest_limiter.reserve(guest_ip_hash)
+                if guest_slot is None:
+                    return render_template(
+                        "index.html",
+                        error=f"Daily generation limit reached ({guest_limiter.limit} per day). Try again tomorrow!",
+                        loras=[]
+                    )
+            
             # Generate the cover
             import generator
-            user_id = user_info['user'].id if user_info['type'] == 'user' else None
-            result = generator.generate_cover(playlist_url, user_mood, lora_input, 
-                                negative_prompt=negative_prompt, user_id=user_id) 
+            result = None
+            try:
+                result = generator.generate_cover(playlist_url, user_mood, lora_input, 
+                                    negative_prompt=negative_prompt, user_id=user_id, reuse=reuse) 
+            finally:
+                # Counts against the guest's limit only when a new cover was made
+                settle_guest_slot(guest_ip_hash, guest_slot, result)
             
             if "error" in result:
                 return render_template(
@@ -1056,84 +1352,8 @@ def generate():
                     loras=loras
                 )
             
-            # Increment generation count
-            if user_info['type'] == 'guest':
-                record_guest_generation_by_ip(request.remote_addr) # New call
-            
-            img_filename = os.path.basename(result["output_path"])
-            
-            # Generate charts with fallback
-            genres_chart_data = None
-            genre_percentages_data = []
-            
-            try:
-                import chart_generator
-                genres_chart_data = chart_generator.generate_genre_chart(result.get("all_genres", []))
-            except ImportError:
-                print("⚠️ chart_generator not available, skipping genre chart.")
-            except Exception as e:
-                print(f"⚠️ Error generating genre chart: {e}")
-
-            try:
-                if 'utils_available' in globals() and utils_available:
-                    import utils
-                    genre_percentages_data = utils.calculate_genre_percentages(result.get("all_genres", []))
-                else:
-                    genre_percentages_data = calculate_genre_percentages(result.get("all_genres", []))
-            except Exception as e:
-                print(f"⚠️ Error calculating genre percentages: {e}")
-            
-            # Extract playlist ID with fallback
-            playlist_id = None
-            try:
-                if 'utils_available' in globals() and utils_available:
-                    import utils
-                    playlist_id = utils.extract_playlist_id(playlist_url) if playlist_url and "playlist/" in playlist_url else None
-                else:
-                    playlist_id = extract_playlist_id(playlist_url) if playlist_url and "playlist/" in playlist_url else None
-            except Exception as e:
-                print(f"⚠️ Error extracting playlist ID: {e}")
-            
-            display_data = {
-                "title": result["title"],
-                "image_file": img_filename,
-                "image_data_base64": result.get("image_data_base64", ""),
-                "genres": ", ".join(result.get("genres", [])),
-                "mood": result.get("mood", ""),
-                "playlist_name": result.get("item_name", "Your Music"),
-                "found_genres": bool(result.get("genres", [])),
-                "genres_chart": genres_chart_data,
-                "genre_percentages": genre_percentages_data,
-                "playlist_url": playlist_url,
-                "user_mood": user_mood,
-                "negative_prompt": negative_prompt,
-                "lora_name": result.get("lora_name", ""),
-                "lora_type": result.get("lora_type", ""),
-                "lora_url": result.get("lora_url", ""),
-                "user_info": user_info,
-                "user": user_info.get('user'),
-                "can_edit_playlist": user_info['can_edit_playlists'],
-                "playlist_id": playlist_id
-            }
-            
-            # Record generation if user is logged in
-            if user_info['type'] == 'user':
-                try:
-                    new_generation = GenerationResultDB(
-                        title=result["title"],
-                        output_path=result["output_path"],
-                        item_name=result.get("item_name"),
-                        genres=result.get("genres"),
-                        all_genres=result.get("all_genres"),
-                        mood=user_mood,
-                        spotify_url=playlist_url,
-                        lora_name=result.get("lora_name"),
-                        user_id=user_info['user'].id
-                    )
-                    db.session.add(new_generation)
-                    db.session.commit()
-                except Exception as e:
-                    print(f"⚠️ Error saving generation result to DB: {e}")
+            # generate_cover has already saved the generation (and counted it) for user_id
+            display_data = _result_display_data(result, playlist_url, user_mood, negative_prompt, user_info)
 
             return render_template("result.html", **display_data)
         except Exception as e:
@@ -1148,6 +1368,65 @@ def generate():
     else:
         return render_template("index.html", loras=loras)
 
+def _get_owned_job(job_id):
+    generation_queue.start_workers()  # Status polls revive workers lost to a restart or fork
+    job = generation_queue.get(job_id)
+    if job is None or job["owner"] != _generation_owner(get_current_user_or_guest()):
+        return None
+    return job
+
+@app.route("/api/generate/jobs/<job_id>")
+def generation_job_status(job_id):
+    """Poll a queued generation"""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_status_payload(job))
+
+@app.route("/generate/jobs/<job_id>")
+def generation_job(job_id):
+    """Waiting page for a queued generation; renders the result once the job is done"""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return render_template("index.html", error="That generation could not be found.", loras=[]), 404
+    
+    if job["status"] == "failed":
+        return render_template("index.html", error=job["error"] or "Generation failed. Please try again.", loras=[])
+    if job["status"] != "done":
+        return render_template("job_status.html", job=_job_status_payload(job))
+    
+    payload = job["payload"]
+    return render_template("result.html", **_result_display_data(
+        job["result"], payload.get("playlist_url"), payload.get("user_mood", ""),
+        payload.get("negative_prompt", ""), get_current_user_or_guest()
+    ))
+
+@app.route("/generated_covers/<path:filename>")
+def serve_image(filename):
+    """Serve a generated cover, or one of its renditions with ?size=thumb|display|spotify|original"""
+    from cover_store import COVER_RENDITIONS, IMMUTABLE_MAX_AGE, cover_rendition, is_content_addressed
+    from cover_store import store as cover_store
+    
+    filename = secure_filename(filename)
+    size = request.args.get('size')
+    directory, name = cover_store.root, filename
+    if size and size != 'original':
+        if size not in COVER_RENDITIONS:
+            return "Unknown cover size", 404
+        try:
+            rendition = cover_rendition(filename, size)
+        except (FileNotFoundError, OSError):
+            return "Cover not found", 404
+        directory, name = rendition.parent, rendition.name
+    
+    immutable = is_content_addressed(filename)
+    if immutable:
+        cover_store.touch(filename)
+    response = send_from_directory(directory, name, max_age=IMMUTABLE_MAX_AGE if immutable else 3600)
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
 # LoRA UPLOAD ROUTE (FIXED FOR FILE UPLOADS ONLY)
 @app.route('/api/upload_lora', methods=['POST'])
 @login_required
@@ -1400,21 +1679,29 @@ def update_playlist_cover():
             return jsonify({"success": False, "error": "Invalid JSON payload"}), 400
 
         playlist_id = data.get('playlist_id')
+        image_file = data.get('image_file')  # A stored cover - uploads its 640px JPEG rendition
         image_data_url = data.get('image_data') # Expects data:image/jpeg;base64,actual_base64_string
 
         if not playlist_id:
             return jsonify({"success": False, "error": "playlist_id is required"}), 400
-        if not image_data_url:
-            return jsonify({"success": False, "error": "image_data is required"}), 400
+        if not image_file and not image_data_url:
+            return jsonify({"success": False, "error": "image_file or image_data is required"}), 400
 
-        # Extract actual base64 string
-        # Format: data:[<mediatype>][;base64],<data>
-        try:
-            header, actual_base64_string = image_data_url.split(',', 1)
-            if not header.startswith("data:image") or ";base64" not in header:
-                raise ValueError("Invalid image data URL format")
-        except ValueError:
-            return jsonify({"success": False, "error": "Invalid image_data format. Expected data URL (e.g., data:image/jpeg;base64,...)"}), 400
+        if image_file:
+            from cover_store import store as cover_store
+            try:
+                actual_base64_string = cover_store.spotify_upload_base64(secure_filename(image_file))
+            except (FileNotFoundError, OSError):
+                return jsonify({"success": False, "error": "Cover not found"}), 404
+        else:
+            # Extract actual base64 string
+            # Format: data:[<mediatype>][;base64],<data>
+            try:
+                header, actual_base64_string = image_data_url.split(',', 1)
+                if not header.startswith("data:image") or ";base64" not in header:
+                    raise ValueError("Invalid image data URL format")
+            except ValueError:
+                return jsonify({"success": False, "error": "Invalid image_data format. Expected data URL (e.g., data:image/jpeg;base64,...)"}), 400
         
         # Call the (yet to be created) spotify_client function
         # For now, this will likely error out
@@ -1503,7 +1790,7 @@ def spotify_callback():
             'client_id': SPOTIFY_CLIENT_ID,
             'client_secret': SPOTIFY_CLIENT_SECRET
         }
-        response = requests.post('https://accounts.spotify.com/api/token', data=token_data, timeout=30)
+        response = http_client.post('https://accounts.spotify.com/api/token', service_name="spotify_accounts", data=token_data)
         if response.status_code != 200:
             print(f"Token exchange failed: {response.status_code} - {response.text}")
             flash('Failed to get Spotify tokens. Please try again.', 'error')
@@ -1513,7 +1800,7 @@ def spotify_callback():
         refresh_token = tokens.get('refresh_token')
         expires_in = tokens.get('expires_in', 3600)
         headers = {'Authorization': f'Bearer {access_token}'}
-        user_response = requests.get('https://api.spotify.com/v1/me', headers=headers, timeout=30)
+        user_response = http_client.get('https://api.spotify.com/v1/me', service_name="spotify_api", headers=headers)
         if user_response.status_code != 200:
             print(f"User info fetch failed: {user_response.status_code} - {user_response.text}")
             flash('Failed to get Spotify user info. Please try again.', 'error')
@@ -1548,6 +1835,7 @@ def spotify_callback():
         )
         session['user_id'] = user.id
         session['user_session'] = session_token
+        g.current_user = user
         resp = make_response(redirect(url_for('generate')))
         resp.set_cookie('session_token', session_token, max_age=30*24*60*60)
         is_premium = user.is_premium_user()
@@ -1585,6 +1873,7 @@ def login():
                 db.session.commit()
                 session['user_id'] = user.id
                 session['user_session'] = session_token
+                g.current_user = user
                 resp = make_response(redirect(url_for('generate')))
                 resp.set_cookie('session_token', session_token, max_age=30*24*60*60)
                 flash('Logged in successfully!', 'success')
@@ -1599,6 +1888,8 @@ def login():
 def logout():
     """Fixed logout route"""
     user_id = session.get('user_id')
+    for session_token in {session.get('user_session'), request.cookies.get('session_token')} - {None}:
+        SESSION_USER_CACHE.pop(session_token)
     if 'user_session' in session:
         try:
             session_token = session['user_session']
@@ -1609,6 +1900,7 @@ def logout():
         except Exception as e:
             print(f"Error marking session inactive: {e}")
     session.clear()
+    g.pop('current_user', None)
     resp = make_response(redirect(url_for('login')))
     resp.set_cookie('session_token', '', expires=0)
     flash('You have been logged out successfully', 'info')
@@ -1720,12 +2012,14 @@ if not any(rule.endpoint == 'health_check' for rule in app.url_map.iter_rules())
         """Health check endpoint for monitoring"""
         try:
             from monitoring_system import health_checker
-            health_results = health_checker.run_all_checks()
+            # Cached results (refreshed in the background), so probes never wait on remote APIs
+            health_results = health_checker.get_results()
             all_healthy = all(result.healthy for result in health_results.values())
             
             response_data = {
                 "status": "healthy" if all_healthy else "degraded",
                 "timestamp": datetime.datetime.now(timezone.utc).isoformat(),
+                "checked_at": health_checker.last_check_time.isoformat() if health_checker.last_check_time else None,
                 "services": {name: {
                     "healthy": result.healthy,
                     "response_time_ms": result.response_time_ms,
@@ -1751,12 +2045,16 @@ if not any(rule.endpoint == 'health_check' for rule in app.url_map.iter_rules())
 
 @app.route('/metrics')
 def metrics_endpoint():
-    """Metrics endpoint for performance monitoring"""
+    """Metrics endpoint for performance monitoring (Prometheus text with ?format=prometheus)"""
     try:
-        from monitoring_system import app_logger
+        from monitoring_system import app_logger, wants_prometheus, PROMETHEUS_CONTENT_TYPE, circuit_breaker_status
+        
+        if wants_prometheus(request):
+            return app.response_class(app_logger.prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
         
         metrics_data = {
             "performance": app_logger.get_performance_summary(),
+            "circuit_breakers": circuit_breaker_status(),
             "timestamp": datetime.datetime.now(timezone.utc).isoformat()
         }
         
@@ -1900,14 +2198,8 @@ try:
 except Exception as e:
     print(f"⚠️ Monitoring setup failed: {e}")
 
-if os.getenv('RENDER'):
-    try:
-        with app.app_context():
-            db.create_all()
-            print("✅ Final table creation check completed")
-    except Exception as e:
-        print(f"⚠️ Final table creation warning: {e}")
-        
+start_schema_check()
+
 if __name__ == '__main__':
     print("Initializing application...")
     # Application startup logic
@@ -0,0 +1,102 @@
+"""
+Benchmark GenreAnalysis.from_genre_list, the analysis extract_playlist_data
+runs on every playlist: the precompiled multi-pattern mood matcher against the
+previous genre × mood × keyword substring loops (reproduced below as the
+reference).
+
+Both paths are run on the same synthetic playlists, their results are checked
+for equality, and the median time per playlist is reported with the matcher's
+per-genre cache cold (first sight of every genre) and warm.
+
+    python bench_genre_analysis.py
+    python bench_genre_analysis.py --playlists 200 --genres 150 --repeat 5
+"""
+import random
+import argparse
+import statistics
+import time
+from collections import Counter
+from functools import lru_cache
+
+from models import GenreAnalysis
+
+GENRE_WORDS = [
+    "indie", "pop", "rock", "dream", "synthwave", "post-punk", "lo-fi", "hip hop", "trap", "uk",
+    "garage", "deep", "house", "techno", "ambient", "jazz", "soul", "neo", "classical", "folk",
+    "chamber", "metal", "death metal", "emo", "bossa nova", "afrobeat", "drill", "bedroom", "art",
+    "shoegaze", "hardcore", "disco", "funk", "ballad", "acoustic", "experimental", "grunge", "retro",
+    "Dance Pop", "Chill", "Sad",
+]
+
+
+# --- Reference: from_genre_list before the matcher -------------------------
+
+@lru_cache(maxsize=100)
+def reference_calculate_mood(genres_tuple):
+    mood_scores = {mood: 0 for mood in GenreAnalysis.MOOD_KEYWORDS}
+    for genre_lower in (genre.lower() for genre in genres_tuple):
+        for mood_name, keywords in GenreAnalysis.MOOD_KEYWORDS.items():
+            if any(keyword in genre_lower for keyword in keywords):
+                mood_scores[mood_name] += 1
+    if any(mood_scores.values()):
+        return max(mood_scores.items(), key=lambda x: x[1])[0]
+    return "balanced"
+
+
+def reference_from_genre_list(genres):
+    genre_counter = Counter(genres)
+    return GenreAnalysis(
+        top_genres=[genre for genre, _ in genre_counter.most_common(10)],
+        all_genres=genres,
+        genres_with_counts=genre_counter.most_common(20),
+        mood=reference_calculate_mood(tuple(sorted(genres))),
+    )
+
+
+def make_playlists(count, genres_per_playlist, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [" ".join(rng.sample(GENRE_WORDS, rng.randint(1, 3))) for _ in range(600)]
+    return [[rng.choice(vocabulary) for _ in range(genres_per_playlist)] for _ in range(count)]
+
+
+def _time_per_playlist(func, playlists):
+    started = time.perf_counter()
+    for genres in playlists:
+        func(genres)
+    return (time.perf_counter() - started) / len(playlists)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=100)
+    parser.add_argument("--genres", type=int, default=120, help="genres per playlist")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    playlists = make_playlists(args.playlists, args.genres)
+
+    # Same answers before timing anything
+    for genres in playlists:
+        assert GenreAnalysis.from_genre_list(genres) == reference_from_genre_list(genres), genres
+    print(f"✓ Matcher and reference agree on {len(playlists)} playlists")
+
+    reference = []
+    for _ in range(args.repeat):
+        reference_calculate_mood.cache_clear()
+        reference.append(_time_per_playlist(reference_from_genre_list, playlists))
+    cold = []
+    for _ in range(args.repeat):
+        GenreAnalysis._genre_moods.cache_clear()
+        cold.append(_time_per_playlist(GenreAnalysis.from_genre_list, playlists[:1]))
+    warm = [_time_per_playlist(GenreAnalysis.from_genre_list, playlists) for _ in range(args.repeat)]
+
+    ref_ms = statistics.median(reference) * 1000
+    cold_ms = statistics.median(cold) * 1000
+    warm_ms = statistics.median(warm) * 1000
+    print(f"reference loops     {ref_ms:8.3f} ms / playlist")
+    print(f"matcher, cold cache {cold_ms:8.3f} ms / playlist  ({ref_ms / cold_ms:.1f}x)")
+    print(f"matcher, warm cache {warm_ms:8.3f} ms / playlist  ({ref_ms / warm_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
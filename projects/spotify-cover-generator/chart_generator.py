@@ -1,72 +1,134 @@
-import matplotlib.pyplot as plt
-import matplotlib
 import io
 import base64
+import hashlib
 from collections import Counter
-matplotlib.use('Agg')  # Use non-interactive backend
+from xml.sax.saxutils import escape
 
-def generate_genre_chart(genres):
-    """Generate a bar chart visualization of genres"""
-    if not genres:
-        return None
-    
-    # Count genre frequencies if it's a list
-    if isinstance(genres, list):
-        # Count genres by frequency using Counter
-        genre_counter = Counter(genres)
-        genres_sorted = genre_counter.most_common(8)  # Get top 8 genres
-        labels = [genre for genre, _ in genres_sorted]
-        values = [count for _, count in genres_sorted]
-    else:
+from ttl_cache import TTLCache
+
+# Spotify green gradient, one colour per bar
+BAR_COLORS = ['#1DB954', '#1ED760', '#24E066', '#30D67B', '#3DCF8B', '#4AC89D', '#57C0AD', '#63B9BE']
+TOP_GENRES = 8
+
+# Charts only depend on the top genre counts, so playlists with the same mix share one
+CHART_CACHE = TTLCache("genre_charts", max_entries=512, ttl=24 * 3600)
+
+
+def _top_genres(genres):
+    if not genres or not isinstance(genres, list):
+        return []
+    return Counter(genres).most_common(TOP_GENRES)
+
+
+def _chart_key(top, fmt):
+    digest = hashlib.sha1(repr(top).encode("utf-8")).hexdigest()
+    return f"{fmt}:{digest}"
+
+
+def generate_genre_chart(genres, fmt="svg"):
+    """
+    Bar chart of the top genres as a data URI.
+
+    fmt="svg" (the default) builds the SVG directly from the counts; fmt="png"
+    renders with matplotlib, which is only imported when a raster is requested.
+    """
+    top = _top_genres(genres)
+    if not top:
         return None
-    
-    # Create bar chart with improved styling
+
+    render = _render_png if fmt == "png" else _render_svg
+    return CHART_CACHE.get_or_set(_chart_key(top, fmt), lambda: render(top))
+
+
+def _render_svg(top):
+    """Compact SVG bar chart matching the old matplotlib styling"""
+    width, height = 600, 400
+    left, right, top_pad, bottom = 50, 20, 50, 110
+    plot_w, plot_h = width - left - right, height - top_pad - bottom
+    max_value = max(count for _, count in top)
+    slot = plot_w / len(top)
+    bar_w = slot * 0.6
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'font-family="Helvetica, Arial, sans-serif">',
+        f'<rect width="{width}" height="{height}" rx="8" fill="#1e1e1e"/>',
+        f'<rect x="{left}" y="{top_pad}" width="{plot_w}" height="{plot_h}" fill="#2a2a2a"/>',
+        f'<text x="{width / 2}" y="30" text-anchor="middle" font-size="18" font-weight="bold" '
+        f'fill="#1DB954">Genre Analysis</text>',
+    ]
+
+    # Dashed grid lines at quarter intervals of the tallest bar
+    for step in range(1, 5):
+        y = top_pad + plot_h - plot_h * step / 4
+        parts.append(
+            f'<line x1="{left}" y1="{y:.1f}" x2="{left + plot_w}" y2="{y:.1f}" '
+            f'stroke="#444" stroke-opacity="0.5" stroke-dasharray="4 4"/>'
+        )
+
+    for i, (genre, count) in enumerate(top):
+        bar_h = plot_h * count / max_value
+        x = left + slot * i + (slot - bar_w) / 2
+        y = top_pad + plot_h - bar_h
+        cx = x + bar_w / 2
+        label_y = top_pad + plot_h + 14
+        parts.append(
+            f'<rect x="{x:.1f}" y="{y:.1f}" width="{bar_w:.1f}" height="{bar_h:.1f}" '
+            f'fill="{BAR_COLORS[i]}" stroke="#444"/>'
+        )
+        parts.append(
+            f'<text x="{cx:.1f}" y="{y - 6:.1f}" text-anchor="middle" font-size="12" '
+            f'font-weight="bold" fill="#fff">{count}</text>'
+        )
+        parts.append(
+            f'<text x="{cx:.1f}" y="{label_y:.1f}" text-anchor="end" font-size="12" fill="#fff" '
+            f'transform="rotate(-45 {cx:.1f} {label_y:.1f})">{escape(genre)}</text>'
+        )
+
+    parts.append('</svg>')
+    svg = "".join(parts)
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode("utf-8")).decode("ascii")
+
+
+def _render_png(top):
+    """Raster version of the chart, rendered with matplotlib"""
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+
+    labels = [genre for genre, _ in top]
+    values = [count for _, count in top]
+
     fig = plt.figure(figsize=(12, 8), dpi=100)
     ax = fig.add_subplot(111)
-    
-    # Plot bars with Spotify green color gradient
-    bars = ax.bar(
-        labels, values, 
-        color=['#1DB954', '#1ED760', '#24E066', '#30D67B', '#3DCF8B', '#4AC89D', '#57C0AD', '#63B9BE'][:len(labels)],
-        width=0.6, edgecolor='#444444'
-    )
-    
+
+    bars = ax.bar(labels, values, color=BAR_COLORS[:len(labels)], width=0.6, edgecolor='#444444')
+
     # Add count labels on top of bars
     for bar in bars:
         height = bar.get_height()
         ax.text(
             bar.get_x() + bar.get_width()/2., height + 0.05,
-            f'{int(height)}', ha='center', va='bottom', 
+            f'{int(height)}', ha='center', va='bottom',
             color='white', fontsize=12, fontweight='bold',
             bbox=dict(boxstyle="round,pad=0.3", facecolor='#333', alpha=0.7)
         )
-    
-    # Set labels and title with improved font
+
     ax.set_xlabel('Genres', fontsize=14, fontweight='bold', color='white', labelpad=10)
     ax.set_ylabel('Frequency', fontsize=14, fontweight='bold', color='white', labelpad=10)
     ax.set_title('Genre Analysis', fontsize=18, fontweight='bold', color='#1DB954', pad=20)
-    
-    # Configure chart aesthetics
+
     ax.set_facecolor('#2a2a2a')
     fig.patch.set_facecolor('#1e1e1e')
-    
-    # Style the axis and ticks
+
     ax.tick_params(axis='x', colors='white', labelsize=12, rotation=45)
-    plt.setp(ax.get_xticklabels(), ha="right")  # Set horizontal alignment separately
-    
+    plt.setp(ax.get_xticklabels(), ha="right")
     ax.tick_params(axis='y', colors='white', labelsize=12)
-    
-    # Add subtle grid lines
     ax.grid(axis='y', color='#444444', alpha=0.3, linestyle='--')
-    
-    # Adjust layout for better fit with rotated labels
     plt.tight_layout()
-    
-    # Save to base64 for embedding in HTML
+
     buffer = io.BytesIO()
     plt.savefig(buffer, format='png', transparent=True, dpi=100)
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
     plt.close(fig)  # Close figure to free memory
-    
-    return f"data:image/png;base64,{image_base64}"
\ No newline at end of file
+
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode('utf-8')
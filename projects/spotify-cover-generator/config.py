@@ -29,6 +29,24 @@ LORA_DIR.mkdir(exist_ok=True)
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 
+# Artist genres barely change, so cached artist metadata is kept for a long time
+ARTIST_GENRE_CACHE_TTL_DAYS = int(os.getenv("ARTIST_GENRE_CACHE_TTL_DAYS", "30"))
+
+# Playlist ingestion: pages of PLAYLIST_PAGE_SIZE tracks are fetched concurrently.
+# Playlists longer than PLAYLIST_MAX_PAGES pages are sampled ("uniform" spreads the
+# sampled pages across the whole playlist, "head" keeps the first pages only).
+PLAYLIST_PAGE_SIZE = 100  # Spotify's maximum for playlist items
+PLAYLIST_MAX_PAGES = int(os.getenv("PLAYLIST_MAX_PAGES", "20"))
+PLAYLIST_SAMPLING = os.getenv("PLAYLIST_SAMPLING", "uniform")
+PLAYLIST_MAX_ARTISTS = int(os.getenv("PLAYLIST_MAX_ARTISTS", "500"))
+SPOTIFY_FETCH_WORKERS = int(os.getenv("SPOTIFY_FETCH_WORKERS", "4"))
+
+# Extracted playlists are reused while their snapshot_id is unchanged (checked with one
+# cheap request), for at most PLAYLIST_CACHE_TTL_HOURS. Albums never change and are
+# kept until evicted.
+PLAYLIST_CACHE_TTL_HOURS = float(os.getenv("PLAYLIST_CACHE_TTL_HOURS", "24"))
+PLAYLIST_CACHE_SIZE = int(os.getenv("PLAYLIST_CACHE_SIZE", "512"))
+
 # Dynamic redirect URI based on environment - FIXED
 if os.getenv("RENDER"):
     # Production on Render - CORRECTED PATH
@@ -0,0 +1,237 @@
+"""
+Content-addressed store for generated covers.
+
+A freshly generated cover is renamed to the hash of its bytes, so identical
+images collapse onto one file and a cover URL never changes meaning (it can be
+cached forever). Every cover is kept as:
+
+    original  <hash>.png                      the image as generated
+    spotify   renditions/<hash>-spotify.jpg   640px JPEG for playlist uploads (and browsers without WebP)
+    display   renditions/<hash>-display.webp  640px WebP for the result page
+    thumb     renditions/<hash>-thumb.webp    300px WebP for grids and small views
+
+A SQLite manifest (COVERS_DIR/manifest.sqlite3) records each cover's size on
+disk and last access. Once the store grows past COVER_STORE_MAX_MB, the least
+recently used covers are evicted together with their renditions, and the
+callbacks registered with on_evict() are told which files went away.
+"""
+import os
+import re
+import time
+import base64
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from config import COVERS_DIR
+
+# name -> (max width/height in px, PIL format, file extension)
+COVER_RENDITIONS = {
+    "thumb": (300, "WEBP", "webp"),
+    "display": (640, "WEBP", "webp"),
+    "spotify": (640, "JPEG", "jpg"),
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COVER_STORE_MAX_MB = int(os.getenv("COVER_STORE_MAX_MB", "512"))
+TOUCH_INTERVAL = 300                 # seconds between last_access writes for one cover
+SPOTIFY_UPLOAD_LIMIT = 256 * 1024    # Spotify's limit on the base64 cover payload
+_HASHED_NAME = re.compile(r"^[0-9a-f]{16}\.png$")
+
+# callback([original paths]) for every eviction, see on_evict
+_evict_callbacks = []
+
+
+def on_evict(callback):
+    """Register callback(paths) to run with the original paths of evicted covers"""
+    _evict_callbacks.append(callback)
+    return callback
+
+
+def is_content_addressed(filename):
+    """True for covers named by content hash - their bytes can never change"""
+    return bool(_HASHED_NAME.match(filename or ""))
+
+
+def _atomic_save(image, path, fmt, **options):
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix=path.suffix)
+    os.close(fd)
+    try:
+        image.save(tmp_path, format=fmt, **options)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CoverStore:
+    def __init__(self, root=COVERS_DIR, max_bytes=COVER_STORE_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.renditions_dir = self.root / "renditions"
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._touched = {}
+        os.makedirs(self.renditions_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS covers (
+                    digest TEXT PRIMARY KEY,
+                    bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_covers_last_access ON covers(last_access)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.root / "manifest.sqlite3"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def original_path(self, digest):
+        return self.root / f"{digest}.png"
+
+    def rendition_path(self, digest, rendition):
+        _, _, ext = COVER_RENDITIONS[rendition]
+        return self.renditions_dir / f"{digest}-{rendition}.{ext}"
+
+    def _disk_bytes(self, digest):
+        paths = [self.original_path(digest)] + [self.rendition_path(digest, r) for r in COVER_RENDITIONS]
+        return sum(path.stat().st_size for path in paths if path.exists())
+
+    def publish(self, path):
+        """
+        Move a generated cover into the store under <sha256[:16]>.png, render its
+        renditions, record it in the manifest and evict old covers if over budget.
+        Returns the stored path.
+        """
+        path = Path(path)
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+        target = self.original_path(digest)
+        if target.exists():
+            if path.resolve() != target.resolve():
+                path.unlink()  # Duplicate of a cover we already have
+        else:
+            os.replace(path, target)
+
+        for rendition in COVER_RENDITIONS:
+            try:
+                self.rendition(target.name, rendition)
+            except Exception as e:
+                print(f"⚠️ Could not pre-render {rendition} rendition for {target.name}: {e}")
+
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO covers (digest, bytes, created_at, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(digest) DO UPDATE SET bytes = excluded.bytes, last_access = excluded.last_access",
+            (digest, self._disk_bytes(digest), now, now)
+        )
+        self.evict(keep=digest)
+        return target
+
+    def rendition(self, filename, rendition):
+        """Path of a rendition of a stored cover, rendering it on first use"""
+        width, fmt, _ = COVER_RENDITIONS[rendition]
+        digest = Path(filename).stem
+        source = self.root / filename
+        output = self.rendition_path(digest, rendition)
+        if output.exists():
+            return output
+        if not source.is_file():
+            raise FileNotFoundError(filename)
+
+        with Image.open(source) as image:
+            image = image.convert("RGB")
+            image.thumbnail((width, width), Image.LANCZOS)
+            options = {"quality": 85, "method": 4} if fmt == "WEBP" else {"quality": 88, "optimize": True, "progressive": True}
+            _atomic_save(image, output, fmt, **options)
+        return output
+
+    def touch(self, filename):
+        """Record a view for LRU eviction, writing at most once per TOUCH_INTERVAL per cover"""
+        if not is_content_addressed(filename):
+            return
+        digest, now = Path(filename).stem, time.time()
+        if now - self._touched.get(digest, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[digest] = now
+        try:
+            self._connect().execute(
+                "UPDATE covers SET last_access = ?, hits = hits + 1 WHERE digest = ?", (now, digest)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Cover manifest update failed: {e}")
+
+    def total_bytes(self):
+        return self._connect().execute("SELECT COALESCE(SUM(bytes), 0) FROM covers").fetchone()[0]
+
+    def evict(self, keep=None):
+        """Drop least recently used covers (and renditions) until the store fits in max_bytes"""
+        conn = self._connect()
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return []
+        evicted = []
+        for digest, size in conn.execute("SELECT digest, bytes FROM covers ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            for path in [self.original_path(digest)] + [self.rendition_path(digest, r) for r in COVER_RENDITIONS]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            conn.execute("DELETE FROM covers WHERE digest = ?", (digest,))
+            self._touched.pop(digest, None)
+            total -= size
+            evicted.append(digest)
+        if evicted:
+            print(f"🧹 Evicted {len(evicted)} covers from the store ({total / 1024 / 1024:.1f} MB kept)")
+            paths = [str(self.original_path(digest)) for digest in evicted]
+            for callback in _evict_callbacks:
+                try:
+                    callback(paths)
+                except Exception as e:
+                    print(f"⚠️ Evicted cover callback failed: {e}")
+        return evicted
+
+    def spotify_upload_base64(self, filename):
+        """Base64 JPEG of a cover that fits Spotify's 256 KB upload limit"""
+        data = self.rendition(filename, "spotify").read_bytes()
+        encoded = base64.b64encode(data)
+        quality = 80
+        while len(encoded) > SPOTIFY_UPLOAD_LIMIT and quality >= 40:
+            with Image.open(self.root / filename) as image:
+                image = image.convert("RGB")
+                image.thumbnail((640, 640), Image.LANCZOS)
+                buffer = BytesIO()
+                image.save(buffer, format="JPEG", quality=quality, optimize=True)
+            encoded = base64.b64encode(buffer.getvalue())
+            quality -= 10
+        return encoded.decode()
+
+    def stats(self):
+        count = self._connect().execute("SELECT COUNT(*) FROM covers").fetchone()[0]
+        return {"covers": count, "bytes": self.total_bytes(), "max_bytes": self.max_bytes}
+
+
+store = CoverStore()
+
+
+def publish_cover(path):
+    return store.publish(path)
+
+
+def cover_rendition(filename, rendition):
+    return store.rendition(filename, rendition)
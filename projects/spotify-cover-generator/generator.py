@@ -2,18 +2,98 @@
 
 import os
 import datetime
-import base64
-import io
+import time
+import hashlib
 from pathlib import Path
-from PIL import Image
 
-from spotify_client import extract_playlist_data
+from spotify_client import extract_playlist_data, get_item_version
 from image_generator import create_prompt_from_data, generate_cover_image
 from title_generator import generate_title
 from chart_generator import generate_genre_chart
-from utils import create_image_filename, get_available_loras
+from utils import create_image_filename, get_available_loras, calculate_genre_percentages
 from models import GenerationResult
 from config import COVERS_DIR
+from pipeline import StagePipeline, PipelineAbort
+from cover_store import publish_cover, on_evict
+
+# Stages that can overlap: extraction, title, prompt, chart, percentages, image
+GENERATION_STAGE_WORKERS = int(os.getenv("GENERATION_STAGE_WORKERS", "4"))
+
+# "random" draws a new Stability seed per run; "fixed" derives it from the generation key
+SEED_POLICIES = ("random", "fixed")
+
+def generation_key(version, user_mood, lora_name, negative_prompt, seed_policy, user_id=None):
+    """
+    Dedup key: the same playlist snapshot and prompt inputs from the same user
+    give the same key. Guests (user_id None) share one anonymous scope.
+    """
+    parts = [str(user_id or ""), version or "", (user_mood or "").strip(), lora_name or "",
+             (negative_prompt or "").strip(), seed_policy]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def find_reusable_generation(key):
+    """Result dict of the stored generation for key if its cover is still on disk, else None"""
+    try:
+        from app import GenerationReuse, GenerationResultDB, db, app
+        
+        with app.app_context():
+            entry = db.session.get(GenerationReuse, key)
+            if entry is None:
+                return None
+            row = db.session.get(GenerationResultDB, entry.generation_id)
+            if row is None or not os.path.exists(row.output_path):
+                # The cover was evicted from the store - generate afresh
+                db.session.delete(entry)
+                db.session.commit()
+                return None
+            
+            result = {
+                "title": row.title,
+                "output_path": row.output_path,
+                "image_file": os.path.basename(row.output_path),
+                "item_name": row.item_name,
+                "genres": row.genres or [],
+                "all_genres": row.all_genres or [],
+                "style_elements": row.style_elements or [],
+                "mood": row.mood,
+                "timestamp": str(row.timestamp),
+                "spotify_url": row.spotify_url,
+                "data_file": str(row.id)
+            }
+            if row.lora_name:
+                result["lora_name"] = row.lora_name
+                result["lora_type"] = row.lora_type
+            return result
+    except Exception as e:
+        print(f"⚠️ Generation reuse lookup failed: {e}")
+        return None
+
+def remember_generation(key, generation_id):
+    """Point key at a saved GenerationResultDB row for later reuse"""
+    try:
+        from app import GenerationReuse, db, app
+        
+        with app.app_context():
+            db.session.merge(GenerationReuse(key=key, generation_id=int(generation_id)))
+            db.session.commit()
+    except Exception as e:
+        print(f"⚠️ Could not record generation for reuse: {e}")
+
+@on_evict
+def forget_evicted_covers(paths):
+    """Clear output_path on generations whose cover the store evicted, so history doesn't link to it"""
+    try:
+        from app import GenerationResultDB, db, app
+        
+        with app.app_context():
+            cleared = (GenerationResultDB.query
+                       .filter(GenerationResultDB.output_path.in_(paths))
+                       .update({GenerationResultDB.output_path: ""}, synchronize_session=False))
+            db.session.commit()
+            if cleared:
+                print(f"🧹 Cleared {cleared} generation(s) pointing at evicted covers")
+    except Exception as e:
+        print(f"⚠️ Could not clear evicted covers from generations: {e}")
 
 def save_generation_data_with_user(data, user_id=None):
     """Save generation data to database with user tracking"""
@@ -75,50 +155,11 @@ except ImportError:
     def monitor_performance(func):
         return func
 
-@monitor_performance
-def generate_cover(url, user_mood=None, lora_input=None, output_path=None, negative_prompt=None, user_id=None):
-    """Generate album cover and title from Spotify URL with user tracking"""
-    print(f"Processing Spotify URL: {url}")
-    
-    # Extract playlist/album data
-    playlist_data = extract_playlist_data(url)
-    if isinstance(playlist_data, dict) and "error" in playlist_data:
-        return {"error": playlist_data["error"]}
-    
-    print(f"\nSuccessfully extracted data for: {playlist_data.item_name}")
-    print(f"Top genres identified: {', '.join(playlist_data.genre_analysis.top_genres)}")
-    
-    # Convert playlist data to dictionary
-    data = playlist_data.to_dict()
-    print(f"DEBUG: artist_ids in data for title generation: {data.get('artist_ids')}") 
-    
-    # Create image prompt
-    base_image_prompt = create_prompt_from_data(data, user_mood)
-    
-    # Generate title
-    title = generate_title(data, user_mood)
-    print(f"Generated title: {title}")
-    
-    # Add title to data
-    data["title"] = title
-    
-    # Create final image prompt with title
-    image_prompt = f"{base_image_prompt}, representing the album '{title}'"
-    print(f"Final image prompt with title: {image_prompt}")
-    
-    # Determine output path
-    if not output_path:
-        img_filename = create_image_filename(title)
-        output_path = COVERS_DIR / img_filename
-    
-    # Make sure the output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Process LoRA input - simplified to only handle local LoRAs
+def _resolve_lora(lora_input):
+    """Resolve the LoRA input into (lora, lora_name, lora_type) - simplified to only handle local LoRAs"""
     lora = None
     lora_name = ""
     lora_type = "none"
-    lora_url = ""
     
     if lora_input:
         # If it's a string, it could be a local LoRA name
@@ -151,52 +192,160 @@ def generate_cover(url, user_mood=None, lora_input=None, output_path=None, negat
                 lora_name = lora_input.get('name', '')
                 lora_type = lora_input.get('source_type', 'local')
     
-    # Generate cover image with the custom negative prompt if provided
-    image_result = generate_cover_image(image_prompt, lora, output_path, negative_prompt)
+    return lora, lora_name, lora_type
+
+def _genre_chart(genres):
+    try:
+        return generate_genre_chart(genres)
+    except Exception as e:
+        print(f"⚠️ Error generating genre chart: {e}")
+        return None
+
+def _genre_percentages(genres):
+    try:
+        return calculate_genre_percentages(genres)
+    except Exception as e:
+        print(f"⚠️ Error calculating genre percentages: {e}")
+        return []
+
+@monitor_performance
+def generate_cover(url, user_mood=None, lora_input=None, output_path=None, negative_prompt=None, user_id=None,
+                   reuse=False, seed_policy="random"):
+    """
+    Generate album cover and title from Spotify URL with user tracking.
+
+    The steps run as a stage graph: title generation overlaps prompt building,
+    and the genre chart/percentages overlap image generation. Per-stage timings
+    are returned in result["stage_timings"].
+
+    With reuse=True, a stored generation by the same user for the same playlist
+    snapshot, mood, LoRA, negative prompt and seed policy is returned (with
+    result["reused"]) instead of running the pipeline again. It is already in
+    that user's history, so nothing new is saved.
+    """
+    print(f"Processing Spotify URL: {url}")
+    if seed_policy not in SEED_POLICIES:
+        seed_policy = "random"
     
-    if image_result is None or (isinstance(image_result, bool) and not image_result):
-        return {"error": "Failed to generate cover image"}
+    lookup_started = time.perf_counter()
+    lora = _resolve_lora(lora_input)
+    version = get_item_version(url)
+    key = generation_key(version or url, user_mood, lora[1], negative_prompt, seed_policy, user_id)
     
-    # Check if image_result is a PIL Image or a boolean success value
-    if hasattr(image_result, 'mode'):  # It's a PIL Image
-        image = image_result
-    else:
-        # It's a success boolean, so load image from file
-        try:
-            image = Image.open(output_path)
-        except Exception as e:
-            print(f"Error opening generated image: {e}")
-            return {"error": f"Failed to process generated image: {str(e)}"}
+    if reuse and version:
+        reused = find_reusable_generation(key)
+        if reused:
+            print(f"♻️ Reusing generation {reused['data_file']} for unchanged {version}")
+            lookup_time = round(time.perf_counter() - lookup_started, 4)
+            reused["reused"] = True
+            reused["stage_timings"] = {"reuse_lookup": lookup_time, "total": lookup_time}
+            return reused
+    lookup_time = round(time.perf_counter() - lookup_started, 4)
     
-    # Convert image to base64 for embedding in HTML
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    img_base64 = base64.b64encode(buffered.getvalue()).decode()
+    def extract():
+        # Extract playlist/album data (served from spotify_client's cache while the snapshot is unchanged)
+        playlist_data = extract_playlist_data(url)
+        if isinstance(playlist_data, dict) and "error" in playlist_data:
+            raise PipelineAbort(playlist_data["error"])
+        
+        print(f"\nSuccessfully extracted data for: {playlist_data.item_name}")
+        print(f"Top genres identified: {', '.join(playlist_data.genre_analysis.top_genres)}")
+        return playlist_data
+    
+    def data(extract):
+        # Convert playlist data to dictionary
+        return extract.to_dict()
     
-    # Current timestamp
-    timestamp = str(datetime.datetime.now())
+    def prompt(data):
+        # Create image prompt
+        return create_prompt_from_data(data, user_mood)
+    
+    def title(data):
+        title = generate_title(data, user_mood)
+        print(f"Generated title: {title}")
+        return title
+    
+    def image(prompt, title):
+        # Create final image prompt with title
+        image_prompt = f"{prompt}, representing the album '{title}'"
+        print(f"Final image prompt with title: {image_prompt}")
+        
+        # Determine output path
+        path = output_path or COVERS_DIR / create_image_filename(title)
+        
+        # Make sure the output directory exists
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Generate cover image with the custom negative prompt if provided
+        seed = int(key[:8], 16) % 1000000 + 1 if seed_policy == "fixed" else None
+        image_result = generate_cover_image(image_prompt, lora[0], path, negative_prompt, seed=seed)
+        
+        if image_result is None or (isinstance(image_result, bool) and not image_result):
+            raise PipelineAbort("Failed to generate cover image")
+        
+        # A PIL Image is normally already saved to path; a success boolean means the file is there
+        if hasattr(image_result, 'mode') and not os.path.exists(path):
+            image_result.save(path)
+        if not os.path.exists(path):
+            raise PipelineAbort("Failed to process generated image: output file is missing")
+        return path
+    
+    def publish(image):
+        # Rename to the content hash (served with immutable cache headers) and pre-render thumbnails;
+        # an explicit output_path belongs to the caller and is left alone
+        if output_path:
+            return image
+        return publish_cover(image)
+    
+    pipeline = StagePipeline("generate_cover", max_workers=GENERATION_STAGE_WORKERS)
+    pipeline.add("extract", extract)
+    pipeline.add("data", data, deps=["extract"])
+    pipeline.add("prompt", prompt, deps=["data"])
+    pipeline.add("title", title, deps=["data"])
+    pipeline.add("chart", lambda data: _genre_chart(data.get("all_genres", [])), deps=["data"])
+    pipeline.add("percentages", lambda data: _genre_percentages(data.get("all_genres", [])), deps=["data"])
+    pipeline.add("image", image, deps=["prompt", "title"])
+    pipeline.add("publish", publish, deps=["image"])
+    
+    try:
+        stages = pipeline.run()
+    except PipelineAbort as e:
+        print(f"⚠️ {pipeline.timing_report()}")
+        return {"error": str(e)}
+    
+    _, lora_name, lora_type = lora
     
     # Create result object
     result = GenerationResult(
-        title=title,
-        output_path=str(output_path),
-        playlist_data=playlist_data,
+        title=stages["title"],
+        output_path=str(stages["publish"]),
+        playlist_data=stages["extract"],
         user_mood=user_mood,
         lora_name=lora_name,
         lora_type=lora_type,
-        lora_url=lora_url,
-        timestamp=timestamp
+        lora_url="",
+        timestamp=str(datetime.datetime.now())
     )
     
     # Convert to dict for saving
     result_dict = result.to_dict()
     
-    # Add the base64 data to the result dict
-    result_dict["image_data_base64"] = img_base64
+    # Add the served filename and the charts computed alongside the image
+    result_dict["image_file"] = os.path.basename(result_dict["output_path"])
+    result_dict["genres_chart"] = stages["chart"]
+    result_dict["genre_percentages"] = stages["percentages"]
     
     # Save data to database with user tracking
+    save_started = time.perf_counter()
     data_file = save_generation_data_with_user(result_dict, user_id)
     if data_file:
         result_dict["data_file"] = data_file
+        if version and str(data_file).isdigit():
+            remember_generation(key, data_file)
+    pipeline.timings["save"] = round(time.perf_counter() - save_started, 4)
+    pipeline.timings["version"] = lookup_time
+    
+    result_dict["stage_timings"] = dict(pipeline.timings, total=pipeline.total_time)
+    print(f"⏱️ {pipeline.timing_report()}")
     
-    return result_dict
\ No newline at end of file
+    return result_dict
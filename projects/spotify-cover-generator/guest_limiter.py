@@ -0,0 +1,270 @@
+"""
+Sliding-window generation quota for guests, keyed by hashed IP.
+
+Quota checks are answered from a local SQLite file under DATA_DIR that every
+worker process (and the generation job threads) on the host share, so a guest
+can't get one generation per gunicorn worker. The database
+(GuestIPGenerationLog) is read only to seed an IP the file has never seen, and
+is written by a background thread so recording a generation never waits on a
+commit. GUEST_LIMITER_SHARED=0 keeps windows in process memory instead (single
+worker or tests).
+
+A generation takes its slot up front with reserve(), atomically with the limit
+check, and then confirm()s it when a cover was made or release()s it when the
+generation failed or reused an earlier cover. So a guest can't queue several
+jobs while the first one is still running.
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+try:
+    from config import DATA_DIR
+except ImportError:
+    DATA_DIR = Path(os.path.dirname(os.path.abspath(__file__))) / "data"
+
+GUEST_DAILY_LIMIT = int(os.getenv("GUEST_DAILY_LIMIT", "1"))
+GUEST_WINDOW_SECONDS = float(os.getenv("GUEST_QUOTA_WINDOW_HOURS", "24")) * 3600
+GUEST_LIMITER_PATH = os.getenv("GUEST_LIMITER_PATH", str(DATA_DIR / "guest_quota.sqlite3"))
+GUEST_LIMITER_MAX_KEYS = 50_000
+GUEST_SYNC_BATCH = 100
+
+
+class MemoryWindowStore:
+    """Per-process windows; the least recently seen IPs are forgotten first"""
+
+    def __init__(self, max_keys=GUEST_LIMITER_MAX_KEYS):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # key -> [timestamps]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Timestamps for key, or None if this store has never seen it"""
+        with self._lock:
+            events = self._windows.get(key)
+            if events is not None:
+                self._windows.move_to_end(key)
+                return list(events)
+            return None
+
+    def seed(self, key, events):
+        with self._lock:
+            if key not in self._windows:
+                self._put(key, list(events))
+
+    def add(self, key, timestamp, since, limit=None):
+        """Append timestamp to key's window; with a limit, only if fewer are inside it (else None)"""
+        with self._lock:
+            events = [t for t in self._windows.get(key, []) if t > since]
+            if limit is not None and len(events) >= limit:
+                return None
+            events.append(timestamp)
+            self._put(key, events)
+            return events
+
+    def remove(self, key, timestamp):
+        with self._lock:
+            events = self._windows.get(key)
+            if events and timestamp in events:
+                events.remove(timestamp)
+
+    def _put(self, key, events):
+        self._windows[key] = events
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+
+class SQLiteWindowStore:
+    """Windows shared by every worker process on the host"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS guest_windows (key TEXT PRIMARY KEY, events TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute("SELECT events FROM guest_windows WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def seed(self, key, events):
+        self._connect().execute(
+            "INSERT OR IGNORE INTO guest_windows (key, events, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(list(events)), time.time())
+        )
+
+    def add(self, key, timestamp, since, limit=None):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT events FROM guest_windows WHERE key = ?", (key,)).fetchone()
+            events = [t for t in (json.loads(row[0]) if row else []) if t > since]
+            if limit is not None and len(events) >= limit:
+                conn.execute("ROLLBACK")
+                return None
+            events.append(timestamp)
+            conn.execute(
+                "INSERT OR REPLACE INTO guest_windows (key, events, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(events), timestamp)
+            )
+            # Windows untouched for a whole period hold nothing that still counts
+            conn.execute("DELETE FROM guest_windows WHERE updated_at <= ?", (since,))
+            conn.execute("COMMIT")
+            return events
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, key, timestamp):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT events FROM guest_windows WHERE key = ?", (key,)).fetchone()
+            if row:
+                events = json.loads(row[0])
+                if timestamp in events:
+                    events.remove(timestamp)
+                    conn.execute("UPDATE guest_windows SET events = ? WHERE key = ?", (json.dumps(events), key))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _default_window_store():
+    """Shared SQLite store unless GUEST_LIMITER_SHARED=0 or it can't be opened"""
+    if os.getenv("GUEST_LIMITER_SHARED", "1") == "0":
+        return MemoryWindowStore()
+    try:
+        return SQLiteWindowStore(GUEST_LIMITER_PATH)
+    except Exception as e:
+        print(f"⚠️ Shared guest quota store unavailable ({e}); using per-process windows")
+        return MemoryWindowStore()
+
+
+class GuestQuotaLimiter:
+    def __init__(self, limit=GUEST_DAILY_LIMIT, window_seconds=GUEST_WINDOW_SECONDS,
+                 loader=None, persist=None, store=None):
+        """
+        loader(key) -> [timestamps] seeds an IP the store hasn't seen (from the DB);
+        persist([(key, timestamp), ...]) writes recorded generations back in batches.
+        """
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.loader = loader
+        self.persist = persist
+        self.store = store or _default_window_store()
+        self._pending = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _events(self, key, now):
+        events = self.store.get(key)
+        if events is None:
+            events = []
+            if self.loader:
+                try:
+                    events = list(self.loader(key))
+                except Exception as e:
+                    print(f"⚠️ Could not load guest quota from the database: {e}")
+            self.store.seed(key, events)
+        since = now - self.window_seconds
+        return [t for t in events if t > since]
+
+    def used(self, key, now=None):
+        """Generations recorded for key inside the current window"""
+        if not key:
+            return 0
+        return len(self._events(key, now or time.time()))
+
+    def allowed(self, key, now=None):
+        if not key:
+            return False
+        return self.used(key, now) < self.limit
+
+    def record(self, key, now=None):
+        """Count a generation now; the database write happens on the sync thread"""
+        if not key:
+            return
+        now = now or time.time()
+        self._events(key, now)  # Make sure older DB history is seeded first
+        self.store.add(key, now, now - self.window_seconds)
+        self.confirm(key, now)
+
+    def reserve(self, key, now=None):
+        """
+        Take a slot in key's window if one is free, atomically with the check.
+        Returns the slot's timestamp (pass it to confirm or release), or None
+        when the quota is used up.
+        """
+        if not key:
+            return None
+        now = now or time.time()
+        self._events(key, now)
+        if self.store.add(key, now, now - self.window_seconds, limit=self.limit) is None:
+            return None
+        return now
+
+    def confirm(self, key, timestamp):
+        """The reserved generation happened: write it to the database on the sync thread"""
+        if key and timestamp and self.persist:
+            self._ensure_sync_thread()
+            self._pending.put((key, timestamp))
+
+    def release(self, key, timestamp):
+        """Give back a reserved slot (the generation failed or cost nothing)"""
+        if key and timestamp:
+            self.store.remove(key, timestamp)
+
+    def _ensure_sync_thread(self):
+        # A forked worker inherits the limiter but not its thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._sync_loop, name="guest-quota-sync", daemon=True)
+                self._thread.start()
+
+    def _sync_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < GUEST_SYNC_BATCH:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.persist(batch)
+            except Exception as e:
+                print(f"⚠️ Error syncing guest generations to the database: {e}")
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until recorded generations have been written to the database"""
+        deadline = time.monotonic() + timeout
+        while self._pending.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
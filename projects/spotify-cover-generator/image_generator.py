@@ -24,6 +24,9 @@ except ImportError:
     """
     COVERS_DIR = os.path.join(os.path.dirname(__file__), "generated_covers")
 
+# Shared pooled client for every outbound call (see fault_handling.RobustHTTPClient)
+from fault_handling import http_client, CircuitOpenError
+
 # Monitoring imports with fallback
 try:
     from monitoring_system import monitor_api_calls
@@ -75,27 +78,6 @@ def create_prompt_from_data(playlist_data, user_mood=None):
         # Fallback prompt
         return "album cover art, music, professional artwork, highly detailed, modern design"
 
-def create_robust_session():
-    """Create a requests session with proper SSL and retry configuration"""
-    session = requests.Session()
-    
-    # Configure retries
-    from requests.adapters import HTTPAdapter
-    from urllib3.util.retry import Retry
-    
-    retry_strategy = Retry(
-        total=3,
-        status_forcelist=[429, 500, 502, 503, 504],
-        method_whitelist=["HEAD", "GET", "POST"],
-        backoff_factor=1
-    )
-    
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
-    return session
-
 def send_generation_request(url, params, max_retries=3):
     """Send request to Stability API with comprehensive error handling"""
     if not STABILITY_API_KEY:
@@ -114,17 +96,16 @@ def send_generation_request(url, params, max_retries=3):
             value = str(value)
         files[key] = (None, value)
     
-    session = create_robust_session()
-    
     for attempt in range(max_retries):
         try:
             print(f"🎨 Attempting image generation (attempt {attempt + 1}/{max_retries})...")
             
-            response = session.post(
+            response = http_client.post(
                 url, 
+                service_name="stability",
                 files=files, 
                 headers=headers, 
-                timeout=90  # Increased timeout for image generation
+                timeout=(10, 90)  # Increased timeout for image generation
             )
             
             print(f"📡 API Response Status: {response.status_code}")
@@ -151,6 +132,10 @@ def send_generation_request(url, params, max_retries=3):
                     continue
                 return None
                 
+        except CircuitOpenError as e:
+            print(f"⚡ {e}; not retrying")
+            return None
+                
         except requests.exceptions.SSLError as e:
             print(f"⚠️ SSL Error on attempt {attempt + 1}: {e}")
             if attempt < max_retries - 1:
@@ -206,12 +191,12 @@ def try_backup_stability_api(prompt, negative_prompt):
     }
     
     try:
-        session = create_robust_session()
-        response = session.post(
+        response = http_client.post(
             backup_url,
+            service_name="stability",
             headers=headers,
             json=backup_params,
-            timeout=90
+            timeout=(10, 90)
         )
         
         if response.status_code == 200:
@@ -236,8 +221,8 @@ def try_backup_stability_api(prompt, negative_prompt):
 
 @monitor_api_calls("stability")
 @fault_tolerant_api_call("stability")
-def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=None):
-    """Generate album cover image using Stability AI with comprehensive fallbacks"""
+def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=None, seed=None):
+    """Generate album cover image using Stability AI with comprehensive fallbacks (random seed unless given)"""
     
     # Validate API key
     if not STABILITY_API_KEY:
@@ -272,7 +257,8 @@ def generate_cover_image(prompt, lora=None, output_path=None, negative_prompt=No
     # Try main Stability API first
     main_url = "https://api.stability.ai/v2beta/stable-image/generate/sd3"
     
-    seed = random.randint(1, 1000000)
+    if seed is None:
+        seed = random.randint(1, 1000000)
     
     params = {
         "prompt": enhanced_prompt,
@@ -0,0 +1,91 @@
+"""
+Cold-start profile for the Spotify Cover Generator.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and prints
+the slowest modules by cumulative import time, then measures the wall time
+from process start to the first response (GET /health through the test
+client), taking the median of several fresh processes.
+
+    python import_profile.py            # top 25 modules, 5 cold starts
+    python import_profile.py --top 40 --runs 10 --path /generate
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+FIRST_RESPONSE_SNIPPET = """
+import app
+response = app.app.test_client().get({path!r})
+print(response.status_code)
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    env.setdefault("SCHEMA_CHECK_ON_START", "0")
+    return env
+
+
+def import_profile():
+    """(module, self_us, cumulative_us, depth) for every module `import app` loads"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=str(BASE_DIR), env=_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def time_to_first_response(path="/health", runs=5):
+    """Wall-clock seconds from process start to the first response, one fresh process per run"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", FIRST_RESPONSE_SNIPPET.format(path=path)],
+            cwd=str(BASE_DIR), env=_env(), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="number of modules to list")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--path", default="/health", help="route to request first")
+    args = parser.parse_args()
+
+    import_profile()  # Warm the bytecode cache so the profile measures imports, not compilation
+    rows = import_profile()
+    # Threads started at import (the system monitor) can interleave their own
+    # imports into the report, so take the largest "app" entry as the total
+    total = max((cumulative for module, _, cumulative, _ in rows if module == "app"), default=0)
+    print(f"📦 import app: {total / 1000:.0f} ms across {len(rows)} modules\n")
+    print(f"{'cumulative':>12} {'self':>9}  module")
+    for module, self_us, cumulative_us, depth in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>9.1f} ms {self_us / 1000:>6.1f} ms  {'  ' * depth}{module}")
+
+    timings = time_to_first_response(args.path, args.runs)
+    print(f"\n⏱️ start → first response ({args.path}): median {statistics.median(timings) * 1000:.0f} ms "
+          f"(min {min(timings) * 1000:.0f}, max {max(timings) * 1000:.0f}, {len(timings)} runs)")
+
+
+if __name__ == "__main__":
+    main()
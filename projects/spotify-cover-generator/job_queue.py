@@ -0,0 +1,251 @@
+"""
+Background job queue for cover generation.
+
+Jobs live in a local SQLite database (the stand-in broker), so every gunicorn
+worker process can enqueue and any of them can pick a job up. Claiming uses
+BEGIN IMMEDIATE so a job is only ever handed to one worker thread. Each process
+runs a small pool of worker threads, started on first use, which call the
+handler registered for the job's kind and store its JSON result.
+
+A claimed job holds a lease (lease_until) that its worker renews every
+JOB_HEARTBEAT_INTERVAL while the handler runs. Workers periodically requeue
+running jobs whose lease has expired, i.e. whose worker died, however long a
+healthy generation takes.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+
+try:
+    from config import DATA_DIR
+except ImportError:
+    DATA_DIR = Path(os.path.dirname(os.path.abspath(__file__))) / "data"
+
+JOB_QUEUE_PATH = os.getenv("GENERATION_QUEUE_PATH", str(DATA_DIR / "generation_jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+JOB_POLL_INTERVAL = 0.5          # seconds an idle worker waits before polling again
+JOB_LEASE_SECONDS = 60           # a running job whose lease is this old has lost its worker
+JOB_HEARTBEAT_INTERVAL = JOB_LEASE_SECONDS / 3
+JOB_RECOVERY_INTERVAL = JOB_LEASE_SECONDS  # seconds between expired-lease sweeps per worker
+JOB_MAX_ATTEMPTS = 2
+JOB_RETENTION_SECONDS = 24 * 3600
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_PATH, workers=JOB_WORKERS):
+        self.path = str(path)
+        self.workers = workers
+        self.handlers = {}
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._local = threading.local()
+        self._last_recovery = 0.0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_until REAL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_until" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner_status ON jobs(owner, status)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        """Register handler(payload) -> JSON-serialisable result for a job kind"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, owner=None):
+        """Queue a job and make sure this process has workers running; returns the job id"""
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO jobs (id, kind, owner, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, owner, QUEUED, json.dumps(payload), time.time())
+        )
+        self.start_workers()
+        return job_id
+
+    def get(self, job_id):
+        """Job status dict (payload and result decoded), or None if unknown"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["status"] == QUEUED:
+            job["position"] = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+            ).fetchone()[0]
+        return job
+
+    def active_for(self, owner):
+        """Id of a queued or running job for this owner, if any"""
+        row = self._connect().execute(
+            "SELECT id FROM jobs WHERE owner = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+            (owner, QUEUED, RUNNING)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def claim(self):
+        """Atomically move the oldest queued job to running; returns the job row or None"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, now, now + JOB_LEASE_SECONDS, row["id"])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, job_id, result=None, error=None, attempt=None):
+        """
+        Store a job's outcome. With attempt, only if the job is still on that
+        attempt (a worker whose lease expired and was requeued doesn't overwrite it).
+        """
+        sql = "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?"
+        params = [FAILED if error else DONE, json.dumps(result) if result is not None else None,
+                  error, time.time(), job_id]
+        if attempt is not None:
+            sql += " AND attempts = ?"
+            params.append(attempt)
+        self._connect().execute(sql, params)
+
+    def renew_lease(self, job_id, attempt):
+        """Extend a running job's lease; False once the job is no longer ours"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND attempts = ?",
+            (time.time() + JOB_LEASE_SECONDS, job_id, RUNNING, attempt)
+        )
+        return cursor.rowcount == 1
+
+    def _heartbeat(self, job_id, attempt, done):
+        while not done.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                if not self.renew_lease(job_id, attempt):
+                    return
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not renew lease for generation job {job_id}: {e}")
+
+    def recover_stale(self):
+        """Requeue running jobs whose lease expired (their worker died), failing them after JOB_MAX_ATTEMPTS"""
+        conn = self._connect()
+        now = time.time()
+        self._last_recovery = now
+        expired = "status = ? AND COALESCE(lease_until, started_at + ?) < ?"
+        conn.execute(
+            f"UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL "
+            f"WHERE {expired} AND attempts >= ?",
+            (FAILED, "Generation worker stopped before finishing", now, RUNNING, JOB_LEASE_SECONDS, now,
+             JOB_MAX_ATTEMPTS)
+        )
+        conn.execute(
+            f"UPDATE jobs SET status = ?, lease_until = NULL WHERE {expired}",
+            (QUEUED, RUNNING, JOB_LEASE_SECONDS, now)
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - JOB_RETENTION_SECONDS)
+        )
+
+    def run_next(self):
+        """Claim and run one job; returns False when the queue was empty"""
+        row = self.claim()
+        if row is None:
+            return False
+        handler = self.handlers.get(row["kind"])
+        if handler is None:
+            self.finish(row["id"], error=f"No handler registered for job kind '{row['kind']}'")
+            return True
+        attempt = row["attempts"] + 1  # claim() incremented it
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(row["id"], attempt, done),
+                                     name=f"generation-lease-{row['id'][:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(json.loads(row["payload"]))
+            if isinstance(result, dict) and result.get("error"):
+                self.finish(row["id"], result=result, error=str(result["error"]), attempt=attempt)
+            else:
+                self.finish(row["id"], result=result, attempt=attempt)
+        except Exception as e:
+            print(f"❌ Generation job {row['id']} failed: {e}")
+            self.finish(row["id"], error=f"An unexpected error occurred: {str(e)}", attempt=attempt)
+        finally:
+            done.set()
+        return True
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                if time.time() - self._last_recovery >= JOB_RECOVERY_INTERVAL:
+                    self.recover_stale()
+                if not self.run_next():
+                    self._stop.wait(JOB_POLL_INTERVAL)
+            except Exception as e:
+                print(f"⚠️ Generation worker error: {e}")
+                self._stop.wait(JOB_POLL_INTERVAL * 4)
+
+    def start_workers(self):
+        """Start this process's worker threads once (after a fork they start again in the child)"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        with self._start_lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"generation-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            print(f"✓ Started {self.workers} generation workers (queue: {self.path})")
+
+    def stop_workers(self, timeout=5):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+generation_queue = JobQueue()
@@ -0,0 +1,190 @@
+"""
+Fixed-bucket latency histograms for request, function and external API timings.
+
+Each series (e.g. http_request for one endpoint) keeps a cumulative histogram
+for Prometheus plus a ring of short time slots, so "last hour" percentiles and
+error rates are computed by merging a dozen bucket arrays instead of scanning
+individual samples. Percentiles are interpolated within a bucket, so they are
+accurate to the bucket width (roughly ±25% at the default bounds).
+"""
+import time
+import threading
+from bisect import bisect_left
+
+# Upper bounds in milliseconds; anything slower lands in the +Inf bucket
+DEFAULT_BOUNDS_MS = (
+    5, 10, 25, 50, 75, 100, 150, 250, 400, 600, 1000, 1500,
+    2500, 4000, 6000, 10000, 15000, 25000, 40000, 60000, 120000,
+)
+
+# Labels per metric before new ones are folded into OVERFLOW_LABEL
+MAX_SERIES_PER_METRIC = 200
+OVERFLOW_LABEL = "other"
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=DEFAULT_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = self.errors = 0
+        self.sum_ms = self.max_ms = 0.0
+
+    def observe(self, duration_ms, error=False):
+        self.counts[bisect_left(self.bounds, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if error:
+            self.errors += 1
+
+    def merge(self, other):
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.count += other.count
+        self.errors += other.errors
+        self.sum_ms += other.sum_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        return self
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100) in ms, or None when empty"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max_ms
+                # The observed max is a tighter upper bound than the bucket edge
+                upper = min(upper, self.max_ms)
+                return lower + (upper - lower) * (rank - seen) / value if upper > lower else upper
+            seen += value
+        return self.max_ms
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "avg_ms": self.sum_ms / self.count,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "error_rate": self.errors / self.count * 100,
+        }
+
+
+class WindowedHistogram:
+    """Cumulative histogram plus per-slot histograms covering the last `window` seconds"""
+
+    def __init__(self, window=3600, slots=12, bounds=DEFAULT_BOUNDS_MS):
+        self.bounds = bounds
+        self.slot_seconds = window / slots
+        self.total = LatencyHistogram(bounds)
+        self._slots = [(None, LatencyHistogram(bounds)) for _ in range(slots)]
+
+    def observe(self, duration_ms, error=False, now=None):
+        slot_id = int((time.time() if now is None else now) // self.slot_seconds)
+        index = slot_id % len(self._slots)
+        current_id, histogram = self._slots[index]
+        if current_id != slot_id:
+            histogram = LatencyHistogram(self.bounds)
+            self._slots[index] = (slot_id, histogram)
+        histogram.observe(duration_ms, error)
+        self.total.observe(duration_ms, error)
+
+    def recent(self, now=None):
+        """Merged histogram of the slots still inside the window"""
+        oldest = int((time.time() if now is None else now) // self.slot_seconds) - len(self._slots) + 1
+        merged = LatencyHistogram(self.bounds)
+        for slot_id, histogram in self._slots:
+            if slot_id is not None and slot_id >= oldest:
+                merged.merge(histogram)
+        return merged
+
+
+class LatencyRegistry:
+    """
+    Thread-safe set of WindowedHistograms keyed by metric name and label. Each
+    metric holds at most max_series labels; observations for any further label
+    are counted under OVERFLOW_LABEL so memory and /metrics output stay bounded.
+    """
+
+    def __init__(self, window=3600, slots=12, bounds=DEFAULT_BOUNDS_MS, max_series=MAX_SERIES_PER_METRIC):
+        self.window, self.slots, self.bounds = window, slots, bounds
+        self.max_series = max_series
+        self._series = {}  # (metric, label) -> WindowedHistogram
+        self._label_counts = {}  # metric -> labels held
+        self._lock = threading.Lock()
+
+    def observe(self, metric, label, duration_ms, error=False):
+        key = (metric, label)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if self._label_counts.get(metric, 0) >= self.max_series:
+                    key = (metric, OVERFLOW_LABEL)
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = WindowedHistogram(self.window, self.slots, self.bounds)
+                    self._label_counts[metric] = self._label_counts.get(metric, 0) + 1
+            series.observe(duration_ms, error)
+
+    def recent(self, metric):
+        """{label: merged recent histogram} for one metric"""
+        with self._lock:
+            return {label: series.recent() for (name, label), series in self._series.items() if name == metric}
+
+    def summary(self, metric):
+        """Recent summary for every label of a metric plus an "all" rollup"""
+        per_label = self.recent(metric)
+        overall = LatencyHistogram(self.bounds)
+        for histogram in per_label.values():
+            overall.merge(histogram)
+        return {
+            "all": overall.summary(),
+            "by_label": {label: h.summary() for label, h in sorted(per_label.items()) if h.count},
+        }
+
+    def prometheus_text(self, prefix="spotify_cover", label_names=None):
+        """Prometheus text exposition (version 0.0.4) of the cumulative histograms"""
+        label_names = label_names or {}
+        with self._lock:
+            snapshot = sorted(
+                ((metric, label, _copy(series.total)) for (metric, label), series in self._series.items()),
+                key=lambda item: (item[0], item[1]),
+            )
+
+        lines = []
+        for metric in sorted({metric for metric, _, _ in snapshot}):
+            series = [(label, histogram) for name, label, histogram in snapshot if name == metric]
+            label_name = label_names.get(metric, "name")
+            name = f"{prefix}_{metric}_duration_seconds"
+            lines.append(f"# HELP {name} {metric.replace('_', ' ')} latency in seconds")
+            lines.append(f"# TYPE {name} histogram")
+            for label, histogram in series:
+                labels = f'{label_name}="{_escape(label)}"'
+                cumulative = 0
+                for bound, value in zip(self.bounds, histogram.counts):
+                    cumulative += value
+                    lines.append(f'{name}_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum_ms / 1000:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            errors_name = f"{prefix}_{metric}_errors_total"
+            lines.append(f"# HELP {errors_name} {metric.replace('_', ' ')} failures")
+            lines.append(f"# TYPE {errors_name} counter")
+            for label, histogram in series:
+                lines.append(f'{errors_name}{{{label_name}="{_escape(label)}"}} {histogram.errors}')
+        return "\n".join(lines) + "\n"
+
+
+def _copy(histogram):
+    return LatencyHistogram(histogram.bounds).merge(histogram)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,36 @@
+"""
+Deferred imports for modules that are expensive to load on a cold start.
+
+    spotify_client = lazy_module("spotify_client")
+
+binds a stand-in that imports the real module on first attribute access, so
+the process can answer its first request before spotipy (and the redis client
+it drags in) is loaded. The import itself goes through importlib, which holds
+the module's import lock, so concurrent first uses are safe.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+
+    def _load(self):
+        return importlib.import_module(self.__name__)
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__name__ in sys.modules else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_module(name):
+    """The module if it is already imported, otherwise a LazyModule for it"""
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,216 @@
+"""
+Queue-based structured logging.
+
+Producers (request handlers, decorators, the HTTP client) only decide whether
+an event is kept and enqueue it; a background thread serializes it to JSON,
+caps oversized fields and writes it through the logging module. The decision
+on the producer side is cheap:
+
+- sampling: LOG_SAMPLE_RATES="function_execution=0.1,http_request=0.5" keeps
+  that fraction of an event type. Warnings and errors are never sampled out.
+- rate limiting: at most LOG_RATE_LIMIT events per second per event type
+  (per-type overrides with LOG_RATE_LIMITS="http_request=20"). Suppressed
+  events are counted and reported in a periodic "log_suppressed" event.
+- a full queue drops the event rather than blocking the request; drops are
+  reported the same way.
+
+LOG_ASYNC=0 writes synchronously on the caller's thread (useful when
+debugging ordering problems).
+"""
+import os
+import json
+import time
+import queue
+import random
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_FIELD_MAX_CHARS = int(os.getenv("LOG_FIELD_MAX_CHARS", "2000"))
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "100"))
+LOG_SUPPRESSED_REPORT_SECONDS = 60
+
+# Successful function timings are also in the latency histograms, so a sample is enough
+DEFAULT_SAMPLE_RATES = {"function_execution": 0.1}
+
+ALWAYS_KEEP_LEVELS = {"warning", "error", "critical"}
+
+
+def parse_rates(spec, cast=float):
+    """'event=value,other=value' -> {event: value}, ignoring malformed entries"""
+    rates = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        try:
+            rates[name.strip()] = cast(value)
+        except ValueError:
+            continue
+    return rates
+
+
+def cap_field(value, max_chars=LOG_FIELD_MAX_CHARS):
+    """Trim a log field so one huge kwargs dump or traceback can't flood the log"""
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if len(text) > max_chars:
+        return text[:max_chars] + f"...[{len(text) - max_chars} chars truncated]"
+    return value  # Small dicts and lists stay structured
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "tokens", "updated")
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LogPipeline:
+    def __init__(self, logger, app_name, async_mode=LOG_ASYNC, queue_size=LOG_QUEUE_SIZE,
+                 sample_rates=None, rate_limit=LOG_RATE_LIMIT, rate_limits=None,
+                 max_field_chars=LOG_FIELD_MAX_CHARS):
+        self.logger = logger
+        self.app_name = app_name
+        self.async_mode = async_mode
+        self.max_field_chars = max_field_chars
+        self.sample_rates = {**DEFAULT_SAMPLE_RATES, **(sample_rates if sample_rates is not None
+                                                        else parse_rates(os.getenv("LOG_SAMPLE_RATES")))}
+        self.rate_limit = rate_limit
+        self.rate_limits = rate_limits if rate_limits is not None else parse_rates(os.getenv("LOG_RATE_LIMITS"))
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._suppressed = defaultdict(int)  # event -> events rate limited or dropped since last report
+        self._last_report = time.monotonic()
+        self._thread = None
+        self._pid = None
+        self.sampled_out = self.rate_limited = self.dropped = 0
+
+    # --- Producer side -----------------------------------------------------
+
+    def emit(self, level, event, fields):
+        """Keep or discard the event and hand it to the writer; never blocks"""
+        level = level.lower()
+        if level not in ALWAYS_KEEP_LEVELS:
+            rate = self.sample_rates.get(event, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        if not self._within_rate_limit(event):
+            with self._lock:
+                self._suppressed[event] += 1
+                self.rate_limited += 1
+            return False
+
+        record = (datetime.utcnow(), level, event, fields)
+        if not self.async_mode:
+            self._write(record)
+            self._report_suppressed()
+            return True
+
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._suppressed[event] += 1
+                self.dropped += 1
+            return False
+        return True
+
+    def _within_rate_limit(self, event):
+        rate = self.rate_limits.get(event, self.rate_limit)
+        if rate <= 0:
+            return True
+        with self._lock:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = _TokenBucket(rate)
+            return bucket.take()
+
+    def _ensure_writer(self):
+        # A forked worker (gunicorn) inherits the object but not the thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+                self._thread.start()
+
+    # --- Writer side -------------------------------------------------------
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=LOG_SUPPRESSED_REPORT_SECONDS)
+            except queue.Empty:
+                record = None
+            try:
+                if record is not None:
+                    self._write(record)
+                self._report_suppressed()
+            except Exception:
+                pass  # Never let a bad record kill the writer
+            finally:
+                if record is not None:
+                    self._queue.task_done()
+
+    def _write(self, record):
+        timestamp, level, event, fields = record
+        log_data = {
+            "timestamp": timestamp.isoformat(),
+            "app": self.app_name,
+            "event": event,
+            "level": level,
+        }
+        for key, value in fields.items():
+            log_data[key] = cap_field(value, self.max_field_chars)
+        getattr(self.logger, level, self.logger.info)(json.dumps(log_data, default=str))
+
+    def _report_suppressed(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < LOG_SUPPRESSED_REPORT_SECONDS:
+            return
+        with self._lock:
+            suppressed, self._suppressed = dict(self._suppressed), defaultdict(int)
+            self._last_report = now
+        if suppressed:
+            self._write((datetime.utcnow(), "warning", "log_suppressed", {"events": suppressed}))
+
+    def flush(self, timeout=5.0):
+        """Wait until everything enqueued so far has been written"""
+        if not self.async_mode or self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "sampled_out": self.sampled_out,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+        }
+
+    def close(self):
+        self.flush()
+        self._report_suppressed(force=True)
@@ -160,7 +160,6 @@ def generate():
 
             display_data = {
                 "title": result.get("title", "Generated Album"), "image_file": img_filename,
-                "image_data_base64": result.get("image_data_base64", ""),
                 "genres": ", ".join(result.get("genres", [])), "mood": result.get("mood", ""),
                 "playlist_name": result.get("item_name", "Your Music"),
                 "found_genres": bool(result.get("genres", [])),
@@ -6,6 +6,7 @@ import math
 from functools import lru_cache
 import json
 from extensions import db
+from pattern_matcher import MultiPatternMatcher
 import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -258,6 +259,14 @@ class GenreAnalysis:
         "minimal": ["ambient", "drone", "meditation", "sleep"]
     }
     
+    # Emotional depth indicators
+    DEPTH_INDICATORS = {
+        "profound": ["classical", "opera", "symphony", "chamber", "art", "avant-garde"],
+        "deep": ["progressive", "post", "experimental", "jazz", "blues", "soul"],
+        "neutral": ["pop", "rock", "indie", "alternative"],
+        "surface": ["commercial", "mainstream", "top 40", "radio"]
+    }
+    
     @classmethod
     def from_genre_list(cls, genres: List[str]):
         """Create enhanced GenreAnalysis with human-like intelligence"""
@@ -332,29 +341,10 @@ class GenreAnalysis:
             genre_weight = math.log(count + 1)  # Logarithmic weighting for frequency
             total_weight += genre_weight
             
-            # Score each mood profile
-            for mood_name, profile in cls.MOOD_PROFILES.items():
-                score = 0
-                
-                # Direct keyword matching with fuzzy logic
-                for keyword in profile["keywords"]:
-                    if keyword in genre:
-                        score += 1.0
-                    elif cls._fuzzy_match(keyword, genre):
-                        score += 0.7
-                
-                # Emotional markers boost
-                for marker in profile["emotional_markers"]:
-                    if marker in genre:
-                        score += 0.5
-                
-                # Antonym penalty - reduces score if conflicting moods present
-                for antonym in profile["antonyms"]:
-                    if antonym in genre:
-                        score -= 0.3
-                
+            # Raw per-profile scores come from one matcher pass over the genre
+            for mood_name, score in cls._genre_signals(genre)["mood"].items():
                 # Apply energy weighting
-                energy_factor = profile["energy_weight"]
+                energy_factor = cls.MOOD_PROFILES[mood_name]["energy_weight"]
                 weighted_score = score * energy_factor * genre_weight
                 mood_scores[mood_name] += weighted_score
         
@@ -380,13 +370,113 @@ class GenreAnalysis:
             return keyword in genre or genre in keyword
         
         # Simple Jaccard similarity for longer strings
-        set1 = set(keyword)
-        set2 = set(genre)
+        set1 = cls._char_set(keyword)
+        set2 = cls._char_set(genre)
+        # Jaccard is at most min/max of the set sizes, so lopsided pairs can't match
+        if min(len(set1), len(set2)) < threshold * max(len(set1), len(set2)):
+            return False
         intersection = len(set1 & set2)
         union = len(set1 | set2)
         
         return intersection / union >= threshold if union > 0 else False
     
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _char_set(text: str) -> frozenset:
+        """Cached character set for fuzzy matching"""
+        return frozenset(text)
+    
+    @classmethod
+    def _keyword_matcher(cls) -> MultiPatternMatcher:
+        """Single matcher over every mood, energy, cultural and depth keyword (built once)"""
+        matcher = cls.__dict__.get("_matcher")
+        if matcher is None:
+            keywords = set()
+            for profile in cls.MOOD_PROFILES.values():
+                keywords.update(profile["keywords"], profile["emotional_markers"], profile["antonyms"])
+            for table in (cls.ENERGY_INDICATORS, cls.CULTURAL_CONTEXTS, cls.DEPTH_INDICATORS):
+                for indicators in table.values():
+                    keywords.update(indicators)
+            matcher = MultiPatternMatcher(keywords)
+            cls._matcher = matcher
+        return matcher
+    
+    @classmethod
+    def _fuzzy_keyword_hits(cls, genre: str, found: set, threshold: float = 0.7) -> set:
+        """Mood keywords that _fuzzy_match the genre without occurring in it, in one pass"""
+        keyword_chars = cls.__dict__.get("_mood_keyword_chars")
+        if keyword_chars is None:
+            keywords = {k for profile in cls.MOOD_PROFILES.values() for k in profile["keywords"]}
+            keyword_chars = cls._mood_keyword_chars = [(k, frozenset(k)) for k in sorted(keywords)]
+        
+        genre_chars = frozenset(genre)
+        genre_size = len(genre_chars)
+        short_genre = len(genre) <= 3
+        hits = set()
+        for keyword, chars in keyword_chars:
+            if keyword in found:
+                continue
+            if short_genre or len(keyword) <= 3:
+                if genre in keyword:
+                    hits.add(keyword)
+                continue
+            size = len(chars)
+            if min(size, genre_size) < threshold * max(size, genre_size):
+                continue
+            if len(chars & genre_chars) / len(chars | genre_chars) >= threshold:
+                hits.add(keyword)
+        return hits
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _genre_signals(genre: str) -> Dict:
+        """
+        Every keyword-derived signal for one normalized genre, from a single
+        matcher pass: raw mood profile scores, energy and depth indicator
+        counts, and cultural contexts. Cached because genres repeat heavily
+        across playlists.
+        """
+        cls = GenreAnalysis
+        found = cls._keyword_matcher().find_all(genre)
+        fuzzy = cls._fuzzy_keyword_hits(genre, found)
+        
+        mood = {}
+        for mood_name, profile in cls.MOOD_PROFILES.items():
+            score = 0
+            
+            # Direct keyword matching with fuzzy logic
+            for keyword in profile["keywords"]:
+                if keyword in found:
+                    score += 1.0
+                elif keyword in fuzzy:
+                    score += 0.7
+            
+            # Emotional markers boost
+            for marker in profile["emotional_markers"]:
+                if marker in found:
+                    score += 0.5
+            
+            # Antonym penalty - reduces score if conflicting moods present
+            for antonym in profile["antonyms"]:
+                if antonym in found:
+                    score -= 0.3
+            
+            mood[mood_name] = score
+        
+        def counts(table):
+            return {
+                level: hits for level, indicators in table.items()
+                if (hits := sum(1 for indicator in indicators if indicator in found))
+            }
+        
+        return {
+            "mood": mood,
+            "energy": counts(cls.ENERGY_INDICATORS),
+            "depth": counts(cls.DEPTH_INDICATORS),
+            "cultural": [context for context, indicators in cls.CULTURAL_CONTEXTS.items()
+                         if any(indicator in found for indicator in indicators)]
+        }
+    
     @classmethod
     def _resolve_mood_conflicts(cls, mood_scores: Dict[str, float], genres: List[str]) -> Tuple[str, float]:
         """Intelligently resolve conflicting moods with human-like reasoning"""
@@ -432,10 +522,8 @@ class GenreAnalysis:
         energy_scores = defaultdict(int)
         
         for genre in genres:
-            for energy_level, indicators in cls.ENERGY_INDICATORS.items():
-                for indicator in indicators:
-                    if indicator in genre:
-                        energy_scores[energy_level] += 1
+            for energy_level, hits in cls._genre_signals(genre)["energy"].items():
+                energy_scores[energy_level] += hits
         
         if not energy_scores:
             return "medium"
@@ -464,29 +552,18 @@ class GenreAnalysis:
         contexts = set()
         
         for genre in genres:
-            for context, indicators in cls.CULTURAL_CONTEXTS.items():
-                if any(indicator in genre for indicator in indicators):
-                    contexts.add(context)
+            contexts.update(cls._genre_signals(genre)["cultural"])
         
         return sorted(list(contexts))
     
     @classmethod
     def _assess_emotional_depth(cls, genres: List[str], genre_counter: Counter) -> str:
         """Assess the emotional complexity and depth"""
-        depth_indicators = {
-            "profound": ["classical", "opera", "symphony", "chamber", "art", "avant-garde"],
-            "deep": ["progressive", "post", "experimental", "jazz", "blues", "soul"],
-            "neutral": ["pop", "rock", "indie", "alternative"],
-            "surface": ["commercial", "mainstream", "top 40", "radio"]
-        }
-        
         depth_scores = defaultdict(int)
         
         for genre in genres:
-            for depth_level, indicators in depth_indicators.items():
-                for indicator in indicators:
-                    if indicator in genre:
-                        depth_scores[depth_level] += 1
+            for depth_level, hits in cls._genre_signals(genre)["depth"].items():
+                depth_scores[depth_level] += hits
         
         if not depth_scores:
             return "neutral"
@@ -586,30 +663,39 @@ class GenreAnalysis:
         
         return list(set(style_elements))
     
+    # Keywords behind the mood from_genre_list picks; on a tie the earlier mood wins
+    MOOD_KEYWORDS = {
+        "euphoric": ["edm", "dance", "house", "electronic", "pop", "party"],
+        "energetic": ["rock", "metal", "punk", "trap", "dubstep"],
+        "peaceful": ["ambient", "classical", "chill", "lo-fi", "instrumental"],
+        "melancholic": ["sad", "slow", "ballad", "emotional", "soul", "blues"],
+        "upbeat": ["happy", "funk", "disco", "pop", "tropical"],
+        "relaxed": ["acoustic", "folk", "indie", "soft", "ambient"]
+    }
+    
+    @classmethod
+    def _mood_matcher(cls) -> MultiPatternMatcher:
+        """Matcher over the MOOD_KEYWORDS (built once)"""
+        matcher = cls.__dict__.get("_mood_keyword_matcher")
+        if matcher is None:
+            matcher = MultiPatternMatcher(k for keywords in cls.MOOD_KEYWORDS.values() for k in keywords)
+            cls._mood_keyword_matcher = matcher
+        return matcher
+    
     @staticmethod
-    @lru_cache(maxsize=100)
-    def _calculate_mood(genres_tuple):
-        """Cached mood calculation for identical genre combinations"""
-        genres = list(genres_tuple)
-        
-        # Simple genre-based mood classification
-        mood_keywords = {
-            "euphoric": ["edm", "dance", "house", "electronic", "pop", "party"],
-            "energetic": ["rock", "metal", "punk", "trap", "dubstep"],
-            "peaceful": ["ambient", "classical", "chill", "lo-fi", "instrumental"],
-            "melancholic": ["sad", "slow", "ballad", "emotional", "soul", "blues"],
-            "upbeat": ["happy", "funk", "disco", "pop", "tropical"],
-            "relaxed": ["acoustic", "folk", "indie", "soft", "ambient"]
-        }
-        
-        # Count genre matches for each mood (optimized single pass)
-        mood_scores = {mood: 0 for mood in mood_keywords}
-        genres_lower = [genre.lower() for genre in genres]
-        
-        for genre_lower in genres_lower:
-            for mood_name, keywords in mood_keywords.items():
-                if any(keyword in genre_lower for keyword in keywords):
-                    mood_scores[mood_name] += 1
+    @lru_cache(maxsize=4096)
+    def _genre_moods(genre_lower: str) -> Tuple[str, ...]:
+        """Moods with a keyword in one lowercased genre, from a single matcher pass"""
+        found = GenreAnalysis._mood_matcher().find_all(genre_lower)
+        return tuple(mood for mood, keywords in GenreAnalysis.MOOD_KEYWORDS.items() if not found.isdisjoint(keywords))
+    
+    @classmethod
+    def _calculate_mood(cls, genre_counter: Counter) -> str:
+        """Mood matched by the most genres, scoring each distinct genre once"""
+        mood_scores = dict.fromkeys(cls.MOOD_KEYWORDS, 0)
+        for genre, count in genre_counter.items():
+            for mood_name in cls._genre_moods(genre.lower()):
+                mood_scores[mood_name] += count
         
         # Pick highest scoring mood if we have matches
         if any(mood_scores.values()):
@@ -628,15 +714,11 @@ class GenreAnalysis:
         top_genres = [genre for genre, _ in genre_counter.most_common(10)]
         genres_with_counts = genre_counter.most_common(20)
         
-        # Optimized mood calculation with caching
-        genres_tuple = tuple(sorted(genres))  # Sort for consistent caching
-        mood = cls._calculate_mood(genres_tuple)
-        
         return cls(
             top_genres=top_genres,
             all_genres=genres,
             genres_with_counts=genres_with_counts,
-            mood=mood
+            mood=cls._calculate_mood(genre_counter)
         )
     
     def get_style_elements(self):
@@ -3,18 +3,18 @@ import time
 import logging
 import functools
 import traceback
-import psutil
 import requests
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 import json
+import atexit
 from flask import request, g, current_app
 from dataclasses import dataclass, asdict
 import threading
-from collections import deque, defaultdict
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import defaultdict
+from latency_histogram import LatencyRegistry
+from log_pipeline import LogPipeline
 
 # Configure structured logging for Render
 class RenderCloudLogger:
@@ -23,6 +23,8 @@ class RenderCloudLogger:
     
     Design choices:
     - JSON formatted logs for easy parsing by Render's log aggregation
+    - Formatting and writing happen on a background thread (see log_pipeline.py),
+      with per-event sampling and rate limits
     - Structured fields for better searchability
     - Performance metrics integrated into logs
     - Automatic error categorization
@@ -46,37 +48,25 @@ class RenderCloudLogger:
         console_handler.setFormatter(formatter)
         self.logger.addHandler(console_handler)
         
-        # Performance tracking
-        self.performance_metrics = deque(maxlen=1000)  # Keep last 1000 requests
+        # Callers only enqueue; a background thread serializes and writes
+        self.pipeline = LogPipeline(self.logger, app_name)
+        atexit.register(self.pipeline.close)
+        
+        # Performance tracking: per-endpoint, per-service and per-function latency
+        # histograms covering the last hour (see latency_histogram.py)
+        self.latency = LatencyRegistry(window=3600, slots=12)
         self.error_counts = defaultdict(int)
         self.start_time = datetime.utcnow()
         
     def log_structured(self, level: str, event: str, **kwargs):
-        """Log structured data with consistent format"""
-        log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "app": self.app_name,
-            "event": event,
-            "level": level,
-            **kwargs
-        }
-        
-        message = json.dumps(log_data, default=str)
-        getattr(self.logger, level.lower())(message)
+        """Log structured data with consistent format (sampled, rate limited and written asynchronously)"""
+        self.pipeline.emit(level, event, kwargs)
         
     def log_request(self, endpoint: str, method: str, status_code: int, 
                    duration_ms: float, user_id: Optional[str] = None, 
                    error: Optional[str] = None):
         """Log HTTP request with performance metrics"""
-        self.performance_metrics.append({
-            "timestamp": datetime.utcnow(),
-            "endpoint": endpoint,
-            "method": method,
-            "status_code": status_code,
-            "duration_ms": duration_ms,
-            "user_id": user_id,
-            "error": error
-        })
+        self.latency.observe("http_request", endpoint, duration_ms, error=bool(error))
         
         self.log_structured(
             "info" if status_code < 400 else "error",
@@ -109,6 +99,7 @@ class RenderCloudLogger:
                     duration_ms: float, error: Optional[str] = None, 
                     rate_limited: bool = False):
         """Log external API calls (Spotify, Gemini, Stable Diffusion)"""
+        self.latency.observe("external_api", service, duration_ms, error=not success)
         if not success:
             self.error_counts[f"{service}_api_error"] += 1
             
@@ -126,6 +117,7 @@ class RenderCloudLogger:
     def log_system_metrics(self):
         """Log system performance metrics"""
         try:
+            import psutil  # Only needed by the background monitor, not at startup
             cpu_percent = psutil.cpu_percent()
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
@@ -144,27 +136,43 @@ class RenderCloudLogger:
             
     def get_performance_summary(self) -> Dict[str, Any]:
         """Get performance summary for the last hour"""
-        if not self.performance_metrics:
-            return {}
-            
-        recent_metrics = [
-            m for m in self.performance_metrics 
-            if m["timestamp"] > datetime.utcnow() - timedelta(hours=1)
-        ]
-        
-        if not recent_metrics:
+        requests_summary = self.latency.summary("http_request")
+        overall = requests_summary["all"]
+        if not overall["count"]:
             return {}
             
-        durations = [m["duration_ms"] for m in recent_metrics]
-        errors = [m for m in recent_metrics if m.get("error")]
-        
         return {
-            "total_requests": len(recent_metrics),
-            "avg_response_time_ms": sum(durations) / len(durations),
-            "max_response_time_ms": max(durations),
-            "error_rate": len(errors) / len(recent_metrics) * 100,
+            "total_requests": overall["count"],
+            "avg_response_time_ms": overall["avg_ms"],
+            "max_response_time_ms": overall["max_ms"],
+            "p50_response_time_ms": overall["p50_ms"],
+            "p90_response_time_ms": overall["p90_ms"],
+            "p99_response_time_ms": overall["p99_ms"],
+            "error_rate": overall["error_rate"],
+            "endpoints": requests_summary["by_label"],
+            "external_services": self.latency.summary("external_api")["by_label"],
+            "functions": self.latency.summary("function")["by_label"],
             "uptime_hours": (datetime.utcnow() - self.start_time).total_seconds() / 3600
         }
+        
+    def prometheus_metrics(self) -> str:
+        """Latency histograms, error counters, circuit breakers and uptime in Prometheus text format"""
+        uptime = (datetime.utcnow() - self.start_time).total_seconds()
+        text = self.latency.prometheus_text(
+            prefix="spotify_cover",
+            label_names={"http_request": "endpoint", "external_api": "service", "function": "function",
+                         "outbound_http": "service"}
+        )
+        try:
+            from fault_handling import circuit_breaker_prometheus
+            text += circuit_breaker_prometheus(prefix="spotify_cover")
+        except Exception as e:
+            self.log_structured("warning", "circuit_breaker_metrics_unavailable", error=str(e))
+        return text + (
+            "# HELP spotify_cover_uptime_seconds Seconds since the process started\n"
+            "# TYPE spotify_cover_uptime_seconds gauge\n"
+            f"spotify_cover_uptime_seconds {uptime:.0f}\n"
+        )
 
 # Global logger instance
 app_logger = RenderCloudLogger()
@@ -187,11 +195,19 @@ class HealthChecker:
     - Timeout handling to prevent health checks from hanging
     - Detailed error reporting for faster debugging
     - Render-specific optimizations (checking external services that matter)
+    - Checks run concurrently, each bounded by a deadline, and results are cached
+      so /health probes are answered from memory instead of calling paid APIs
     """
     
-    def __init__(self):
+    def __init__(self, cache_seconds: Optional[float] = None, deadline_seconds: Optional[float] = None):
+        self.cache_seconds = cache_seconds if cache_seconds is not None else float(os.getenv('HEALTH_CHECK_CACHE_SECONDS', '60'))
+        self.deadline_seconds = deadline_seconds if deadline_seconds is not None else float(os.getenv('HEALTH_CHECK_DEADLINE_SECONDS', '5'))
         self.last_check_time = None
         self.last_results = {}
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-check")
+        self._in_flight = {}  # check name -> Future, so a hung check isn't started twice
+        self._refreshing = False
+        self._lock = threading.Lock()
         
     def check_database(self) -> HealthCheckResult:
         """Check PostgreSQL database connectivity"""
@@ -259,14 +275,9 @@ class HealthChecker:
                     error="API key not configured"
                 )
                 
-            headers = {"Content-Type": "application/json"}
-            data = {
-                "contents": [{"parts": [{"text": "test"}]}],
-                "generationConfig": {"maxOutputTokens": 5}
-            }
-            
-            url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
-            response = requests.post(url, headers=headers, json=data, timeout=10)
+            # Read the model's metadata rather than generating content, which is billed
+            model_url = GEMINI_API_URL.rsplit(":", 1)[0] if GEMINI_API_URL.endswith(":generateContent") else GEMINI_API_URL
+            response = requests.get(model_url, params={"key": GEMINI_API_KEY}, timeout=self.deadline_seconds)
             response_time = (time.time() - start_time) * 1000
             
             if response.status_code == 200:
@@ -309,7 +320,7 @@ class HealthChecker:
             response = requests.get(
                 "https://api.stability.ai/v1/user/account", 
                 headers=headers, 
-                timeout=10
+                timeout=self.deadline_seconds
             )
             response_time = (time.time() - start_time) * 1000
             
@@ -336,7 +347,7 @@ class HealthChecker:
             )
             
     def run_all_checks(self) -> Dict[str, HealthCheckResult]:
-        """Run all health checks and return results"""
+        """Run all health checks concurrently and return results (also refreshes the cache)"""
         checks = [
             self.check_database,
             self.check_spotify_api,
@@ -344,15 +355,34 @@ class HealthChecker:
             self.check_stability_api
         ]
         
+        started = time.time()
+        futures = {}
+        with self._lock:
+            for check in checks:
+                name = check.__name__.replace('check_', '')
+                future = self._in_flight.get(name)
+                if future is None or future.done():
+                    future = self._in_flight[name] = self._executor.submit(check)
+                futures[name] = future
+        wait(futures.values(), timeout=self.deadline_seconds)
+        
         results = {}
-        for check in checks:
+        for name, future in futures.items():
+            if not future.done():
+                results[name] = HealthCheckResult(
+                    service=name,
+                    healthy=False,
+                    response_time_ms=(time.time() - started) * 1000,
+                    error=f"No response within {self.deadline_seconds:g}s"
+                )
+                continue
             try:
-                result = check()
+                result = future.result()
                 results[result.service] = result
             except Exception as e:
                 # Fallback if health check itself fails
-                results[check.__name__.replace('check_', '')] = HealthCheckResult(
-                    service=check.__name__.replace('check_', ''),
+                results[name] = HealthCheckResult(
+                    service=name,
                     healthy=False,
                     response_time_ms=0,
                     error=f"Health check failed: {str(e)}"
@@ -361,6 +391,33 @@ class HealthChecker:
         self.last_check_time = datetime.utcnow()
         self.last_results = results
         return results
+        
+    def get_results(self) -> Dict[str, HealthCheckResult]:
+        """
+        Cached results for /health. Only the very first call waits for the checks;
+        after that stale results are returned immediately while one background
+        refresh runs.
+        """
+        if not self.last_results:
+            return self.run_all_checks()
+        
+        age = (datetime.utcnow() - self.last_check_time).total_seconds()
+        if age >= self.cache_seconds:
+            with self._lock:
+                start_refresh = not self._refreshing
+                self._refreshing = True
+            if start_refresh:
+                threading.Thread(target=self._background_refresh, name="health-refresh", daemon=True).start()
+        return self.last_results
+        
+    def _background_refresh(self):
+        try:
+            self.run_all_checks()
+        except Exception as e:
+            app_logger.log_structured("error", "health_check_refresh_failed", error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing = False
 
 # Global health checker
 health_checker = HealthChecker()
@@ -412,6 +469,10 @@ class AlertManager:
             return
             
         try:
+            import smtplib
+            from email.mime.text import MIMEText
+            from email.mime.multipart import MIMEMultipart
+
             msg = MIMEMultipart()
             msg['From'] = self.email_config['email_user']
             msg['To'] = ', '.join(self.email_config['alert_recipients'])
@@ -514,6 +575,7 @@ def monitor_performance(func):
         try:
             result = func(*args, **kwargs)
             duration_ms = (time.time() - start_time) * 1000
+            app_logger.latency.observe("function", function_name, duration_ms)
             
             app_logger.log_structured(
                 "info", 
@@ -537,6 +599,7 @@ def monitor_performance(func):
             
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
+            app_logger.latency.observe("function", function_name, duration_ms, error=True)
             error_details = {
                 "error": str(e),
                 "error_type": type(e).__name__,
@@ -699,6 +762,22 @@ class SystemMonitor:
 # Global system monitor
 system_monitor = SystemMonitor()
 
+def circuit_breaker_status() -> Dict[str, Any]:
+    """Per-breaker state and counters for the JSON metrics endpoints"""
+    try:
+        from fault_handling import circuit_breaker_metrics
+        return circuit_breaker_metrics()
+    except Exception as e:
+        return {"error": str(e)}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def wants_prometheus(req) -> bool:
+    """True for ?format=prometheus or a scraper that prefers text/plain over JSON"""
+    if req.args.get("format") == "prometheus":
+        return True
+    return req.accept_mimetypes.best_match(["application/json", "text/plain"]) == "text/plain"
+
 def setup_monitoring(app):
     """Set up monitoring for Flask app"""
     
@@ -720,8 +799,9 @@ def setup_monitoring(app):
             except:
                 pass
                 
+            # Unrouted paths (404 scans) share one label instead of one series each
             app_logger.log_request(
-                endpoint=request.endpoint or request.path,
+                endpoint=request.endpoint or "unmatched",
                 method=request.method,
                 status_code=response.status_code,
                 duration_ms=duration_ms,
@@ -754,9 +834,9 @@ def setup_monitoring(app):
     if not any(rule.endpoint == 'health_check' for rule in app.url_map.iter_rules()):
         @app.route('/health')
         def health_check():
-            """Health check endpoint for uptime monitoring"""
+            """Health check endpoint for uptime monitoring (served from the health check cache)"""
             try:
-                health_results = health_checker.run_all_checks()
+                health_results = health_checker.get_results()
                 all_healthy = all(result.healthy for result in health_results.values())
                 
                 response_data = {
@@ -764,6 +844,7 @@ def setup_monitoring(app):
                     "timestamp": datetime.utcnow().isoformat(),
                     "uptime_hours": (datetime.utcnow() - app_logger.start_time).total_seconds() / 3600,
                     "services": {name: asdict(result) for name, result in health_results.items()},
+                    "checked_at": health_checker.last_check_time.isoformat() if health_checker.last_check_time else None,
                     "performance": app_logger.get_performance_summary()
                 }
                 
@@ -777,11 +858,14 @@ def setup_monitoring(app):
     if not any(rule.endpoint == 'metrics_endpoint' for rule in app.url_map.iter_rules()):
         @app.route('/metrics')
         def metrics_endpoint():
-            """Detailed metrics endpoint"""
+            """Detailed metrics endpoint (Prometheus text with ?format=prometheus)"""
             try:
+                if wants_prometheus(request):
+                    return app.response_class(app_logger.prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
                 return {
                     "performance": app_logger.get_performance_summary(),
                     "error_counts": dict(app_logger.error_counts),
+                    "circuit_breakers": circuit_breaker_status(),
                     "uptime_hours": (datetime.utcnow() - app_logger.start_time).total_seconds() / 3600,
                     "last_health_check": health_checker.last_check_time.isoformat() if health_checker.last_check_time else None
                 }
@@ -0,0 +1,54 @@
+"""
+Aho-Corasick multi-pattern matcher.
+
+Built once from a fixed set of keywords, find_all(text) returns every keyword
+that occurs in text (the same answer as `{k for k in keywords if k in text}`)
+in a single left-to-right pass, however many keywords there are.
+"""
+from collections import deque
+
+
+class MultiPatternMatcher:
+    def __init__(self, patterns):
+        self.patterns = frozenset(p for p in patterns if p)
+        self._goto = [{}]     # state -> {char: next state}
+        self._fail = [0]      # state -> longest proper suffix state
+        self._output = [()]   # state -> patterns ending here (including via fail links)
+
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern,)
+
+        # Breadth-first so every fail target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Set of patterns that occur anywhere in text"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
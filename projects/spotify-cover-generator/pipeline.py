@@ -0,0 +1,76 @@
+"""
+Small stage-graph executor for the cover generation pipeline.
+
+Stages are plain functions that receive the results of the stages they depend
+on as keyword arguments. Every stage whose dependencies are done is started on
+a shared thread pool, so independent work (title-pool fetching and prompt
+building, chart rendering and image generation) overlaps and the end-to-end
+latency approaches the slowest chain instead of the sum of all stages.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class PipelineAbort(Exception):
+    """Raised by a stage to stop the pipeline with a user-facing error message"""
+
+
+class StagePipeline:
+    def __init__(self, name="pipeline", max_workers=4):
+        self.name = name
+        self.max_workers = max_workers
+        self.stages = {}  # name -> (func, deps), in insertion order
+        self.timings = {}  # name -> seconds spent inside the stage
+        self.total_time = 0.0
+
+    def add(self, name, func, deps=()):
+        """Register a stage; dependencies must already be registered, which keeps the graph acyclic"""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already registered")
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {', '.join(missing)}")
+        self.stages[name] = (func, tuple(deps))
+        return self
+
+    def _timed(self, name, func, kwargs):
+        started = time.perf_counter()
+        try:
+            return func(**kwargs)
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 4)
+
+    def run(self):
+        """
+        Run every stage and return {stage name: result}.
+        The first stage to raise cancels everything not yet started and its
+        exception is re-raised once running stages have finished.
+        """
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name) as pool:
+            try:
+                while pending or running:
+                    for name, (func, deps) in list(pending.items()):
+                        if all(dep in results for dep in deps):
+                            kwargs = {dep: results[dep] for dep in deps}
+                            running[pool.submit(self._timed, name, func, kwargs)] = name
+                            del pending[name]
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        results[name] = future.result()
+            finally:
+                for future in running:
+                    future.cancel()
+                self.total_time = round(time.perf_counter() - started, 4)
+
+        return results
+
+    def timing_report(self):
+        stages = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.timings.items())
+        return f"{self.name} finished in {self.total_time:.2f}s ({stages})"
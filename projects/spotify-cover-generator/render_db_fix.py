@@ -140,6 +140,32 @@ def migrate_database():
                     lora_url VARCHAR(1000),
                     user_id INTEGER
                 );
+                """,
+
+                """
+                CREATE TABLE IF NOT EXISTS spotify_artist_genres (
+                    artist_id VARCHAR(64) PRIMARY KEY,
+                    name VARCHAR(500),
+                    genres JSON,
+                    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """,
+
+                """
+                CREATE TABLE IF NOT EXISTS spotify_generation_reuse (
+                    key VARCHAR(64) PRIMARY KEY,
+                    generation_id INTEGER NOT NULL REFERENCES spotify_generation_results(id) ON DELETE CASCADE,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """,
+
+                """
+                CREATE TABLE IF NOT EXISTS spotify_daily_usage (
+                    user_id INTEGER NOT NULL REFERENCES spotify_users(id) ON DELETE CASCADE,
+                    day DATE NOT NULL,
+                    generations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, day)
+                );
                 """
             ]
             
@@ -148,9 +174,9 @@ def migrate_database():
                 try:
                     db.session.execute(text(sql))
                     db.session.commit()
-                    print(f"✅ Table {i}/5 created/verified")
+                    print(f"✅ Table {i}/{len(tables_sql)} created/verified")
                 except Exception as e:
-                    print(f"⚠️ Table {i}/5 warning: {e}")
+                    print(f"⚠️ Table {i}/{len(tables_sql)} warning: {e}")
                     db.session.rollback()
             
             # Add missing user_id column if needed
@@ -234,7 +260,8 @@ def migrate_database():
                 "CREATE INDEX IF NOT EXISTS idx_users_spotify_id ON spotify_users(spotify_id);",
                 "CREATE INDEX IF NOT EXISTS idx_sessions_token ON spotify_login_sessions(session_token);",
                 "CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON spotify_login_sessions(user_id);",
-                "CREATE INDEX IF NOT EXISTS idx_generations_user_id ON spotify_generation_results(user_id);"
+                "CREATE INDEX IF NOT EXISTS idx_generations_user_id ON spotify_generation_results(user_id);",
+                "CREATE INDEX IF NOT EXISTS idx_generation_results_user_timestamp ON spotify_generation_results(user_id, timestamp);"
             ]
             
             for sql in indexes:
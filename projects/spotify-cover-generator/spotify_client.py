@@ -2,13 +2,21 @@ import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
 from spotipy.exceptions import SpotifyException
 from collections import Counter
+from dataclasses import replace
 from models import PlaylistData, GenreAnalysis
-from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+from ttl_cache import TTLCache, MISSING
+from config import (
+    SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI, ARTIST_GENRE_CACHE_TTL_DAYS,
+    PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_PAGES, PLAYLIST_SAMPLING, PLAYLIST_MAX_ARTISTS, SPOTIFY_FETCH_WORKERS,
+    PLAYLIST_CACHE_TTL_HOURS, PLAYLIST_CACHE_SIZE
+)
 
 # Fault handling and retry imports
-from fault_handling import retry_with_exponential_backoff, GracefulDegradation
-from requests.exceptions import ConnectionError
+from fault_handling import retry_with_exponential_backoff, GracefulDegradation, get_circuit_breaker, CircuitOpenError
+from requests.exceptions import ConnectionError, Timeout
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from spotipy.oauth2 import SpotifyClientCredentials # Already imported above, but good to note its use for auth type checking
 
 # Monitoring imports with fallback
@@ -28,6 +36,13 @@ except ImportError:
 # Global Spotify client
 sp = None
 
+# Extracted PlaylistData: playlists by id as (snapshot_id, data), albums by id as data
+PLAYLIST_DATA_CACHE = TTLCache("playlist_data", max_entries=PLAYLIST_CACHE_SIZE, ttl=PLAYLIST_CACHE_TTL_HOURS * 3600)
+ALBUM_DATA_CACHE = TTLCache("album_data", max_entries=PLAYLIST_CACHE_SIZE, ttl=float("inf"))
+# snapshot_ids read in the last few seconds, so get_item_version followed by
+# extract_playlist_data costs a single snapshot request
+SNAPSHOT_CACHE = TTLCache("playlist_snapshots", max_entries=1024, ttl=30)
+
 def initialize_spotify(use_oauth=False):
     """Initialize Spotify API client"""
     global sp
@@ -79,9 +94,9 @@ def initialize_spotify(use_oauth=False):
 def get_user_premium_status(access_token):
     """Get user's premium status from Spotify API"""
     try:
-        import requests
+        from fault_handling import http_client
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get('https://api.spotify.com/v1/me', headers=headers)
+        response = http_client.get('https://api.spotify.com/v1/me', service_name="spotify_api", headers=headers)
         
         if response.status_code == 200:
             user_data = response.json()
@@ -115,6 +130,192 @@ def get_user_premium_status(access_token):
         print(f"❌ Error getting user premium status: {e}")
     return None
 
+def get_cached_artist_genres(artist_ids):
+    """Return {artist_id: genres} for artists with a fresh row in the artist genre cache"""
+    if not artist_ids:
+        return {}
+    try:
+        # Import here to avoid circular imports
+        from app import ArtistGenreCache, app
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ARTIST_GENRE_CACHE_TTL_DAYS)
+        cached = {}
+        with app.app_context():
+            rows = ArtistGenreCache.query.filter(ArtistGenreCache.artist_id.in_(list(artist_ids))).all()
+            for row in rows:
+                fetched_at = row.fetched_at
+                if fetched_at.tzinfo is None:
+                    fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+                if fetched_at > cutoff:
+                    cached[row.artist_id] = row.genres or []
+        return cached
+    except Exception as e:
+        print(f"⚠️ Artist genre cache lookup failed: {e}")
+        return {}
+
+def store_artist_genres(artists):
+    """Upsert fetched artist objects ({'id', 'name', 'genres'}) into the artist genre cache"""
+    artists = [artist for artist in artists if artist and artist.get('id')]
+    if not artists:
+        return
+    try:
+        from app import ArtistGenreCache, db, app
+
+        now_utc = datetime.now(timezone.utc)
+        with app.app_context():
+            for artist in artists:
+                db.session.merge(ArtistGenreCache(
+                    artist_id=artist['id'],
+                    name=(artist.get('name') or '')[:500],
+                    genres=artist.get('genres', []),
+                    fetched_at=now_utc
+                ))
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+    except Exception as e:
+        print(f"⚠️ Failed to store artist genres in cache: {e}")
+
+TRACK_FIELDS = "items(track(id,name,artists(id,name)))"
+
+def _spotify_call(method, *args, **kwargs):
+    """
+    Run one spotipy request through the spotify_api circuit breaker.
+    Connection errors, timeouts and 5xx answers count as failures; other
+    Spotify errors (404, 403, ...) mean the API itself is answering.
+    """
+    breaker = get_circuit_breaker("spotify")
+    probing = breaker.admit()
+    try:
+        result = method(*args, **kwargs)
+    except (ConnectionError, Timeout):
+        breaker.record_failure(probing)
+        raise
+    except SpotifyException as e:
+        if (e.http_status or 500) >= 500:
+            breaker.record_failure(probing)
+        else:
+            breaker.record_success(probing)
+        raise
+    except BaseException:
+        breaker.release(probing)
+        raise
+    breaker.record_success(probing)
+    return result
+
+def sample_page_offsets(total_tracks, page_size=PLAYLIST_PAGE_SIZE, max_pages=PLAYLIST_MAX_PAGES,
+                        strategy=PLAYLIST_SAMPLING):
+    """Offsets of the playlist pages to fetch, sampling when the playlist has more than max_pages pages"""
+    page_count = -(-total_tracks // page_size) if total_tracks > 0 else 0
+    if page_count <= max_pages or max_pages <= 0:
+        pages = list(range(page_count))
+    elif strategy == "head":
+        pages = list(range(max_pages))
+    else:
+        # Uniform: spread the sampled pages evenly from the first page to the last
+        step = (page_count - 1) / (max_pages - 1) if max_pages > 1 else 0
+        pages = sorted({round(i * step) for i in range(max_pages)})
+    return [page * page_size for page in pages]
+
+def _fetch_playlist_pages(item_id, first_page, workers):
+    """
+    Fetch every sampled page of a playlist concurrently.
+    Yields (offset, items) as pages arrive; the first page is already known.
+    """
+    total = first_page.get("total") or len(first_page.get("items", []))
+    offsets = sample_page_offsets(total)
+    yield 0, first_page.get("items", [])
+
+    @retry_with_exponential_backoff(max_retries=3, base_delay=2.0, exceptions=(ConnectionError, SpotifyException))
+    def _fetch_page(offset):
+        return _spotify_call(sp.playlist_tracks, item_id, fields=TRACK_FIELDS, market="US",
+                             limit=PLAYLIST_PAGE_SIZE, offset=offset)
+
+    remaining = [offset for offset in offsets if offset > 0]
+    if not remaining:
+        return
+    print(f"📄 Fetching {len(remaining)} more playlist pages ({total} tracks, {len(offsets)} pages sampled)")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch_page, offset): offset for offset in remaining}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], (future.result() or {}).get("items", [])
+            except Exception as e:
+                print(f"⚠️ Failed to fetch playlist page at offset {futures[future]}: {e}. Continuing without it.")
+
+def _collect_tracks(items, artist_counts):
+    """Count each track's artists into artist_counts; returns the page's track names"""
+    names = []
+    for item in items:
+        track = item.get("track") if item else None
+        if not track:
+            continue
+        if track.get("name"):
+            names.append(track["name"])
+        for artist in track.get("artists") or []:
+            if artist.get("id"):
+                artist_counts[artist["id"]] += 1
+    return names
+
+def parse_spotify_item(spotify_url):
+    """("playlist" or "album", item id) for a Spotify URL, or None"""
+    for kind in ("playlist", "album"):
+        marker = f"{kind}/"
+        if marker in (spotify_url or ""):
+            item_id = spotify_url.split(marker)[-1].split("?")[0].split("/")[0]
+            return (kind, item_id) if item_id else None
+    return None
+
+def get_item_version(spotify_url):
+    """
+    Version marker for the content behind a Spotify URL: "playlist:<id>:<snapshot_id>"
+    from one cheap fields=snapshot_id request, or "album:<id>" since albums never
+    change. None when the version can't be determined.
+    """
+    global sp
+    item = parse_spotify_item(spotify_url)
+    if not item:
+        return None
+    kind, item_id = item
+    if kind == "album":
+        return f"album:{item_id}"
+
+    if not sp and not initialize_spotify():
+        return None
+    snapshot_id = _current_snapshot(item_id)
+    return f"playlist:{item_id}:{snapshot_id}" if snapshot_id else None
+
+def _current_snapshot(item_id):
+    """The playlist's current snapshot_id via a fields=snapshot_id request, or None"""
+    snapshot_id = SNAPSHOT_CACHE.get(item_id)
+    if snapshot_id is not MISSING:
+        return snapshot_id
+    try:
+        snapshot_id = (_spotify_call(sp.playlist, item_id, fields="snapshot_id") or {}).get("snapshot_id")
+    except Exception as e:
+        print(f"⚠️ Could not read snapshot_id for playlist {item_id}: {e}")
+        return None
+    if snapshot_id:
+        SNAPSHOT_CACHE.set(item_id, snapshot_id)
+    return snapshot_id
+
+def _cached_extraction(kind, item_id):
+    """PlaylistData from an earlier extraction that is still current, or None"""
+    if kind == "album":
+        cached = ALBUM_DATA_CACHE.get(item_id)
+        return None if cached is MISSING else cached
+
+    entry = PLAYLIST_DATA_CACHE.get(item_id)
+    if entry is MISSING:
+        return None
+    snapshot_id, cached = entry
+    if _current_snapshot(item_id) != snapshot_id:
+        PLAYLIST_DATA_CACHE.pop(item_id)  # The playlist changed since we read it
+        return None
+    return cached
+
 @monitor_api_calls("spotify")
 @fault_tolerant_api_call("spotify")
 def extract_playlist_data(playlist_url):
@@ -131,9 +332,22 @@ def extract_playlist_data(playlist_url):
     if "playlist/" not in playlist_url and "album/" not in playlist_url:
         return {"error": "Invalid Spotify URL format. Please provide a valid Spotify playlist or album URL."}
     
+    # Unchanged playlists (same snapshot_id) and albums are served from the cache
+    item = parse_spotify_item(playlist_url)
+    cached = _cached_extraction(*item) if item else None
+    if cached is not None:
+        print(f"✓ Reusing extracted data for {item[0]} {item[1]} (unchanged)")
+        return replace(cached, spotify_url=playlist_url)
+    
     try:
         is_playlist = "playlist/" in playlist_url
         is_guest_session = isinstance(sp.auth_manager, SpotifyClientCredentials) if sp.auth_manager else False
+        # Fewer parallel requests for guest sessions to reduce request aggressiveness
+        workers = max(1, SPOTIFY_FETCH_WORKERS // 2 if is_guest_session else SPOTIFY_FETCH_WORKERS)
+        artist_counts = Counter()
+        track_names_by_offset = {}
+        track_count = 0
+        snapshot_id = None
 
         if is_playlist:
             # Extract playlist ID more robustly
@@ -145,22 +359,27 @@ def extract_playlist_data(playlist_url):
 
                 print(f"🎵 Processing playlist ID: {item_id}")
 
-                # Get playlist info
-                playlist_info = sp.playlist(item_id, fields="name,description,owner")
+                # Get playlist info together with the first page of tracks
+                playlist_info = _spotify_call(sp.playlist, item_id,
+                                              fields=f"name,description,owner,snapshot_id,tracks(total,{TRACK_FIELDS})")
                 item_name = playlist_info.get("name", "Unknown Playlist")
+                snapshot_id = playlist_info.get("snapshot_id")
+                if snapshot_id:
+                    SNAPSHOT_CACHE.set(item_id, snapshot_id)
 
                 print(f"✓ Found playlist: {item_name}")
 
-                # Get tracks to analyze genres
-                results = sp.playlist_tracks(
-                    item_id,
-                    fields="items(track(id,name,artists(id,name)))",
-                    market="US",
-                    limit=50
-                )
-                tracks = results.get("items", [])
+                first_page = playlist_info.get("tracks")
+                if not first_page:
+                    first_page = _spotify_call(sp.playlist_tracks, item_id, fields=f"total,{TRACK_FIELDS}", market="US",
+                                               limit=PLAYLIST_PAGE_SIZE)
 
-            except ConnectionError as e:
+                # Stream pages through artist dedup as they arrive
+                for offset, page_items in _fetch_playlist_pages(item_id, first_page, workers):
+                    track_names_by_offset[offset] = _collect_tracks(page_items, artist_counts)
+                    track_count += len(page_items)
+
+            except (ConnectionError, CircuitOpenError) as e:
                 return GracefulDegradation.handle_spotify_failure(playlist_url, e)
             except spotipy.exceptions.SpotifyException as e:
                 if e.http_status == 404:
@@ -183,15 +402,16 @@ def extract_playlist_data(playlist_url):
 
                 print(f"💿 Processing album ID: {item_id}")
 
-                album_info = sp.album(item_id)
+                album_info = _spotify_call(sp.album, item_id)
                 item_name = album_info.get("name", "Unknown Album")
 
                 print(f"✓ Found album: {item_name}")
 
                 album_tracks = album_info.get("tracks", {}).get("items", [])[:50]
-                tracks = [{"track": track} for track in album_tracks]
+                track_names_by_offset[0] = _collect_tracks([{"track": track} for track in album_tracks], artist_counts)
+                track_count = len(album_tracks)
 
-            except ConnectionError as e:
+            except (ConnectionError, CircuitOpenError) as e:
                 return GracefulDegradation.handle_spotify_failure(playlist_url, e)
             except spotipy.exceptions.SpotifyException as e:
                 if e.http_status == 404:
@@ -206,62 +426,55 @@ def extract_playlist_data(playlist_url):
             
         print(f"Found {'playlist' if is_playlist else 'album'}: {item_name}")
         
-        if not tracks:
+        if not track_count:
             return {"error": f"No tracks found in the {'playlist' if is_playlist else 'album'}. The {'playlist' if is_playlist else 'album'} may be empty."}
         
-        # Extract all artist IDs and info from tracks
-        artists = []
-        artist_ids = []
-        track_names = []
-        
-        for item in tracks:
-            track = item.get("track")
-            if track and track.get("name"):
-                track_names.append(track.get("name"))
-                
-            if track and track.get("artists"):
-                for artist in track.get("artists"):
-                    if artist.get("id"):
-                        artists.append(artist.get("id"))
-                        artist_ids.append(artist.get("id"))
+        track_names = [name for offset in sorted(track_names_by_offset) for name in track_names_by_offset[offset]]
         
-        if not artists:
+        if not artist_counts:
             return {"error": "No artists found in tracks. Unable to analyze genres."}
             
-        print(f"Found {len(set(artists))} unique artists in {len(tracks)} tracks")
+        print(f"Found {len(artist_counts)} unique artists in {track_count} tracks")
         
         # Get genres from artists with enhanced error handling
         genres = []
-        unique_artist_ids = list(set(artists))[:50]  # Limit to 50 artists max for API calls
+        # Keep the most frequent artists when a playlist has more than PLAYLIST_MAX_ARTISTS
+        unique_artist_ids = [artist_id for artist_id, _ in artist_counts.most_common(PLAYLIST_MAX_ARTISTS)]
+
+        # Artist genres almost never change, so serve what we can from the DB cache
+        cached_genres = get_cached_artist_genres(unique_artist_ids)
+        for artist_genres in cached_genres.values():
+            genres.extend(artist_genres)
+        missing_artist_ids = [artist_id for artist_id in unique_artist_ids if artist_id not in cached_genres]
+        print(f"Artist genre cache: {len(cached_genres)} hits, {len(missing_artist_ids)} to fetch")
 
         @retry_with_exponential_backoff(max_retries=3, base_delay=2.0, exceptions=(ConnectionError, SpotifyException))
         def _fetch_artist_genres_batch(artist_ids_batch):
-            return sp.artists(artist_ids_batch)
-
-        # Process artists in batches (Spotify API allows up to 50 per request)
-        for i in range(0, len(unique_artist_ids), 50):
-            batch = unique_artist_ids[i:min(i+50, len(unique_artist_ids))]
-            
-            try:
-                artist_info_batch = _fetch_artist_genres_batch(batch)
-                if artist_info_batch and 'artists' in artist_info_batch:
-                    for artist in artist_info_batch['artists']:
-                        if artist:  # Check if artist data is not None
-                            artist_genres = artist.get('genres', [])
-                            genres.extend(artist_genres)
-                            if artist_genres:
-                                print(f"  - {artist.get('name', 'Unknown')}: {', '.join(artist_genres[:3])}")
-                
-                if is_guest_session:
-                    time.sleep(0.5) # Reduce request aggressiveness for guest sessions
-
-            except (ConnectionError, spotipy.exceptions.SpotifyException) as e:
-                print(f"⚠️ Warning: Failed to fetch a batch of artist genres for batch {i//50 + 1} after retries: {e}. Proceeding with genres collected so far.")
-                # Optionally, add more specific logging or handling here
-                continue # Continue to the next batch
-            except Exception as e: # Catch any other unexpected errors during batch processing
-                print(f"⚠️ Unexpected error processing artist batch {i//50 + 1}: {e}. Proceeding with genres collected so far.")
-                continue
+            return _spotify_call(sp.artists, artist_ids_batch)
+
+        def _fetch_batch(batch):
+            artist_info_batch = _fetch_artist_genres_batch(batch)
+            if is_guest_session:
+                time.sleep(0.5) # Reduce request aggressiveness for guest sessions
+            return artist_info_batch
+
+        # Process cache misses in batches (Spotify API allows up to 50 per request)
+        batches = [missing_artist_ids[i:i+50] for i in range(0, len(missing_artist_ids), 50)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                futures = {pool.submit(_fetch_batch, batch): n for n, batch in enumerate(batches, 1)}
+                for future in as_completed(futures):
+                    try:
+                        artist_info_batch = future.result()
+                        if artist_info_batch and 'artists' in artist_info_batch:
+                            for artist in artist_info_batch['artists']:
+                                if artist:  # Check if artist data is not None
+                                    genres.extend(artist.get('genres', []))
+                            store_artist_genres(artist_info_batch['artists'])
+                    except (ConnectionError, spotipy.exceptions.SpotifyException) as e:
+                        print(f"⚠️ Warning: Failed to fetch a batch of artist genres for batch {futures[future]} after retries: {e}. Proceeding with genres collected so far.")
+                    except Exception as e: # Catch any other unexpected errors during batch processing
+                        print(f"⚠️ Unexpected error processing artist batch {futures[future]}: {e}. Proceeding with genres collected so far.")
         
         print(f"Total genres collected: {len(genres)}")
         if genres:
@@ -278,9 +491,15 @@ def extract_playlist_data(playlist_url):
             genre_analysis=genre_analysis,
             spotify_url=playlist_url,
             found_genres=bool(genres),
-            artist_ids=list(set(artist_ids))  # Store unique artist IDs
+            artist_ids=unique_artist_ids  # Unique artist IDs, most frequent first
         )
         
+        # Only complete extractions are cached; a playlist without a snapshot_id can't be validated
+        if not is_playlist:
+            ALBUM_DATA_CACHE.set(item_id, playlist_data)
+        elif snapshot_id:
+            PLAYLIST_DATA_CACHE.set(item_id, (snapshot_id, playlist_data))
+        
         return playlist_data  
         
     except spotipy.exceptions.SpotifyException as e:
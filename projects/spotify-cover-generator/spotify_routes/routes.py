@@ -3,7 +3,6 @@ from flask import current_app, redirect, url_for, render_template, flash, reques
 import secrets
 import datetime
 from datetime import timedelta
-import requests # For Spotify API calls
 import os # For os.path.exists, os.remove, os.path.getsize
 from werkzeug.utils import secure_filename # For file uploads
 from pathlib import Path # For path manipulations if needed
@@ -12,6 +11,7 @@ from ..extensions import db, limiter
 from ..models import User, LoraModelDB, SpotifyState, GenerationResultDB # Added GenerationResultDB
 from ..decorators import login_required
 from ..auth_utils import get_current_user # For routes that might not be @login_required but need user
+from ..fault_handling import http_client # Pooled client for Spotify accounts/API calls
 
 from . import bp
 from ..models import LoginSession
@@ -183,7 +183,7 @@ def spotify_callback():
             'grant_type': 'authorization_code', 'code': code, 'redirect_uri': spotify_redirect_uri,
             'client_id': spotify_client_id, 'client_secret': spotify_client_secret
         }
-        response = requests.post('https://accounts.spotify.com/api/token', data=token_data)
+        response = http_client.post('https://accounts.spotify.com/api/token', service_name="spotify_accounts", data=token_data)
         if response.status_code != 200:
             flash('Failed to retrieve Spotify access tokens.', 'error')
             current_app.logger.error(f"Spotify token exchange failed: {response.text}")
@@ -195,7 +195,7 @@ def spotify_callback():
         expires_in = tokens.get('expires_in', 3600)
 
         headers = {'Authorization': f'Bearer {access_token}'}
-        user_response = requests.get('https://api.spotify.com/v1/me', headers=headers)
+        user_response = http_client.get('https://api.spotify.com/v1/me', service_name="spotify_api", headers=headers)
         if user_response.status_code != 200:
             flash('Failed to retrieve Spotify user information.', 'error')
             return redirect(url_for('main.generate'))
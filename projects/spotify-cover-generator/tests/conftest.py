@@ -1,6 +1,16 @@
 import pytest
 import os
 import tempfile
+
+# Keep the generation job queue out of the project's data directory
+os.environ.setdefault('GENERATION_QUEUE_PATH', os.path.join(tempfile.mkdtemp(), 'generation_jobs.sqlite3'))
+# Circuit breaker state is shared through a SQLite file; keep it per test run
+os.environ.setdefault('CIRCUIT_BREAKER_STATE_PATH', os.path.join(tempfile.mkdtemp(), 'circuit_breakers.sqlite3'))
+# Guest quota windows are shared through a SQLite file too
+os.environ.setdefault('GUEST_LIMITER_PATH', os.path.join(tempfile.mkdtemp(), 'guest_quota.sqlite3'))
+# Tests create their own tables; skip the background schema check
+os.environ.setdefault('SCHEMA_CHECK_ON_START', '0')
+
 from app import app, db
 
 @pytest.fixture(scope='session')
@@ -22,4 +32,11 @@ def setup_test_environment(monkeypatch):
 def app_context():
     """Provide application context for tests"""
     with app.app_context():
-        yield app
\ No newline at end of file
+        yield app
+
+@pytest.fixture(autouse=True)
+def reset_guest_quota(monkeypatch):
+    """Each test starts with empty in-memory guest quota windows"""
+    import app as app_module
+    from guest_limiter import MemoryWindowStore
+    monkeypatch.setattr(app_module.guest_limiter, 'store', MemoryWindowStore())
@@ -1,3 +1,5 @@
+import time
+import threading
 import pytest
 from app import app, db
 from unittest.mock import patch
@@ -29,6 +31,7 @@ class TestAPIEndpoints:
         assert response.status_code == 200
         assert b'Spotify Music Cover Generator' in response.data
     
+    @patch('app.GENERATION_ASYNC', False)
     @patch('generator.generate_cover')
     def test_generate_post_success(self, mock_generate, client):
         """Test successful cover generation"""
@@ -39,7 +42,7 @@ class TestAPIEndpoints:
             "genres": ["rock", "pop"],
             "all_genres": ["rock", "pop", "indie"],
             "mood": "energetic",
-            "image_data_base64": "base64data"
+            "image_file": "test.png"
         }
         
         response = client.post('/generate', data={
@@ -58,4 +61,111 @@ class TestAPIEndpoints:
         })
         
         assert response.status_code == 200
-        assert b'error' in response.data.lower() or b'invalid' in response.data.lower()
\ No newline at end of file
+        assert b'error' in response.data.lower() or b'invalid' in response.data.lower()
+
+    @patch('generator.generate_cover')
+    def test_generate_post_enqueues_job(self, mock_generate, client):
+        """POST returns a job id and the result page renders once a worker finishes"""
+        mock_generate.return_value = {
+            "title": "Queued Album",
+            "output_path": "/path/to/queued.png",
+            "item_name": "Test Playlist",
+            "genres": ["rock"],
+            "all_genres": ["rock"],
+            "mood": "calm",
+            "image_file": "test.png"
+        }
+        
+        response = client.post('/generate', data={
+            'playlist_url': 'https://open.spotify.com/playlist/test123',
+            'mood': 'calm'
+        }, headers={'Accept': 'application/json'})
+        
+        assert response.status_code == 202
+        job = response.get_json()
+        
+        deadline = time.time() + 10
+        while job['status'] not in ('done', 'failed') and time.time() < deadline:
+            time.sleep(0.1)
+            job = client.get(job['status_url']).get_json()
+        
+        assert job['status'] == 'done'
+        result_page = client.get(job['result_url'])
+        assert b'Queued Album' in result_page.data
+
+    @patch('generator.generate_cover')
+    def test_guest_slot_is_reserved_at_enqueue_and_released_on_failure(self, mock_generate, client):
+        import hashlib
+        from app import guest_limiter
+        guest = hashlib.sha256(b"127.0.0.1").hexdigest()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_failure(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return {"error": "Playlist not found."}
+        mock_generate.side_effect = slow_failure
+
+        response = client.post('/generate', data={
+            'playlist_url': 'https://open.spotify.com/playlist/missing'
+        }, headers={'Accept': 'application/json'})
+        assert response.status_code == 202
+        assert started.wait(5)
+        assert guest_limiter.used(guest) == 1  # Counted while the job is still running
+        release.set()
+
+        job = response.get_json()
+        deadline = time.time() + 10
+        while job['status'] not in ('done', 'failed') and time.time() < deadline:
+            time.sleep(0.1)
+            job = client.get(job['status_url']).get_json()
+        assert job['status'] == 'failed'
+        assert guest_limiter.used(guest) == 0
+
+    @patch('generator.generate_cover')
+    def test_different_request_while_a_job_is_pending_is_rejected(self, mock_generate, client, monkeypatch):
+        from app import guest_limiter
+        monkeypatch.setattr(guest_limiter, 'limit', 5)  # Quota left, so the pending job decides
+        started, release = threading.Event(), threading.Event()
+
+        def slow(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return {"error": "Playlist not found."}
+        mock_generate.side_effect = slow
+
+        def post(url):
+            return client.post('/generate', data={'playlist_url': url}, headers={'Accept': 'application/json'})
+
+        first = post('https://open.spotify.com/playlist/first')
+        assert first.status_code == 202
+        assert started.wait(5)
+        try:
+            same = post('https://open.spotify.com/playlist/first')
+            other = post('https://open.spotify.com/playlist/second')
+        finally:
+            release.set()
+
+        assert same.status_code == 202
+        assert same.get_json()['job_id'] == first.get_json()['job_id']
+        assert other.status_code == 409
+        assert 'already running' in other.get_json()['error']
+
+        job = first.get_json()
+        deadline = time.time() + 10
+        while job['status'] not in ('done', 'failed') and time.time() < deadline:
+            time.sleep(0.1)
+            job = client.get(job['status_url']).get_json()
+
+    def test_metrics_prometheus_format(self, client):
+        """Test Prometheus text export of the latency histograms"""
+        client.get('/health')
+        response = client.get('/metrics?format=prometheus')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        text = response.get_data(as_text=True)
+        assert '# TYPE spotify_cover_http_request_duration_seconds histogram' in text
+        assert 'spotify_cover_uptime_seconds' in text
+        
+        summary = client.get('/metrics').get_json()['performance']
+        assert 'p99_response_time_ms' in summary
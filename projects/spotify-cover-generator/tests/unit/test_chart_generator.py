@@ -0,0 +1,36 @@
+import sys
+import base64
+
+import chart_generator
+
+
+def decode(data_uri):
+    return base64.b64decode(data_uri.split(",", 1)[1]).decode("utf-8")
+
+
+class TestGenreChart:
+    def setup_method(self):
+        chart_generator.CHART_CACHE.clear()
+
+    def test_svg_chart_has_one_bar_per_top_genre(self):
+        genres = ["rock"] * 3 + ["pop"] * 2 + ["r&b"] + [f"genre{i}" for i in range(10)]
+        chart = chart_generator.generate_genre_chart(genres)
+
+        assert chart.startswith("data:image/svg+xml;base64,")
+        svg = decode(chart)
+        assert svg.count('stroke="#444"/>') == chart_generator.TOP_GENRES
+        assert "r&amp;b" in svg
+
+    def test_charts_are_memoized_by_top_counts(self):
+        first = chart_generator.generate_genre_chart(["rock", "rock", "pop"])
+        second = chart_generator.generate_genre_chart(["pop", "rock", "rock"])
+        assert first is second
+        assert chart_generator.CHART_CACHE.stats()["hits"] == 1
+
+    def test_svg_path_does_not_import_matplotlib(self):
+        sys.modules.pop("matplotlib.pyplot", None)
+        chart_generator.generate_genre_chart(["jazz", "blues"])
+        assert "matplotlib.pyplot" not in sys.modules
+
+    def test_empty_genres_give_no_chart(self):
+        assert chart_generator.generate_genre_chart([]) is None
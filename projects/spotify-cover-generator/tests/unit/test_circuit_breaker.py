@@ -0,0 +1,172 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from spotipy.exceptions import SpotifyException
+
+import fault_handling
+import image_generator
+import spotify_client
+from fault_handling import CircuitBreaker, CircuitOpenError, MemoryCircuitStore, SQLiteCircuitStore
+
+
+def failing():
+    raise ConnectionError("service down")
+
+
+@pytest.fixture
+def shared_path(tmp_path):
+    return str(tmp_path / "breakers.sqlite3")
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_fails_fast(self):
+        breaker = CircuitBreaker("svc", failure_threshold=2, recovery_timeout=60, store=MemoryCircuitStore())
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                breaker.call(failing)
+
+        assert breaker.state == "open"
+        called = []
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: called.append(1))
+        assert not called
+        assert breaker.metrics()["rejections"] == 1
+        assert breaker.metrics()["opens"] == 1
+
+    def test_state_is_shared_between_workers(self, shared_path):
+        # Two stores on the same file stand in for two gunicorn workers
+        worker_a = CircuitBreaker("stability", failure_threshold=2, store=SQLiteCircuitStore(shared_path))
+        worker_b = CircuitBreaker("stability", failure_threshold=2, store=SQLiteCircuitStore(shared_path))
+
+        with pytest.raises(ConnectionError):
+            worker_a.call(failing)
+        with pytest.raises(ConnectionError):
+            worker_b.call(failing)
+
+        with pytest.raises(CircuitOpenError):
+            worker_a.call(lambda: "never")
+        assert worker_b.metrics()["failure_count"] == 2
+        assert worker_b.metrics()["opens"] == 1
+
+    def test_half_open_lets_a_single_probe_through(self, shared_path):
+        store = SQLiteCircuitStore(shared_path)
+        breaker = CircuitBreaker("spotify", failure_threshold=1, recovery_timeout=0.05, store=store)
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+        time.sleep(0.1)
+
+        release = threading.Event()
+        entered, outcomes = [], []
+
+        def probe():
+            entered.append(1)
+            release.wait(2)
+            return "ok"
+
+        def caller():
+            try:
+                outcomes.append(CircuitBreaker("spotify", failure_threshold=1, recovery_timeout=0.05,
+                                               store=SQLiteCircuitStore(shared_path)).call(probe))
+            except CircuitOpenError:
+                outcomes.append("rejected")
+
+        threads = [threading.Thread(target=caller) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(entered) == 1
+        assert sorted(outcomes) == ["ok"] + ["rejected"] * 4
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("gemini", failure_threshold=1, recovery_timeout=0.01, store=MemoryCircuitStore())
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+        time.sleep(0.02)
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "never")
+
+    def test_healthy_calls_do_not_write_shared_state(self):
+        store = MemoryCircuitStore()
+        breaker = CircuitBreaker("svc", failure_threshold=3, store=store)
+        with patch.object(store, "transition", wraps=store.transition) as transition:
+            for _ in range(5):
+                breaker.call(lambda: "ok")
+        transition.assert_not_called()
+        assert breaker.metrics()["calls"] == 5
+
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+        breaker.call(lambda: "ok")  # Clears the failure count, which does need a write
+        assert breaker.failure_count == 0
+
+
+class TestBreakersOnOutboundCalls:
+    @pytest.fixture
+    def breakers(self, monkeypatch):
+        fresh = {
+            "stability_api": CircuitBreaker("stability_api", failure_threshold=3, recovery_timeout=300,
+                                            store=MemoryCircuitStore()),
+            "spotify_api": CircuitBreaker("spotify_api", failure_threshold=3, recovery_timeout=120,
+                                          store=MemoryCircuitStore()),
+        }
+        for name, breaker in fresh.items():
+            monkeypatch.setitem(fault_handling.circuit_breakers, name, breaker)
+        return fresh
+
+    def test_stability_5xx_opens_the_breaker_and_later_generations_fail_fast(self, breakers, tmp_path, monkeypatch):
+        monkeypatch.setattr(image_generator, "STABILITY_API_KEY", "test-key")
+        monkeypatch.setattr(image_generator.time, "sleep", lambda seconds: None)
+        server_error = MagicMock(status_code=503, text="upstream unavailable")
+
+        with patch.object(fault_handling.http_client.session, "request", return_value=server_error) as request:
+            image_generator.generate_cover_image("lofi", output_path=str(tmp_path / "first.png"))
+            assert breakers["stability_api"].state == "open"
+            sent = request.call_count
+
+            image = image_generator.generate_cover_image("lofi", output_path=str(tmp_path / "second.png"))
+
+        assert request.call_count == sent  # Neither the main nor the backup endpoint was called
+        assert image is not None  # Still a placeholder for the user
+        # The first generation's backup request and both of the second's were refused
+        assert breakers["stability_api"].metrics()["rejections"] == 3
+
+    def test_spotify_5xx_opens_the_breaker(self, breakers, app_context):
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+        mock_sp.playlist.side_effect = SpotifyException(503, -1, "service unavailable")
+        url = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+        spotify_client.PLAYLIST_DATA_CACHE.clear()
+        spotify_client.SNAPSHOT_CACHE.clear()
+
+        with patch.object(spotify_client, "sp", mock_sp):
+            for _ in range(3):
+                spotify_client.extract_playlist_data(url)
+            assert breakers["spotify_api"].state == "open"
+            calls = mock_sp.playlist.call_count
+            fallback = spotify_client.extract_playlist_data(url)
+
+        assert mock_sp.playlist.call_count == calls
+        assert fallback.item_name.startswith("Spotify Playlist")
+
+    def test_spotify_not_found_is_not_a_failure(self, breakers, app_context):
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+        mock_sp.playlist.side_effect = SpotifyException(404, -1, "not found")
+        spotify_client.PLAYLIST_DATA_CACHE.clear()
+        spotify_client.SNAPSHOT_CACHE.clear()
+
+        with patch.object(spotify_client, "sp", mock_sp):
+            for _ in range(4):
+                result = spotify_client.extract_playlist_data("https://open.spotify.com/playlist/missing")
+        assert "not found" in result["error"]
+        assert breakers["spotify_api"].state == "closed"
@@ -0,0 +1,81 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+import cover_store
+
+
+@pytest.fixture
+def covers_dir(tmp_path):
+    with patch.object(cover_store, "store", cover_store.CoverStore(tmp_path)):
+        yield tmp_path
+
+
+def make_cover(path, color="red"):
+    Image.new("RGB", (1024, 1024), color).save(path)
+    return path
+
+
+class TestCoverStore:
+    def test_publish_renames_to_content_hash(self, covers_dir):
+        published = cover_store.publish_cover(make_cover(covers_dir / "My_Title.png"))
+        assert cover_store.is_content_addressed(published.name)
+        assert not (covers_dir / "My_Title.png").exists()
+
+        with Image.open(cover_store.cover_rendition(published.name, "thumb")) as thumb:
+            assert thumb.format == "WEBP" and thumb.size == (300, 300)
+        with Image.open(cover_store.cover_rendition(published.name, "display")) as display:
+            assert display.format == "WEBP" and display.size == (640, 640)
+        with Image.open(cover_store.cover_rendition(published.name, "spotify")) as jpeg:
+            assert jpeg.format == "JPEG" and jpeg.size == (640, 640)
+
+    def test_identical_covers_share_a_file(self, covers_dir):
+        first = cover_store.publish_cover(make_cover(covers_dir / "a.png"))
+        second = cover_store.publish_cover(make_cover(covers_dir / "b.png"))
+        assert first == second
+        assert sorted(p.name for p in covers_dir.glob("*.png")) == [first.name]
+
+    def test_served_with_immutable_cache_headers(self, covers_dir):
+        from app import app
+        published = cover_store.publish_cover(make_cover(covers_dir / "c.png", "blue"))
+
+        with app.test_client() as client:
+            response = client.get(f"/generated_covers/{published.name}?size=thumb")
+            assert response.status_code == 200
+            assert response.mimetype == "image/webp"
+            assert "immutable" in response.headers["Cache-Control"]
+            assert client.get(f"/generated_covers/{published.name}?size=huge").status_code == 404
+            assert client.get("/generated_covers/0123456789abcdef.png").status_code == 404
+
+    def test_least_recently_used_covers_are_evicted(self, covers_dir):
+        store = cover_store.store
+        old = store.publish(make_cover(covers_dir / "old.png", "green"))
+        store.max_bytes = store.total_bytes() + 1
+        new = store.publish(make_cover(covers_dir / "new.png", "yellow"))
+
+        assert new.exists() and not old.exists()
+        assert not store.rendition_path(old.stem, "thumb").exists()
+        assert store.stats()["covers"] == 1
+
+    def test_evicted_generations_lose_their_output_path(self, covers_dir):
+        import generator  # Registers forget_evicted_covers
+        from app import app, db, GenerationResultDB
+        store = cover_store.store
+        old = store.publish(make_cover(covers_dir / "old.png", "green"))
+        with app.app_context():
+            db.create_all()
+            db.session.add(GenerationResultDB(title="Old", output_path=str(old)))
+            db.session.commit()
+            store.max_bytes = store.total_bytes() + 1
+            store.publish(make_cover(covers_dir / "new.png", "yellow"))
+
+            assert GenerationResultDB.query.filter_by(title="Old").one().output_path == ""
+            GenerationResultDB.query.delete()
+            db.session.commit()
+
+    def test_spotify_upload_fits_size_limit(self, covers_dir):
+        published = cover_store.publish_cover(make_cover(covers_dir / "d.png", "purple"))
+        encoded = cover_store.store.spotify_upload_base64(published.name)
+        assert 0 < len(encoded) <= cover_store.SPOTIFY_UPLOAD_LIMIT
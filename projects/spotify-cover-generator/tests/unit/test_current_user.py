@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from app import app, db, User, LoginSession, get_current_user, SESSION_USER_CACHE
+
+
+@pytest.fixture
+def session_token():
+    with app.app_context():
+        db.create_all()
+        user = User(username="cache-user", email="cache@example.com")
+        db.session.add(user)
+        db.session.commit()
+        token = LoginSession.create_session(user.id)
+    SESSION_USER_CACHE.clear()
+    yield token
+    with app.app_context():
+        LoginSession.query.delete()
+        User.query.filter_by(username="cache-user").delete()
+        db.session.commit()
+
+
+def count_queries(func, token):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            with app.test_request_context("/", headers={"Cookie": f"session_token={token}"}):
+                result = func()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+    return result, statements
+
+
+class TestCurrentUser:
+    def test_user_is_resolved_once_per_request_and_token_is_cached(self, session_token):
+        def resolve_twice():
+            first = get_current_user()
+            assert get_current_user() is first
+            return first.username
+
+        username, first_queries = count_queries(resolve_twice, session_token)
+        assert username == "cache-user"
+        assert len(first_queries) == 2  # LoginSession by token, then the user
+
+        _, second_queries = count_queries(resolve_twice, session_token)
+        assert len(second_queries) == 1  # Token served from the cache: one user lookup
+
+    def test_logout_invalidates_cached_token(self, session_token):
+        with app.test_client() as client:
+            client.set_cookie("session_token", session_token)
+            with client.session_transaction() as flask_session:
+                flask_session["user_session"] = session_token
+            client.get("/")
+            assert SESSION_USER_CACHE.get(session_token) is not app_module.MISSING
+            client.get("/logout")
+        assert SESSION_USER_CACHE.get(session_token) is app_module.MISSING
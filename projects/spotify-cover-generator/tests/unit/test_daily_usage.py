@@ -0,0 +1,78 @@
+import datetime
+from datetime import timezone
+
+import pytest
+
+from app import db, User, GenerationResultDB, DailyGenerationUsage
+
+
+@pytest.fixture
+def user(app_context):
+    db.create_all()
+    user = User(username="quota-user", email="quota@example.com")
+    db.session.add(user)
+    db.session.commit()
+    yield user
+    DailyGenerationUsage.query.delete()
+    GenerationResultDB.query.filter_by(user_id=user.id).delete()
+    db.session.delete(user)
+    db.session.commit()
+
+
+def add_generation(user, **kwargs):
+    db.session.add(GenerationResultDB(title="T", output_path="/tmp/x.png", user_id=user.id, **kwargs))
+    db.session.commit()
+
+
+class TestDailyGenerationUsage:
+    def test_saving_a_generation_increments_the_counter(self, user):
+        add_generation(user)
+        add_generation(user)
+
+        today = datetime.datetime.now(timezone.utc).date()
+        assert db.session.get(DailyGenerationUsage, (user.id, today)).generations == 2
+        assert user.get_generations_today() == 2
+        assert not user.can_generate_today()  # Free users get two a day
+
+    def test_range_fallback_seeds_a_missing_counter(self, user):
+        now = datetime.datetime.now(timezone.utc).replace(tzinfo=None)
+        add_generation(user, timestamp=now)
+        add_generation(user, timestamp=now - datetime.timedelta(days=2))  # Not today
+        DailyGenerationUsage.query.delete()  # As if the rows predate the counters
+        db.session.commit()
+
+        assert user.get_generations_today() == 1
+        today = datetime.datetime.now(timezone.utc).date()
+        assert db.session.get(DailyGenerationUsage, (user.id, today)).generations == 1
+
+    def test_user_without_generations(self, user):
+        assert user.get_generations_today() == 0
+        assert user.can_generate_today()
+
+    def test_fallback_seed_does_not_commit_the_request_session(self, user):
+        add_generation(user)
+        DailyGenerationUsage.query.delete()
+        db.session.commit()
+
+        user.username = "renamed-mid-request"  # Unflushed work of the surrounding request
+        assert user.get_generations_today() == 1
+        db.session.rollback()
+
+        assert db.session.get(User, user.id).username == "quota-user"
+
+    def test_first_counted_generation_includes_earlier_rows(self, user):
+        add_generation(user)
+        DailyGenerationUsage.query.delete()  # Saved before the counters were deployed
+        db.session.commit()
+
+        add_generation(user)
+        today = datetime.datetime.now(timezone.utc).date()
+        assert db.session.get(DailyGenerationUsage, (user.id, today)).generations == 2
+
+    def test_deleting_a_generation_gives_the_usage_back(self, user):
+        add_generation(user)
+        add_generation(user)
+        db.session.delete(GenerationResultDB.query.filter_by(user_id=user.id).first())
+        db.session.commit()
+
+        assert user.get_generations_today() == 1
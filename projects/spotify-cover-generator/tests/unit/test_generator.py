@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+import cover_store
+import generator
+from models import GenreAnalysis, PlaylistData
+
+
+@pytest.fixture
+def env(tmp_path):
+    from app import app, db
+    playlist = PlaylistData(
+        item_name="Road Trip",
+        track_names=["Song"],
+        genre_analysis=GenreAnalysis.from_genre_list(["indie rock", "indie rock", "dream pop"]),
+        spotify_url="https://open.spotify.com/playlist/abc",
+        found_genres=True,
+    )
+
+    def fake_image(prompt, lora, path, negative_prompt, seed=None):
+        Image.new("RGB", (64, 64), (len(prompt) % 255, 10, 10)).save(path)
+        return True
+
+    with app.app_context():
+        db.create_all()
+        with patch.object(cover_store, "store", cover_store.CoverStore(tmp_path)), \
+             patch.object(generator, "COVERS_DIR", tmp_path), \
+             patch.object(generator, "get_item_version", return_value="playlist:abc:snap1"), \
+             patch.object(generator, "extract_playlist_data", return_value=playlist) as extract, \
+             patch.object(generator, "generate_title", return_value="Open Roads"), \
+             patch.object(generator, "create_prompt_from_data", side_effect=lambda data, mood: f"cover {mood}"), \
+             patch.object(generator, "generate_cover_image", side_effect=fake_image) as image:
+            yield extract, image
+        db.session.remove()
+        db.drop_all()
+
+
+class TestGenerationReuse:
+    def test_identical_request_reuses_stored_generation(self, env):
+        extract, image = env
+        first = generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", reuse=True)
+        second = generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", reuse=True)
+
+        assert "reused" not in first
+        assert second["reused"] is True
+        assert second["image_file"] == first["image_file"]
+        assert second["title"] == "Open Roads"
+        assert image.call_count == 1
+
+    def test_new_mood_generates_a_new_cover(self, env):
+        extract, image = env
+        generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", reuse=True)
+        result = generator.generate_cover("https://open.spotify.com/playlist/abc", "angry", reuse=True)
+
+        assert "reused" not in result
+        assert image.call_count == 2
+
+    def test_reuse_is_scoped_to_the_user(self, env):
+        extract, image = env
+        generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", user_id=1, reuse=True)
+        other = generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", user_id=2, reuse=True)
+        again = generator.generate_cover("https://open.spotify.com/playlist/abc", "calm", user_id=1, reuse=True)
+
+        assert "reused" not in other
+        assert again["reused"] is True
+        assert image.call_count == 2
+
+    def test_reuse_is_opt_in(self, env):
+        extract, image = env
+        generator.generate_cover("https://open.spotify.com/playlist/abc", "calm")
+        generator.generate_cover("https://open.spotify.com/playlist/abc", "calm")
+        assert image.call_count == 2
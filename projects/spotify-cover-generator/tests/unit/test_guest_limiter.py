@@ -0,0 +1,71 @@
+import threading
+
+from guest_limiter import GuestQuotaLimiter, MemoryWindowStore, SQLiteWindowStore
+
+
+class TestGuestQuotaLimiter:
+    def test_sliding_window(self):
+        limiter = GuestQuotaLimiter(limit=2, window_seconds=100, store=MemoryWindowStore())
+        limiter.record("ip", now=1000)
+        limiter.record("ip", now=1050)
+        assert not limiter.allowed("ip", now=1060)
+        assert limiter.allowed("ip", now=1101)  # The first generation slid out of the window
+        assert limiter.used("ip", now=1151) == 0
+
+    def test_database_is_read_once_per_ip(self):
+        loads = []
+        def loader(key):
+            loads.append(key)
+            return [990]
+        limiter = GuestQuotaLimiter(limit=1, window_seconds=100, loader=loader, store=MemoryWindowStore())
+
+        assert not limiter.allowed("ip", now=1000)
+        assert not limiter.allowed("ip", now=1010)
+        assert limiter.allowed("ip", now=1091)
+        assert loads == ["ip"]
+
+    def test_records_are_synced_in_the_background(self):
+        written = []
+        limiter = GuestQuotaLimiter(limit=1, window_seconds=100, persist=written.extend, store=MemoryWindowStore())
+        limiter.record("a", now=1000)
+        limiter.record("b", now=1001)
+        assert limiter.flush()
+        assert sorted(written) == [("a", 1000), ("b", 1001)]
+
+    def test_shared_store_across_workers(self, tmp_path):
+        path = tmp_path / "guest_windows.sqlite3"
+        worker_a = GuestQuotaLimiter(limit=1, window_seconds=100, store=SQLiteWindowStore(path))
+        worker_b = GuestQuotaLimiter(limit=1, window_seconds=100, store=SQLiteWindowStore(path))
+        worker_a.record("ip", now=1000)
+        assert not worker_b.allowed("ip", now=1010)
+        assert worker_b.allowed("other", now=1010)
+
+    def test_reserve_takes_a_slot_until_released(self):
+        written = []
+        limiter = GuestQuotaLimiter(limit=1, window_seconds=100, persist=written.extend, store=MemoryWindowStore())
+        slot = limiter.reserve("ip", now=1000)
+        assert slot == 1000
+        assert limiter.reserve("ip", now=1001) is None  # Still running: no second job
+        limiter.release("ip", slot)
+        assert limiter.allowed("ip", now=1002)
+
+        slot = limiter.reserve("ip", now=1003)
+        limiter.confirm("ip", slot)
+        assert limiter.flush()
+        assert written == [("ip", 1003)]
+        assert not limiter.allowed("ip", now=1004)
+
+    def test_concurrent_reservations_across_workers(self, tmp_path):
+        path = tmp_path / "guest_windows.sqlite3"
+        slots = []
+
+        def worker():
+            limiter = GuestQuotaLimiter(limit=2, window_seconds=100, store=SQLiteWindowStore(path))
+            slots.append(limiter.reserve("ip"))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len([slot for slot in slots if slot is not None]) == 2
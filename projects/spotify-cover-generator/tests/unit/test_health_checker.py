@@ -0,0 +1,53 @@
+import time
+
+from monitoring_system import HealthChecker, HealthCheckResult
+
+
+def slow_check(service, seconds, healthy=True):
+    def check():
+        time.sleep(seconds)
+        return HealthCheckResult(service=service, healthy=healthy, response_time_ms=seconds * 1000)
+    check.__name__ = f"check_{service}"
+    return check
+
+
+def make_checker(delays, **kwargs):
+    checker = HealthChecker(**kwargs)
+    checker.check_database = slow_check("database", delays[0])
+    checker.check_spotify_api = slow_check("spotify_api", delays[1])
+    checker.check_gemini_api = slow_check("gemini_api", delays[2])
+    checker.check_stability_api = slow_check("stability_api", delays[3])
+    return checker
+
+
+class TestHealthChecker:
+    def test_checks_run_concurrently(self):
+        checker = make_checker([0.2, 0.2, 0.2, 0.2], deadline_seconds=2)
+        started = time.time()
+        results = checker.run_all_checks()
+        assert time.time() - started < 0.6
+        assert all(result.healthy for result in results.values())
+
+    def test_slow_check_is_reported_at_the_deadline(self):
+        checker = make_checker([0, 0, 0, 2], deadline_seconds=0.2)
+        started = time.time()
+        results = checker.run_all_checks()
+        assert time.time() - started < 1
+        assert results["database"].healthy
+        assert not results["stability_api"].healthy
+        assert "0.2s" in results["stability_api"].error
+
+    def test_results_are_cached(self):
+        checker = make_checker([0, 0, 0, 0], cache_seconds=60, deadline_seconds=1)
+        calls = []
+        original = checker.check_gemini_api
+        def counting():
+            calls.append(1)
+            return original()
+        counting.__name__ = "check_gemini_api"
+        checker.check_gemini_api = counting
+
+        first = checker.get_results()
+        second = checker.get_results()
+        assert second is first
+        assert len(calls) == 1
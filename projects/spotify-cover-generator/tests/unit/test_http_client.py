@@ -0,0 +1,30 @@
+from unittest.mock import MagicMock, patch
+
+from fault_handling import RobustHTTPClient
+from monitoring_system import app_logger
+
+
+class TestRobustHTTPClient:
+    def test_one_pooled_adapter_per_service_host(self):
+        client = RobustHTTPClient(pool_maxsize=4)
+        stability = client.session.get_adapter("https://api.stability.ai/v2beta/stable-image/generate/core")
+        gemini = client.session.get_adapter("https://generativelanguage.googleapis.com/v1/models/x:generateContent")
+        other = client.session.get_adapter("https://example.com/")
+
+        assert len({id(stability), id(gemini), id(other)}) == 3
+        assert stability._pool_maxsize == 4
+        # Paid generations are only retried when the connection itself failed
+        assert stability.max_retries.status == 0 and stability.max_retries.read == 0
+        assert 500 in gemini.max_retries.status_forcelist
+
+    def test_service_timeout_and_latency_metrics(self):
+        client = RobustHTTPClient()
+        response = MagicMock(status_code=200)
+        before = app_logger.latency.summary("outbound_http")["by_label"].get("gemini", {}).get("count", 0)
+
+        with patch.object(client.session, "request", return_value=response) as request:
+            assert client.post("https://generativelanguage.googleapis.com/v1/models/x", service_name="gemini") is response
+
+        assert request.call_args.kwargs["timeout"] == (10, 30)
+        after = app_logger.latency.summary("outbound_http")["by_label"]["gemini"]["count"]
+        assert after == before + 1
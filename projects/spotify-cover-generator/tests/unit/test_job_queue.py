@@ -0,0 +1,84 @@
+import os
+import time
+
+from job_queue import JobQueue
+
+
+def make_queue(temp_dir, name):
+    return JobQueue(path=os.path.join(temp_dir, f"{name}.sqlite3"), workers=1)
+
+
+class TestJobQueue:
+    def test_job_runs_and_stores_result(self, temp_dir):
+        queue = make_queue(temp_dir, "runs")
+        queue.register("cover", lambda payload: {"title": payload["url"].upper()})
+        job_id = queue.enqueue("cover", {"url": "abc"}, owner="user:1")
+
+        deadline = time.time() + 5
+        while queue.get(job_id)["status"] not in ("done", "failed") and time.time() < deadline:
+            time.sleep(0.05)
+        queue.stop_workers()
+
+        job = queue.get(job_id)
+        assert job["status"] == "done"
+        assert job["result"] == {"title": "ABC"}
+        assert queue.active_for("user:1") is None
+
+    def test_error_result_marks_job_failed(self, temp_dir):
+        queue = make_queue(temp_dir, "fails")
+        queue.register("cover", lambda payload: {"error": "Playlist not found"})
+        queue._connect().execute(
+            "INSERT INTO jobs (id, kind, owner, status, payload, created_at) VALUES ('j1', 'cover', 'o', 'queued', '{}', 0)")
+
+        assert queue.run_next() is True
+        job = queue.get("j1")
+        assert job["status"] == "failed"
+        assert job["error"] == "Playlist not found"
+        assert queue.run_next() is False
+
+    def test_claim_is_exclusive(self, temp_dir):
+        queue = make_queue(temp_dir, "claim")
+        other = JobQueue(path=queue.path, workers=1)
+        queue._connect().execute(
+            "INSERT INTO jobs (id, kind, owner, status, payload, created_at) VALUES ('j1', 'cover', 'o', 'queued', '{}', 0)")
+
+        assert queue.claim()["id"] == "j1"
+        assert other.claim() is None
+        assert queue.active_for("o") == "j1"
+
+    def test_only_expired_leases_are_requeued(self, temp_dir):
+        queue = make_queue(temp_dir, "lease")
+        now = time.time()
+        conn = queue._connect()
+        # Running for an hour with a fresh lease vs. a worker that stopped renewing
+        conn.execute("INSERT INTO jobs (id, kind, owner, status, payload, attempts, created_at, started_at, lease_until) "
+                     "VALUES ('alive', 'cover', 'a', 'running', '{}', 1, 0, ?, ?)", (now - 3600, now + 30))
+        conn.execute("INSERT INTO jobs (id, kind, owner, status, payload, attempts, created_at, started_at, lease_until) "
+                     "VALUES ('dead', 'cover', 'b', 'running', '{}', 1, 0, ?, ?)", (now - 120, now - 5))
+
+        queue.recover_stale()
+        assert queue.get("alive")["status"] == "running"
+        assert queue.get("dead")["status"] == "queued"
+
+    def test_worker_keeps_its_lease_and_a_lost_lease_cannot_finish(self, temp_dir, monkeypatch):
+        import job_queue
+        monkeypatch.setattr(job_queue, "JOB_HEARTBEAT_INTERVAL", 0.05)
+        queue = make_queue(temp_dir, "heartbeat")
+        leases = []
+
+        def slow(payload):
+            for _ in range(3):
+                time.sleep(0.1)
+                leases.append(queue.get("j1")["lease_until"])
+            return {"ok": True}
+
+        queue.register("cover", slow)
+        queue._connect().execute(
+            "INSERT INTO jobs (id, kind, owner, status, payload, created_at) VALUES ('j1', 'cover', 'o', 'queued', '{}', 0)")
+        queue.run_next()
+        assert leases == sorted(leases) and leases[0] < leases[-1]
+        assert queue.get("j1")["status"] == "done"
+
+        assert queue.renew_lease("j1", attempt=1) is False
+        queue.finish("j1", error="late worker", attempt=0)  # An earlier attempt that lost its lease
+        assert queue.get("j1")["status"] == "done"
@@ -0,0 +1,61 @@
+from latency_histogram import LatencyHistogram, WindowedHistogram, LatencyRegistry, OVERFLOW_LABEL
+
+
+class TestLatencyHistogram:
+    def test_percentiles_stay_within_bucket_width(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.observe(ms)
+
+        assert histogram.count == 1000
+        assert 400 <= histogram.percentile(50) <= 600
+        assert 850 <= histogram.percentile(90) <= 1000
+        assert 950 <= histogram.percentile(99) <= 1000
+        assert histogram.percentile(100) == 1000
+
+    def test_summary_reports_error_rate(self):
+        histogram = LatencyHistogram()
+        histogram.observe(20)
+        histogram.observe(30, error=True)
+        summary = histogram.summary()
+        assert summary["error_rate"] == 50
+        assert summary["max_ms"] == 30
+        assert LatencyHistogram().summary() == {"count": 0}
+
+    def test_window_drops_old_slots(self):
+        windowed = WindowedHistogram(window=60, slots=6)
+        windowed.observe(100, now=1000)
+        windowed.observe(200, now=1055)
+        assert windowed.recent(now=1055).count == 2
+        assert windowed.recent(now=1065).count == 1  # The first slot has left the window
+        assert windowed.total.count == 2
+
+
+class TestLatencyRegistry:
+    def test_summary_and_prometheus_export(self):
+        registry = LatencyRegistry()
+        registry.observe("http_request", "index", 40)
+        registry.observe("http_request", "generate", 3000, error=True)
+        registry.observe("external_api", "spotify", 120)
+
+        summary = registry.summary("http_request")
+        assert summary["all"]["count"] == 2
+        assert set(summary["by_label"]) == {"index", "generate"}
+
+        text = registry.prometheus_text(prefix="app", label_names={"http_request": "endpoint"})
+        assert "# TYPE app_http_request_duration_seconds histogram" in text
+        assert 'app_http_request_duration_seconds_bucket{endpoint="index",le="0.05"} 1' in text
+        assert 'app_http_request_duration_seconds_bucket{endpoint="generate",le="+Inf"} 1' in text
+        assert 'app_http_request_errors_total{endpoint="generate"} 1' in text
+        assert 'app_external_api_duration_seconds_count{name="spotify"} 1' in text
+
+    def test_labels_beyond_the_cap_share_one_series(self):
+        registry = LatencyRegistry(max_series=3)
+        for i in range(10):
+            registry.observe("http_request", f"/probe/{i}", 10)
+        registry.observe("external_api", "spotify", 10)
+
+        labels = registry.summary("http_request")["by_label"]
+        assert set(labels) == {"/probe/0", "/probe/1", "/probe/2", OVERFLOW_LABEL}
+        assert labels[OVERFLOW_LABEL]["count"] == 7
+        assert registry.summary("external_api")["all"]["count"] == 1
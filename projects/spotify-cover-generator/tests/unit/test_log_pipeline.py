@@ -0,0 +1,69 @@
+import json
+import logging
+
+from log_pipeline import LogPipeline, cap_field, parse_rates
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+def make_pipeline(**kwargs):
+    logger = logging.getLogger(f"test-log-pipeline-{id(kwargs)}")
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    kwargs.setdefault("sample_rates", {})
+    kwargs.setdefault("rate_limits", {})
+    return LogPipeline(logger, "test-app", **kwargs), handler.records
+
+
+class TestLogPipeline:
+    def test_events_are_written_by_the_background_thread(self):
+        pipeline, records = make_pipeline(async_mode=True, rate_limit=0)
+        for i in range(50):
+            assert pipeline.emit("info", "tick", {"i": i})
+        assert pipeline.flush()
+
+        assert [r["i"] for r in records] == list(range(50))
+        assert records[0]["app"] == "test-app" and records[0]["event"] == "tick"
+
+    def test_sampling_never_drops_errors(self):
+        pipeline, records = make_pipeline(async_mode=False, rate_limit=0, sample_rates={"noisy": 0.0})
+        assert not pipeline.emit("info", "noisy", {})
+        assert pipeline.emit("error", "noisy", {"error": "boom"})
+        assert [r["level"] for r in records] == ["error"]
+        assert pipeline.stats()["sampled_out"] == 1
+
+    def test_rate_limit_suppresses_and_reports(self):
+        pipeline, records = make_pipeline(async_mode=False, rate_limit=5)
+        kept = sum(pipeline.emit("info", "burst", {}) for _ in range(20))
+        assert kept == 5
+        pipeline.close()
+        assert records[-1]["event"] == "log_suppressed"
+        assert records[-1]["events"] == {"burst": 15}
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        pipeline, _ = make_pipeline(async_mode=True, rate_limit=0, queue_size=1)
+        pipeline._ensure_writer = lambda: None  # No writer, so the queue stays full
+        assert pipeline.emit("info", "a", {})
+        assert not pipeline.emit("info", "b", {})
+        assert pipeline.stats()["dropped"] == 1
+
+
+def test_cap_field_truncates_large_values():
+    assert cap_field("x" * 10, max_chars=4) == "xxxx...[6 chars truncated]"
+    assert cap_field({"k": "v"}, max_chars=100) == {"k": "v"}
+    assert cap_field({"k": "v" * 50}, max_chars=10) == '{"k": "vvv...[49 chars truncated]'
+    assert cap_field(42) == 42
+
+
+def test_parse_rates_skips_malformed_entries():
+    assert parse_rates("a=0.5, b=oops,c=2") == {"a": 0.5, "c": 2.0}
@@ -37,6 +37,23 @@ class TestGenreAnalysis:
         assert percentages[0]["name"] == "rock"
         assert percentages[0]["percentage"] == 50  # 3/6 = 50%
 
+    def test_mood_matches_substring_scoring(self):
+        """Matcher-based mood agrees with scoring every keyword against every genre"""
+        cases = [
+            ["Dance Pop", "rock", "indie folk"],  # "pop" counts for euphoric and upbeat
+            ["sad indie", "ambient"],
+            ["rock", "chill"],  # Tie: the earlier mood wins
+            ["jazz"],
+        ]
+        for genres in cases:
+            expected_scores = {mood: 0 for mood in GenreAnalysis.MOOD_KEYWORDS}
+            for genre in genres:
+                for mood, keywords in GenreAnalysis.MOOD_KEYWORDS.items():
+                    if any(keyword in genre.lower() for keyword in keywords):
+                        expected_scores[mood] += 1
+            expected = max(expected_scores.items(), key=lambda x: x[1])[0] if any(expected_scores.values()) else "balanced"
+            assert GenreAnalysis.from_genre_list(genres).mood == expected
+
 class TestPlaylistData:
     def test_to_dict(self):
         """Test PlaylistData serialization"""
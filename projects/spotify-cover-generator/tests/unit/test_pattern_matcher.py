@@ -0,0 +1,33 @@
+import random
+
+from pattern_matcher import MultiPatternMatcher
+from models import GenreAnalysis
+
+
+class TestMultiPatternMatcher:
+    def test_finds_overlapping_and_nested_patterns(self):
+        matcher = MultiPatternMatcher(["post", "post-punk", "punk", "unk", "house", "house deep"])
+        assert matcher.find_all("post-punk revival") == {"post", "post-punk", "punk", "unk"}
+        assert matcher.find_all("house deep") == {"house", "house deep"}
+        assert matcher.find_all("jazz") == set()
+
+    def test_matches_substring_checks(self):
+        patterns = ["ab", "bab", "abc", "c", "bca", "aaa"]
+        matcher = MultiPatternMatcher(patterns)
+        rng = random.Random(3)
+        for _ in range(200):
+            text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 12)))
+            assert matcher.find_all(text) == {p for p in patterns if p in text}
+
+
+class TestGenreSignals:
+    def test_signals_match_keyword_tables(self):
+        signals = GenreAnalysis._genre_signals("death metal hardcore")
+        assert signals["energy"] == {"explosive": 2}
+        assert signals["mood"]["energetic"] == 2.0  # "metal" and "hardcore"
+        assert signals["cultural"] == []
+
+    def test_cultural_context_and_energy(self):
+        genres = ["reggaeton", "afrobeat", "indie pop", "ambient"]
+        assert GenreAnalysis._identify_cultural_context(genres) == ["african", "latin"]
+        assert GenreAnalysis._calculate_energy_level(genres) == "low"
@@ -0,0 +1,41 @@
+import time
+import pytest
+
+from pipeline import StagePipeline, PipelineAbort
+
+
+class TestStagePipeline:
+    def test_dependencies_receive_results(self):
+        pipeline = StagePipeline("test")
+        pipeline.add("a", lambda: 2)
+        pipeline.add("b", lambda a: a * 3, deps=["a"])
+        pipeline.add("c", lambda a, b: a + b, deps=["a", "b"])
+        results = pipeline.run()
+        assert results == {"a": 2, "b": 6, "c": 8}
+        assert set(pipeline.timings) == {"a", "b", "c"}
+
+    def test_independent_stages_overlap(self):
+        pipeline = StagePipeline("test", max_workers=3)
+        pipeline.add("root", lambda: None)
+        for name in ("x", "y", "z"):
+            pipeline.add(name, lambda root: time.sleep(0.2), deps=["root"])
+        pipeline.run()
+        assert pipeline.total_time < 0.5
+
+    def test_abort_stops_dependents(self):
+        calls = []
+
+        def fail():
+            raise PipelineAbort("no tracks")
+
+        pipeline = StagePipeline("test")
+        pipeline.add("extract", fail)
+        pipeline.add("title", lambda extract: calls.append("title"), deps=["extract"])
+        with pytest.raises(PipelineAbort, match="no tracks"):
+            pipeline.run()
+        assert calls == []
+
+    def test_unknown_dependency_rejected(self):
+        pipeline = StagePipeline("test")
+        with pytest.raises(ValueError):
+            pipeline.add("b", lambda a: a, deps=["a"])
@@ -24,4 +24,153 @@ class TestSpotifyClient:
         invalid_url = "https://youtube.com/watch?v=123"
         is_valid, message = spotify_client.validate_spotify_url(invalid_url)
         assert is_valid is False
-        assert "Not a Spotify URL" in message
\ No newline at end of file
+        assert "Not a Spotify URL" in message
+
+class TestArtistGenreCache:
+    def _fake_sp(self, artist_ids):
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+        mock_sp.playlist.return_value = {"name": "Cache Test"}
+        mock_sp.playlist_tracks.return_value = {"items": [
+            {"track": {"id": f"t{i}", "name": f"Track {i}", "artists": [{"id": artist_id, "name": artist_id}]}}
+            for i, artist_id in enumerate(artist_ids)
+        ]}
+        mock_sp.artists.side_effect = lambda ids: {"artists": [
+            {"id": artist_id, "name": artist_id, "genres": ["indie rock"]} for artist_id in ids
+        ]}
+        return mock_sp
+
+    def test_only_cache_misses_are_fetched(self, app_context):
+        from app import db, ArtistGenreCache
+        db.create_all()
+        ArtistGenreCache.query.delete()
+        db.session.commit()
+
+        url = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+        mock_sp = self._fake_sp(["a1", "a2"])
+        with patch.object(spotify_client, "sp", mock_sp):
+            first = spotify_client.extract_playlist_data(url)
+            assert mock_sp.artists.call_count == 1
+            assert first.genre_analysis.all_genres == ["indie rock", "indie rock"]
+
+            mock_sp.playlist_tracks.return_value["items"].append(
+                {"track": {"id": "t9", "name": "New", "artists": [{"id": "a3", "name": "a3"}]}})
+            second = spotify_client.extract_playlist_data(url)
+
+        assert mock_sp.artists.call_args_list[-1].args[0] == ["a3"]
+        assert len(second.genre_analysis.all_genres) == 3
+        assert ArtistGenreCache.query.count() == 3
+
+
+class TestPlaylistPaging:
+    def test_sample_page_offsets_small_playlist(self):
+        assert spotify_client.sample_page_offsets(250, page_size=100, max_pages=20) == [0, 100, 200]
+
+    def test_sample_page_offsets_uniform(self):
+        offsets = spotify_client.sample_page_offsets(10_000, page_size=100, max_pages=5, strategy="uniform")
+        assert offsets[0] == 0 and offsets[-1] == 9_900
+        assert len(offsets) == 5
+
+    def test_sample_page_offsets_head(self):
+        assert spotify_client.sample_page_offsets(10_000, page_size=100, max_pages=3, strategy="head") == [0, 100, 200]
+
+    def test_all_pages_are_read(self, app_context):
+        from app import db
+        db.create_all()
+
+        def page(offset):
+            return [{"track": {"id": f"t{offset + i}", "name": f"Track {offset + i}",
+                               "artists": [{"id": f"p{offset + i}", "name": "x"}]}} for i in range(100)]
+
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+        mock_sp.playlist.return_value = {"name": "Long", "tracks": {"total": 300, "items": page(0)}}
+        mock_sp.playlist_tracks.side_effect = lambda *a, **kw: {"items": page(kw["offset"])}
+        mock_sp.artists.side_effect = lambda ids: {"artists": [{"id": i, "name": i, "genres": ["jazz"]} for i in ids]}
+
+        with patch.object(spotify_client, "sp", mock_sp):
+            data = spotify_client.extract_playlist_data("https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M")
+
+        assert sorted(call.kwargs["offset"] for call in mock_sp.playlist_tracks.call_args_list) == [100, 200]
+        assert len(data.artist_ids) == 300
+        assert data.track_names[:2] == ["Track 0", "Track 1"]
+        assert len(data.genre_analysis.all_genres) == 300
+
+
+class TestExtractionCache:
+    URL = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self):
+        for cache in (spotify_client.PLAYLIST_DATA_CACHE, spotify_client.ALBUM_DATA_CACHE, spotify_client.SNAPSHOT_CACHE):
+            cache.clear()
+
+    def _fake_sp(self, snapshot):
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+
+        def playlist(item_id, fields=None):
+            if fields == "snapshot_id":
+                return {"snapshot_id": snapshot["id"]}
+            return {"name": "Snapshots", "snapshot_id": snapshot["id"], "tracks": {"total": 1, "items": [
+                {"track": {"id": "t1", "name": "Only", "artists": [{"id": "a1", "name": "a1"}]}}]}}
+
+        mock_sp.playlist.side_effect = playlist
+        mock_sp.artists.side_effect = lambda ids: {"artists": [{"id": i, "name": i, "genres": ["jazz"]} for i in ids]}
+        return mock_sp
+
+    def _full_fetches(self, mock_sp):
+        return sum(1 for call in mock_sp.playlist.call_args_list if call.kwargs.get("fields") != "snapshot_id")
+
+    def test_unchanged_playlist_is_served_from_cache(self, app_context):
+        from app import db
+        db.create_all()
+        snapshot = {"id": "s1"}
+        mock_sp = self._fake_sp(snapshot)
+
+        with patch.object(spotify_client, "sp", mock_sp):
+            first = spotify_client.extract_playlist_data(self.URL)
+            spotify_client.SNAPSHOT_CACHE.clear()  # Force a real snapshot check
+            second = spotify_client.extract_playlist_data(self.URL + "?si=share")
+
+        assert self._full_fetches(mock_sp) == 1
+        assert second.track_names == first.track_names
+        assert second.spotify_url.endswith("?si=share")
+
+    def test_changed_snapshot_refetches(self, app_context):
+        from app import db
+        db.create_all()
+        snapshot = {"id": "s1"}
+        mock_sp = self._fake_sp(snapshot)
+
+        with patch.object(spotify_client, "sp", mock_sp):
+            spotify_client.extract_playlist_data(self.URL)
+            snapshot["id"] = "s2"
+            spotify_client.SNAPSHOT_CACHE.clear()
+            spotify_client.extract_playlist_data(self.URL)
+
+        assert self._full_fetches(mock_sp) == 2
+
+    def test_albums_are_cached_without_validation(self, app_context):
+        from app import db
+        db.create_all()
+        mock_sp = MagicMock()
+        mock_sp.auth_manager = None
+        mock_sp.album.return_value = {"name": "Record", "tracks": {"total": 1, "items": [
+            {"id": "t1", "name": "Side A", "artists": [{"id": "a1", "name": "a1"}]}]}}
+        mock_sp.artists.side_effect = lambda ids: {"artists": [{"id": i, "name": i, "genres": ["jazz"]} for i in ids]}
+
+        url = "https://open.spotify.com/album/4aawyAB9vmqN3uQ7FjRGTy"
+        with patch.object(spotify_client, "sp", mock_sp):
+            spotify_client.extract_playlist_data(url)
+            spotify_client.extract_playlist_data(url)
+
+        assert mock_sp.album.call_count == 1
+        mock_sp.playlist.assert_not_called()
+
+    def test_extraction_is_the_monitored_call(self):
+        # The monitoring and fault-tolerance decorators belong on the API call, not the URL parser
+        assert hasattr(spotify_client.extract_playlist_data, "__wrapped__")
+        assert not hasattr(spotify_client.parse_spotify_item, "__wrapped__")
+        assert not hasattr(spotify_client.get_item_version, "__wrapped__")
+        assert spotify_client.parse_spotify_item(self.URL) == ("playlist", "37i9dQZF1DXcBWIGoYBM5M")
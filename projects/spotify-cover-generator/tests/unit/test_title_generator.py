@@ -0,0 +1,70 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import title_generator
+from ttl_cache import TTLCache, MISSING
+
+
+def make_generator(mock_sp):
+    generator = title_generator.LiveSpotifyTitleGenerator.__new__(title_generator.LiveSpotifyTitleGenerator)
+    generator.sp = mock_sp
+    generator.album_cache = title_generator.ARTIST_ALBUMS_CACHE
+    return generator
+
+
+class TestTTLCache:
+    def test_expiry_and_size_bound(self):
+        cache = TTLCache("test", max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", [])
+        assert cache.get("b") == []
+        cache.set("c", 3)
+        assert cache.get("a") is MISSING  # least recently used entry evicted
+        cache.set("d", 4, ttl=-1)
+        assert cache.get("d") is MISSING
+        assert cache.stats()["evictions"] >= 1
+
+
+class TestSharedAlbumPool:
+    def test_album_pool_is_shared_between_instances(self):
+        for cache in (title_generator.ARTIST_ALBUMS_CACHE, title_generator.RELATED_ARTISTS_CACHE,
+                      title_generator.GENRE_ALBUMS_CACHE):
+            cache.clear()
+
+        mock_sp = MagicMock()
+        mock_sp.artist_albums.side_effect = lambda artist_id, **kw: {"items": [{"name": f"Night Drive {artist_id}"}]}
+        mock_sp.artist_related_artists.side_effect = lambda artist_id: {"artists": [{"id": f"{artist_id}-rel"}]}
+        mock_sp.search.return_value = {"albums": {"items": [{"name": "Ocean Glow"}]}}
+
+        first = make_generator(mock_sp)
+        assert len(first.fetch_albums_for_artists(["a", "b", "c"])) == 3
+        first.fetch_similar_artists_albums(["a", "b"])
+        assert first.fetch_genre_albums(["ambient"]) == ["Ocean Glow"]
+        calls = (mock_sp.artist_albums.call_count, mock_sp.artist_related_artists.call_count, mock_sp.search.call_count)
+
+        second = make_generator(mock_sp)
+        second.fetch_albums_for_artists(["a", "b", "c"])
+        second.fetch_similar_artists_albums(["a", "b"])
+        second.fetch_genre_albums(["ambient"])
+        assert (mock_sp.artist_albums.call_count, mock_sp.artist_related_artists.call_count,
+                mock_sp.search.call_count) == calls
+
+
+class TestParallelMap:
+    def test_nested_fan_outs_share_one_bounded_pool(self):
+        threads = set()
+
+        def leaf(item):
+            threads.add(threading.current_thread().name)
+            return item * 2
+
+        with patch.object(title_generator, "TITLE_FETCH_WORKERS", 2), \
+             patch.object(title_generator, "_fetch_pool", None):
+            # Three levels deep on a two-thread pool: would deadlock if callers only waited
+            result = title_generator._parallel_map(
+                lambda group: title_generator._parallel_map(
+                    lambda row: title_generator._parallel_map(leaf, row), group),
+                [[[1, 2], [3, 4]], [[5, 6], [7, 8]], [[9, 10]]])
+
+        assert result == [[[2, 4], [6, 8]], [[10, 12], [14, 16]], [[18, 20]]]
+        assert len({name for name in threads if name.startswith("title-fetch")}) <= 2
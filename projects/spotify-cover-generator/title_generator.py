@@ -1,8 +1,10 @@
-import requests
+import os
 import json
 import random
 import re
+import threading
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Optional
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
@@ -15,6 +17,8 @@ except ImportError:
     SKLEARN_AVAILABLE = False
 
 from config import GEMINI_API_KEY, GEMINI_API_URL, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+from ttl_cache import TTLCache, MISSING
+from fault_handling import http_client
 
 # Monitoring imports with fallback
 try:
@@ -30,12 +34,48 @@ except ImportError:
             return func
         return decorator
 
+# Process-wide album title pools, shared by every LiveSpotifyTitleGenerator
+ARTIST_ALBUMS_CACHE = TTLCache("artist_albums", max_entries=5000, ttl=12 * 3600)
+RELATED_ARTISTS_CACHE = TTLCache("related_artists", max_entries=2000, ttl=24 * 3600)
+GENRE_ALBUMS_CACHE = TTLCache("genre_albums", max_entries=1000, ttl=6 * 3600)
+TITLE_FETCH_WORKERS = 8
+
+# One bounded pool per process for every Spotify fetch the title generator fans out
+_fetch_pool = None
+_fetch_pool_pid = None
+_fetch_pool_lock = threading.Lock()
+
+def _title_fetch_pool():
+    """The process's fetch pool (a forked worker gets its own; the parent's threads don't exist there)"""
+    global _fetch_pool, _fetch_pool_pid
+    if _fetch_pool is None or _fetch_pool_pid != os.getpid():
+        with _fetch_pool_lock:
+            if _fetch_pool is None or _fetch_pool_pid != os.getpid():
+                _fetch_pool = ThreadPoolExecutor(max_workers=TITLE_FETCH_WORKERS, thread_name_prefix="title-fetch")
+                _fetch_pool_pid = os.getpid()
+    return _fetch_pool
+
+def _parallel_map(func, items):
+    """
+    func over items on the shared fetch pool; results keep the input order.
+    The caller runs any item no pool thread has started yet, so nested fan-outs
+    (sources -> artists -> searches) can't deadlock the bounded pool.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    pool = _title_fetch_pool()
+    futures = [pool.submit(func, item) for item in items]
+    return [func(item) if future.cancel() else future.result() for future, item in zip(futures, items)]
+
+def title_cache_stats():
+    return [cache.stats() for cache in (ARTIST_ALBUMS_CACHE, RELATED_ARTISTS_CACHE, GENRE_ALBUMS_CACHE)]
+
 class LiveSpotifyTitleGenerator:
     def __init__(self):
-        """Initialize with Spotify client and caching"""
+        """Initialize with Spotify client; caching is shared at module level"""
         self.sp = None
-        self.album_cache = {}
-        self.artist_cache = {}
+        self.album_cache = ARTIST_ALBUMS_CACHE
         self._initialize_spotify()
         
     def _initialize_spotify(self):
@@ -72,120 +112,113 @@ class LiveSpotifyTitleGenerator:
         
         return artist_ids
 
+    def _artist_albums(self, artist_id: str, limit_per_artist: int) -> List[str]:
+        """Good album titles for one artist, from the shared cache when possible"""
+        cache_key = (artist_id, limit_per_artist)
+        cached = ARTIST_ALBUMS_CACHE.get(cache_key)
+        if cached is not MISSING:
+            return cached
+            
+        try:
+            # Fetch albums for this artist
+            results = self.sp.artist_albums(
+                artist_id, 
+                album_type='album,single', 
+                limit=limit_per_artist
+            )
+        except Exception as e:
+            print(f"Error fetching albums for artist {artist_id}: {e}")
+            return []
+        
+        artist_albums = []
+        for album in results.get('items', []):
+            name = album.get('name')
+            if name and self._is_good_title(name):
+                artist_albums.append(name)
+        
+        ARTIST_ALBUMS_CACHE.set(cache_key, artist_albums)
+        return artist_albums
+
+    def _albums_for(self, artist_ids: List[str], limit_per_artist: int) -> List[str]:
+        album_lists = _parallel_map(lambda artist_id: self._artist_albums(artist_id, limit_per_artist), artist_ids)
+        return list(set(title for albums in album_lists for title in albums))  # Remove duplicates
+
     def fetch_albums_for_artists(self, artist_ids: List[str], limit_per_artist: int = 15) -> List[str]:
         """Fetch real album titles from Spotify for given artists"""
         if not self.sp or not artist_ids:
             return []
         
-        album_titles = []
-        
-        for artist_id in artist_ids[:10]:  # Limit to avoid too many API calls
-            cache_key = f"artist_{artist_id}_{limit_per_artist}"
-            if cache_key in self.album_cache:
-                album_titles.extend(self.album_cache[cache_key])
-                continue
-                
-            try:
-                # Fetch albums for this artist
-                results = self.sp.artist_albums(
-                    artist_id, 
-                    album_type='album,single', 
-                    limit=limit_per_artist
-                )
-                
-                artist_albums = []
-                for album in results.get('items', []):
-                    name = album.get('name')
-                    if name and self._is_good_title(name):
-                        artist_albums.append(name)
-                
-                self.album_cache[cache_key] = artist_albums
-                album_titles.extend(artist_albums)
-                
-            except Exception as e:
-                print(f"Error fetching albums for artist {artist_id}: {e}")
-                continue
+        return self._albums_for(artist_ids[:10], limit_per_artist)  # Limit to avoid too many API calls
+
+    def _related_artist_ids(self, artist_id: str) -> List[str]:
+        """Up to 5 related artist IDs; failures are cached as empty so they are not retried every call"""
+        cached = RELATED_ARTISTS_CACHE.get(artist_id)
+        if cached is not MISSING:
+            return cached
+            
+        try:
+            # Get related artists with better error handling
+            related = self.sp.artist_related_artists(artist_id)
+            related_artist_ids = [artist['id'] for artist in related.get('artists', [])[:5]]
+        except spotipy.exceptions.SpotifyException as e:
+            if e.http_status == 404:
+                print(f"⚠️ Artist {artist_id} not found or no related artists available - skipping")
+            elif e.http_status == 403:
+                print(f"⚠️ Access forbidden for artist {artist_id} - may be region restricted")
+            else:
+                print(f"⚠️ Spotify API error for artist {artist_id}: {e}")
+                return []  # Possibly transient - don't cache
+            related_artist_ids = []
+        except Exception as e:
+            print(f"⚠️ Unexpected error fetching related artists for {artist_id}: {e}")
+            return []
         
-        return list(set(album_titles))  # Remove duplicates
+        RELATED_ARTISTS_CACHE.set(artist_id, related_artist_ids)
+        return related_artist_ids
 
     def fetch_similar_artists_albums(self, artist_ids: List[str], limit: int = 50) -> List[str]:
         """Fetch albums from similar artists to expand the pool"""
         if not self.sp or not artist_ids:
             return []
-            
-        similar_albums = []
         
-        for artist_id in artist_ids[:5]:  # Limit to avoid quota issues
+        # Related artists for the first 5 artists, then all of their albums, in parallel
+        related_lists = _parallel_map(self._related_artist_ids, artist_ids[:5])  # Limit to avoid quota issues
+        related_ids = list(dict.fromkeys(artist_id for ids in related_lists for artist_id in ids))
+        
+        return self._albums_for(related_ids, limit_per_artist=8)
+
+    def _genre_albums(self, genre: str, limit: int) -> List[str]:
+        cache_key = (genre.lower(), limit)
+        cached = GENRE_ALBUMS_CACHE.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        
+        # Search for albums in this genre
+        search_terms = [
+            f'genre:"{genre}"',
+            f'tag:"{genre}"',
+            genre  # Simple genre search
+        ]
+        
+        def _search(search_term):
             try:
-                # Get related artists with better error handling
-                related = self.sp.artist_related_artists(artist_id)
-                related_artist_ids = [artist['id'] for artist in related.get('artists', [])[:5]]
-                
-                # Fetch albums from related artists
-                if related_artist_ids:  # Only if we found related artists
-                    related_albums = self.fetch_albums_for_artists(related_artist_ids, limit_per_artist=8)
-                    similar_albums.extend(related_albums)
-                    
-            except spotipy.exceptions.SpotifyException as e:
-                if e.http_status == 404:
-                    print(f"⚠️ Artist {artist_id} not found or no related artists available - skipping")
-                elif e.http_status == 403:
-                    print(f"⚠️ Access forbidden for artist {artist_id} - may be region restricted")
-                else:
-                    print(f"⚠️ Spotify API error for artist {artist_id}: {e}")
-                continue  # Skip this artist and continue with others
-            except Exception as e:
-                print(f"⚠️ Unexpected error fetching related artists for {artist_id}: {e}")
-                continue
-                    
-        return list(set(similar_albums))
+                results = self.sp.search(q=search_term, type='album', limit=10)
+            except Exception:
+                return []
+            return [album.get('name') for album in results.get('albums', {}).get('items', [])
+                    if album.get('name') and self._is_good_title(album.get('name'))]
+        
+        found_albums = list(set(name for names in _parallel_map(_search, search_terms) for name in names))
+        GENRE_ALBUMS_CACHE.set(cache_key, found_albums)
+        return found_albums
 
     def fetch_genre_albums(self, genres: List[str], limit: int = 30) -> List[str]:
         """Fetch albums by searching for genre-specific content"""
         if not self.sp or not genres:
             return []
-            
-        genre_albums = []
-        
-        for genre in genres[:3]:  # Limit genres to avoid too many calls
-            cache_key = f"genre_{genre.lower()}_{limit}"
-            if cache_key in self.album_cache:
-                genre_albums.extend(self.album_cache[cache_key])
-                continue
-                
-            try:
-                # Search for albums in this genre
-                search_terms = [
-                    f'genre:"{genre}"',
-                    f'tag:"{genre}"',
-                    genre  # Simple genre search
-                ]
-                
-                found_albums = []
-                for search_term in search_terms:
-                    try:
-                        results = self.sp.search(
-                            q=search_term, 
-                            type='album', 
-                            limit=10
-                        )
-                        
-                        for album in results.get('albums', {}).get('items', []):
-                            name = album.get('name')
-                            if name and self._is_good_title(name):
-                                found_albums.append(name)
-                                
-                    except Exception:
-                        continue
-                
-                self.album_cache[cache_key] = list(set(found_albums))
-                genre_albums.extend(found_albums)
-                
-            except Exception as e:
-                print(f"Error searching albums for genre {genre}: {e}")
-                continue
         
-        return list(set(genre_albums))
+        album_lists = _parallel_map(lambda genre: self._genre_albums(genre, limit), genres[:3])  # Limit genres to avoid too many calls
+        return list(set(title for albums in album_lists for title in albums))
 
     def _is_good_title(self, title: str) -> bool:
         """Filter out bad/unsuitable album titles"""
@@ -333,8 +366,9 @@ Respond with ONLY the title, no quotes or explanation:"""
                 }
             }
             
-            url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+            # The key goes in params so it never appears in the logged URL
+            response = http_client.post(GEMINI_API_URL, service_name="gemini", params={"key": GEMINI_API_KEY},
+                                        headers=headers, json=data, timeout=(10, 30))
             
             if response.status_code == 200:
                 response_json = response.json()
@@ -382,25 +416,17 @@ Respond with ONLY the title, no quotes or explanation:"""
                 # Try to get them from track names or other data if needed
                 # This depends on your playlist_data structure
             
-            # Method 1: Get albums from the playlist's artists
-            if artist_ids and self.sp:
-                artist_albums = self.fetch_albums_for_artists(artist_ids)
-                if artist_albums:
-                    all_titles.extend(artist_albums)
-                    print(f"✓ Found {len(artist_albums)} albums from playlist artists")
-                
-                # Method 2: Get albums from similar artists
-                similar_albums = self.fetch_similar_artists_albums(artist_ids)
-                if similar_albums:
-                    all_titles.extend(similar_albums)
-                    print(f"✓ Found {len(similar_albums)} albums from similar artists")
-            
-            # Method 3: Get albums by genre
-            if genres and self.sp:
-                genre_albums = self.fetch_genre_albums(genres)
-                if genre_albums:
-                    all_titles.extend(genre_albums)
-                    print(f"✓ Found {len(genre_albums)} albums from genre search")
+            # Method 1: albums from the playlist's artists, Method 2: albums from similar
+            # artists, Method 3: albums by genre - all three fetched concurrently
+            sources = [
+                ("playlist artists", lambda: self.fetch_albums_for_artists(artist_ids)),
+                ("similar artists", lambda: self.fetch_similar_artists_albums(artist_ids)),
+                ("genre search", lambda: self.fetch_genre_albums(genres)),
+            ]
+            for (source, _), albums in zip(sources, _parallel_map(lambda item: item[1](), sources)):
+                if albums:
+                    all_titles.extend(albums)
+                    print(f"✓ Found {len(albums)} albums from {source}")
             
             # Remove duplicates
             all_titles = list(set(all_titles))
@@ -0,0 +1,78 @@
+"""
+Thread-safe, size-bounded TTL cache shared across requests in one process.
+
+Entries expire after their TTL and the least recently used entry is evicted
+once max_entries is reached. get() returns the MISSING sentinel rather than
+None so that empty results (e.g. an artist with no related artists) can be
+cached too.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name, max_entries=1024, ttl=3600):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Cached value for key, computing and storing factory() on a miss (outside the lock)"""
+        value = self.get(key)
+        if value is MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -367,7 +367,9 @@ def list_recent_generations(limit=10):
                 "output_path": result.output_path,
                 "item_name": result.item_name,
                 "timestamp": result.timestamp.strftime("%Y-%m-%d %H:%M:%S") if result.timestamp else "",
-                "image_url": f"/spotifycovergenerator/generated_covers/{os.path.basename(result.output_path)}"
+                # The 300px thumbnail; None once the cover has been evicted from the store
+                "image_url": (f"/spotifycovergenerator/generated_covers/{os.path.basename(result.output_path)}?size=thumb"
+                              if result.output_path else None)
             } for result in results]
     except Exception as e:
         print(f"Error listing recent generations: {e}")